@@ -1,2 +1,34 @@
-from lucy.main import Lucy
-__all__ = ["Lucy"]
\ No newline at end of file
+from typing import Any, TYPE_CHECKING
+from importlib import import_module
+
+if TYPE_CHECKING:
+    from lucy.main import Lucy
+    from lucy.agent.agent import Agent
+    from lucy.agent.host import AgentHost
+    from lucy.settings import Settings, get_settings
+
+# everything is imported on first use, so `import lucy` stays cheap for processes that only need part of it (ie a web worker that enqueues stimuli)
+_lazy = {"Lucy": "lucy.main",
+         "Agent": "lucy.agent.agent",
+         "AgentHost": "lucy.agent.host",
+         "Settings": "lucy.settings",
+         "get_settings": "lucy.settings"}
+_submodules = {"agent", "backends", "encoding", "schema", "settings", "stimuli", "tracing"}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _lazy:
+        value = getattr(import_module(_lazy[name]), name)
+    elif name in _submodules:
+        value = import_module(f"{__name__}.{name}")
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *_lazy, *_submodules})
+
+
+__all__ = ["Lucy", "Agent", "AgentHost", "Settings", "get_settings"]
@@ -1,17 +1,22 @@
 from typing import Optional, TYPE_CHECKING
 from datetime import datetime
+import asyncio
 import logging
 
-from lucy.settings import settings
-from lucy.schema import LucyMemoryCore, Role
+from lucy.schema import LucyMemoryCore, MemoryType, Message, Role
+from lucy.backends.core_cache import CoreMemoryCache, core_memory_cache
 from lucy.agent.prompt_engine import PromptEngine
+from lucy.agent.context import ContextAssembler
+from lucy.agent.summarizer import RecallSummarizer
 from lucy.agent.tool_engine import ToolEngine
+from lucy.tracing import tracer
 
 if TYPE_CHECKING:
     from lucy.backends.inference_backend_base import LucyInferenceBackendBase
     from lucy.backends.memory_backend_base import LucyMemoryBackendBase
     from lucy.stimuli.stimuli_base import LucyStimuliBase
-    from lucy.schema import Message
+    from lucy.schema import Turn
+    from lucy.tracing import Span
 
 # TODO: real library logging https://docs.python.org/3/howto/logging-cookbook.html#adding-handlers-other-than-nullhandler-to-a-logger-in-a-library
 logger = logging.getLogger("lucy.agent")
@@ -20,14 +25,19 @@ class Agent:
     """The abstraction that uses different memory banks and an LLM to "think" and "act"
 
     inference_backend is the backend that the agent uses to assemble core memory and generate responses.
+    context_assembler packs core memory into the inference backend's context window each turn.
     core memory is an in-memory object of the current context window.
     persisted_core_memory, archival_memory, and recall_memory are the backends the agent can access to store and retrieve information.
+    instance_id identifies the agent across restarts; agents with an instance_id are restored from persisted_core_memory.
+    core_cache keeps core memory live between turns and persists only what each turn changed in it.
+    summarizer folds the messages evicted from the history into core memory's summary, off the agent's turn.
     stimuli_queue is the inbound information to be added to core memory, in the form of Messages.
     heartrate is the frequency at which the agent should 'think'
     heartbeat is the next time the agent will 'think'
 
     """
     prompt_engine: "PromptEngine"
+    context_assembler: "ContextAssembler"
     tool_engine: "ToolEngine"
     inference_backend: "LucyInferenceBackendBase"
     stimuli_queue: "LucyStimuliBase"
@@ -35,6 +45,9 @@ class Agent:
     persisted_core_memory: "LucyMemoryBackendBase"
     archival_memory: "LucyMemoryBackendBase"
     recall_memory: "LucyMemoryBackendBase"
+    core_cache: "CoreMemoryCache"
+    summarizer: Optional["RecallSummarizer"]
+    instance_id: Optional[str]
     heartbeat: float
 
     def __init__(self,
@@ -46,76 +59,159 @@ class Agent:
                  recall_memory_backend: Optional["LucyMemoryBackendBase"] = None,
                  heartrate: Optional[int] = 60,
                  alternate_tools_path: Optional[str] = None,
+                 autostart: Optional[bool] = True,
+                 core_cache: Optional["CoreMemoryCache"] = None,
+                 summarize_recall: Optional[bool] = True,
                   ):
         """Initializes the agent instance and launches the daemon.
         Args:
             instance_id: the unique identifier for the agent instance
             heartrate: the frequency at which the agent should 'think'
+            autostart: launch the (blocking) daemon on init. Set to False to run the agent with `adaemon` on an existing event loop.
+            core_cache: where core memory is kept between turns, defaults to the process-wide `core_memory_cache`
+            summarize_recall: keep a rolling summary of the messages evicted from the history in core memory. Set to False to only push them to recall memory.
         """
-        self.inference_backend = inference_backend or settings.inference_backend
-        self.stimuli_queue = stimuli_queue or settings.stimuli_queue
+        # settings (and the backends they name) are only read once an agent is created, never on import
+        from lucy.settings import settings
+
+        self.inference_backend = inference_backend or settings.resolve("inference_backend")
+        if self.inference_backend is None:
+            raise ValueError("no inference_backend was given and none is set in settings (ie LUCY_INFERENCE_BACKEND)")
+        self.stimuli_queue = stimuli_queue or settings.resolve("stimuli_queue")(instance_id=instance_id)
+        if (trace_exporter := settings.resolve("trace_exporter")) is not None:
+            tracer.add_exporter(trace_exporter)
         self.heartrate = heartrate
         self.prompt_engine = PromptEngine(*self.inference_backend.prompt_engine_args)
+        self.context_assembler = ContextAssembler(self.inference_backend)
         self.tool_engine = ToolEngine(alternate_tools_path)
+        self.summarizer = RecallSummarizer(self.inference_backend, self.prompt_engine) if summarize_recall else None
 
-        for backend in (("persisted_core_memory_backend", core_memory_backend),
-                        ("archival_memory_backend", archival_memory_backend),
-                        ("recall_memory_backend", recall_memory_backend)):
-            memory_type = backend[0].split("_")[-3]
-            initialized = backend[1](instance_id=instance_id, memory_type=memory_type)
-            setattr(self, backend[0], initialized)
-
+        self.instance_id = instance_id
+        self.core_cache = core_cache or core_memory_cache
+        for attribute, backend, memory_type in (
+                ("persisted_core_memory", core_memory_backend or settings.resolve("core_backend"), MemoryType.core),
+                ("archival_memory", archival_memory_backend or settings.resolve("archive_backend"), MemoryType.archival),
+                ("recall_memory", recall_memory_backend or settings.resolve("recall_backend"), MemoryType.recall)):
+            setattr(self, attribute, backend(instance_id=instance_id, memory_type=memory_type))
 
         self.core_memory = LucyMemoryCore(
             boot=self.prompt_engine.render("boot"),
+            bios=self.prompt_engine.render("bios"),
             human=self.prompt_engine.render("human"),
-            persona=self.prompt_engine.render("persona")
+            persona=self.prompt_engine.render("persona"),
+            history=[],
         )
 
+        # restore the agent where it left off, if it has been persisted before
         if instance_id:
-            self.instance_id = instance_id
-            self.core_memory = self.persisted_core_memory.core
+            if persisted := self.core_cache.load(self.persisted_core_memory):
+                self.core_memory = persisted
+            else:
+                self.core_cache.track(self.persisted_core_memory, self.core_memory)
+
+        self.heartbeat = datetime.now().timestamp() + self.heartrate
 
         # start the daemon
-        self.daemon()
+        if autostart:
+            self.daemon()
 
 
     def daemon(self):
-        """the 'cognitive loop' of our agent. Continually processes existing 'thoughts', new stimuli, and generating responses."""
+        """the 'cognitive loop' of our agent. Continually processes existing 'thoughts', new stimuli, and generating responses.
+        Blocks forever; use `adaemon` to host many agents on one event loop.
+        """
+        asyncio.run(self.adaemon())
 
+    async def adaemon(self):
+        """the asyncio cognitive loop. Sleeps until the next heartbeat or until new stimuli arrive, whichever is first,
+        so an idle agent costs no CPU and thousands of agents (each with their own heartrate) can share one event loop.
+        """
         while "Continue thinking":
+            await self.until_heartbeat()
+            # for now, don't guard the daemon. Let's get to a point where the think loop is pretty well hardened and then worry about it
+            await asyncio.to_thread(self.beat)
 
-            if datetime.now().timestamp() <= self.heartbeat:
-                continue
+    async def until_heartbeat(self) -> bool:
+        """sleep until the heartbeat passes or new stimuli arrive.
+        Returns True if woken by new stimuli.
+        """
+        return await self.stimuli_queue.wait(max(0.0, self.heartbeat - datetime.now().timestamp()))
 
-            # for now, don't guard the daemon. Let's get to a point where the think loop is pretty well hardened and then worry about it
-            if new_thought := self.stimuli_queue.deque():
-                self.adust_recall_memory(new_thought)
-            self.think()
+    def beat(self) -> bool:
+        """a single pass of the cognitive loop: take in any new stimuli, then think if there was something new or the heartbeat is due.
+        Returns True if the agent thought.
+        """
+        with tracer.span("agent.beat", {"lucy.instance_id": self.instance_id}) as span:
+            stimuli = []
+            with tracer.span("stimuli.deque") as dequeued:
+                while new_thought := self.stimuli_queue.deque():
+                    self.adust_recall_memory(new_thought)
+                    stimuli.append(new_thought)
+                if dequeued.recording:
+                    dequeued.set("lucy.stimuli.count", len(stimuli))
+                    if stimuli:
+                        # from when each stimuli was created, which is as good as when it was enqueued
+                        dequeued.set("lucy.stimuli.max_wait", datetime.now().timestamp() - min(message.timestamp for message in stimuli))
+            if not stimuli and datetime.now().timestamp() < self.heartbeat:
+                span.set("lucy.thought", False)
+                return False
+            # set before thinking so a forced heartbeat (ie after tool calls) sticks
             self.heartbeat = datetime.now().timestamp() + self.heartrate
+            self.think()
+            # only once the turn is done, so stimuli taken by an agent that dies mid-turn are redelivered
+            self.stimuli_queue.ack(stimuli)
+            span.set("lucy.thought", True)
+            return True
 
 
     def think(self):
         """The process of incorporating stimuli into core memory, generating with that memory, and executing any tool calls in the response."""
-        response_message = self.inference_backend.generate(self.core_memory)
+        with tracer.span("agent.think", {"lucy.instance_id": self.instance_id}) as span:
+            if self.summarizer is not None and (summary := self.summarizer.apply(self.core_memory)):
+                self.recall_memory.write([summary])
+            tools = self.tool_engine.select(" ".join(message.content for message in self.core_memory.history.newest(3)),
+                                            limit=self.inference_backend.core_memory_maximum_tool_count)
+            turn, redacted = self.context_assembler.assemble(self.core_memory, tools)
+            if redacted:
+                logger.debug(f"Redacted {len(redacted)} messages from core memory history to fit the context window, pushing them to recall memory.")
+                self.push_to_recall(redacted)
+            if span.recording:
+                span.set("lucy.memory.history", len(self.core_memory.history))
+                span.set("lucy.tools.count", len(tools))
+            with tracer.span("inference.generate", {"gen_ai.request.model": self.inference_backend.model}) as generating:
+                turn = self.inference_backend.generate(turn)
+                if generating.recording:
+                    self._trace_usage(generating, turn)
+            response_message = turn.response_message
 
-        self.adust_recall_memory(response_message)
+            self.adust_recall_memory(response_message)
 
-        # intentionally blocking
-        if response_message.request_tools:
-            for tool_call in response_message.request_tools:
-                # some kind of tool handler that merges internal tools with a tools folder in the downstream project
-                tool_response:Message = self.tool_engine.execute(tool_call)
-                self.stimuli_queue.append(tool_response)
-            self.heartbeat = 0 # always force an immediate generation after tool calls
+            # the tool calls run concurrently, but the turn waits for all of them
+            if response_message.tool_calls:
+                tool_responses = self.tool_engine.execute_many(response_message.tool_calls)
+                with tracer.span("stimuli.enque", {"lucy.stimuli.count": len(tool_responses)}):
+                    for tool_response in tool_responses:
+                        self.stimuli_queue.enque(tool_response)
+                self.heartbeat = 0 # always force an immediate generation after tool calls
 
+            if self.instance_id:
+                self.core_cache.save(self.instance_id)
+
+    def _trace_usage(self, span: "Span", turn: "Turn") -> None:
+        """the turn's token usage, unless the backend already set what the model reported."""
+        backend = self.inference_backend
+        if "gen_ai.usage.input_tokens" not in span.attributes:
+            span.set("gen_ai.usage.input_tokens", sum(backend.count_tokens(message) for message in turn.request_messages)
+                                                  + sum(tool.token_count(backend.tokenizer) for tool in turn.request_tools))
+        if "gen_ai.usage.output_tokens" not in span.attributes and turn.response_message is not None:
+            span.set("gen_ai.usage.output_tokens", backend.count_tokens(turn.response_message))
 
     def core_memory_check(self) -> None:
         """check the state of core memory, and if it needs to be resized, add a stimuli to do so."""
 
         for segment in ("persona", "human",):
             max_chars = getattr(self.inference_backend, f"core_memory_maximum_chars_in_{segment}")
-            if len(getattr(self.core_memory, segment)) > max_chars:
+            if self.core_memory.chars_in(segment) > max_chars:
 
                 self.stimuli_queue.enque(
                     self.os_message(
@@ -123,20 +219,32 @@ class Agent:
                                                   segment=segment,
                                                   max_chars=max_chars)
                     ),
-                    priority=True
+                    priority=True,
+                    # one resize request per segment is enough, however many checks fail before the agent gets to it
+                    coalesce_key=f"core_memory_resize:{segment}",
                 )
 
     def adust_recall_memory(self, new_thought: "Message"):
         """check the number of recall memory entries in core, and adjust them if necessary."""
         logger.debug("Inserting new thought into core memory....")
-        if redacted := self.core_memory.fifo_history(new_thought, self.inference_backend.core_memory_maximum_number_of_messages_in_history):
+        if redacted := self.core_memory.fifo_history(new_thought,
+                                                     max_length=self.inference_backend.core_memory_maximum_number_of_messages_in_history,
+                                                     max_total_chars=self.inference_backend.core_memory_maximum_total_chars):
             logger.debug(f"Inserted new thought. Redacted {len(redacted)} messages from core memory history, pushing them to recall memory.")
-            self.recall_memory.write(redacted)
+            self.push_to_recall(redacted)
             logger.debug("Redacted messages pushed to recall memory.")
             return
         logger.debug("Inserted new thought. No redaction necessary.")
 
 
+    def push_to_recall(self, redacted: list["Message"]) -> None:
+        """store messages evicted from the history in recall memory, and have them folded into the summary in the background."""
+        tracer.current().add("lucy.memory.evicted", len(redacted))
+        self.recall_memory.write(redacted)
+        if self.summarizer is not None:
+            self.summarizer.submit(self.core_memory, redacted)
+
+
     def os_message(self, content: str):
         """construct an 'operating system' message to be added to the stimuli queue.
 
@@ -0,0 +1,70 @@
+from typing import Optional, Sequence, TYPE_CHECKING
+import hashlib
+import logging
+
+from lucy.schema import Message, Role, Turn
+
+if TYPE_CHECKING:
+    from lucy.backends.inference_backend_base import LucyInferenceBackendBase
+    from lucy.schema import LucyMemoryCore, Tool
+
+logger = logging.getLogger("lucy.agent.context")
+
+
+class ContextAssembler:
+    """Packs core memory into the inference backend's context window, measured in the model's tokens.
+
+    boot, bios, persona and human always go in, as the system message, with the stable segments first so backends can cache them as a prefix,
+    followed by the summary of the history evicted so far (see `RecallSummarizer`), if there is one.
+    The history gets whatever is left of the window (less the tokens reserved for the response); the oldest messages that don't fit are evicted so they can be pushed to recall memory.
+    Token counts are memoized on each message and the history keeps a running total, so assembly only pays for new and evicted messages.
+    """
+
+    def __init__(self, inference_backend: "LucyInferenceBackendBase"):
+        self.inference_backend = inference_backend
+        self._prefix: Optional[tuple[tuple[str, ...], str, str]] = None
+        self._system: Optional[tuple[str, str, str, Message]] = None
+
+    def prefix(self, core: "LucyMemoryCore") -> tuple[str, str]:
+        """The stable prompt prefix (boot, bios and persona) every turn starts with, and a key identifying it.
+        These segments rarely change, so backends can use the key to cache the prefix server-side (prefix/KV caching) and only process what follows.
+        """
+        segments = (core.boot, core.bios, core.persona,)
+        if self._prefix is None or self._prefix[0] != segments:
+            prefix = "\n\n".join(segments)
+            self._prefix = (segments, prefix, hashlib.sha256(prefix.encode()).hexdigest())
+        return self._prefix[1], self._prefix[2]
+
+    def system_message(self, core: "LucyMemoryCore") -> Message:
+        """the system message for the fixed segments of core memory: the stable prefix, the human, then the summary. Rebuilt only when a segment changes."""
+        prefix, _ = self.prefix(core)
+        if self._system is None or self._system[0] is not prefix or self._system[1] != core.human or self._system[2] != core.summary:
+            content = f"{prefix}\n\n{core.human}"
+            if core.summary:
+                content += f"\n\nSummary of the earlier conversation:\n{core.summary}"
+            self._system = (prefix, core.human, core.summary, Message(role=Role.system, content=content))
+        return self._system[3]
+
+    def history_budget(self, system: Message, tools: Sequence["Tool"] = ()) -> Optional[int]:
+        """the tokens left for history once the system message, tools and the response are accounted for."""
+        backend = self.inference_backend
+        if backend.context_window_tokens is None:
+            return None
+        budget = backend.context_window_tokens - backend.response_reserved_tokens - backend.count_tokens(system)
+        budget -= sum(tool.token_count(backend.tokenizer) for tool in tools)
+        if budget <= 0:
+            logger.warning("core memory leaves no room for history in a %s token context window", backend.context_window_tokens)
+        return budget
+
+    def assemble(self, core: "LucyMemoryCore", tools: Sequence["Tool"] = ()) -> tuple[Turn, list[Message]]:
+        """Builds the next turn from core memory.
+        Returns the turn, and the history messages evicted to make it fit (oldest first).
+        """
+        backend = self.inference_backend
+        system = self.system_message(core)
+        core.history.use_tokenizer(backend.tokenizer)
+        evicted = core.history.evict(max_length=backend.core_memory_maximum_number_of_messages_in_history,
+                                     max_tokens=self.history_budget(system, tools))
+        return Turn(request_messages=[system, *core.history],
+                    request_tools=list(tools),
+                    prefix_key=self.prefix(core)[1]), evicted
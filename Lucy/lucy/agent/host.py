@@ -0,0 +1,233 @@
+from typing import Callable, Optional, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import asyncio
+import logging
+import time
+
+from pydantic import Field
+
+from lucy.schema import LucySchema
+from lucy.tracing import tracer
+
+if TYPE_CHECKING:
+    from lucy.agent.agent import Agent
+    from lucy.schema import Message
+
+logger = logging.getLogger("lucy.agent.host")
+
+
+class AgentStats(LucySchema):
+    """load and latency numbers for a single hosted agent, used to size nodes."""
+    instance_id: str = Field(description="the agent instance these stats belong to")
+    queue_depth: Optional[int] = Field(description="stimuli waiting for the agent, if the queue can count them", default=None)
+    coalesced_stimuli: Optional[int] = Field(description="stimuli merged into one already waiting (ie turns saved), if the queue coalesces", default=None)
+    turns: int = Field(description="the number of turns the agent has taken since it was loaded", default=0)
+    last_turn_latency: Optional[float] = Field(description="seconds the most recent turn took", default=None)
+    max_turn_latency: Optional[float] = Field(description="seconds the slowest turn took", default=None)
+    total_turn_latency: float = Field(description="seconds spent in all turns combined", default=0.0)
+    last_active: float = Field(description="the last time the agent was loaded, stimulated or took a turn", default_factory=lambda: datetime.now().timestamp())
+
+    @property
+    def mean_turn_latency(self) -> Optional[float]:
+        return self.total_turn_latency / self.turns if self.turns else None
+
+
+class AgentHost:
+    """Hosts many agents in a single process.
+
+    Agents are loaded by instance_id on demand and share one event loop; each loaded agent sleeps until its heartbeat or new stimuli,
+    then takes its turn on a bounded worker pool. An agent never has more than one turn in flight and the pool works through turns first in, first out,
+    so a chatty agent can't starve the others.
+    Agents that have been idle longer than idle_timeout are persisted to their core memory backend and evicted, and restored from it the next time they are needed.
+
+    Args:
+        agent_factory: callable that builds an agent for an instance_id. Must not start the blocking daemon!
+        max_workers: the number of turns that can run at once
+        idle_timeout: seconds an agent can go without stimuli or turns before it is evicted
+        reap_interval: seconds between idle agent sweeps while `run` is active
+    """
+    agents: dict[str, "Agent"]
+
+    def __init__(self,
+                 agent_factory: Optional[Callable[[str], "Agent"]] = None,
+                 max_workers: int = 8,
+                 idle_timeout: float = 600,
+                 reap_interval: float = 30):
+        self.agent_factory = agent_factory or self._default_agent_factory
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="lucy-agent")
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.agents = {}
+        self._stats: dict[str, AgentStats] = {}
+        self._supervisors: dict[str, asyncio.Task] = {}
+        self._stopping: dict[str, asyncio.Event] = {}
+        self._loading: dict[str, asyncio.Future] = {}
+        self._turns: dict[str, asyncio.Future] = {}
+        self._evicting: dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def _default_agent_factory(instance_id: str) -> "Agent":
+        from lucy.agent.agent import Agent
+        return Agent(instance_id=instance_id, autostart=False)
+
+    async def load(self, instance_id: str) -> "Agent":
+        """get a hosted agent, restoring it from persisted core memory if it isn't loaded."""
+        if agent := self.agents.get(instance_id):
+            return agent
+        # don't restore from persisted core memory until the eviction has finished writing it
+        if evicting := self._evicting.get(instance_id):
+            await asyncio.shield(evicting)
+            return await self.load(instance_id)
+        # concurrent loads of the same agent share one restore
+        if loading := self._loading.get(instance_id):
+            return await asyncio.shield(loading)
+        loop = asyncio.get_running_loop()
+        self._loading[instance_id] = loading = loop.run_in_executor(self.executor, self.agent_factory, instance_id)
+        try:
+            agent = await loading
+        finally:
+            del self._loading[instance_id]
+        logger.debug("loaded agent %s", instance_id)
+        self._host(instance_id, agent, AgentStats(instance_id=instance_id, queue_depth=agent.stimuli_queue.depth))
+        return agent
+
+    def _host(self, instance_id: str, agent: "Agent", stats: AgentStats) -> None:
+        self.agents[instance_id] = agent
+        self._stats[instance_id] = stats
+        self._stopping[instance_id] = stopping = asyncio.Event()
+        self._supervisors[instance_id] = asyncio.create_task(self._supervise(agent, stopping), name=f"lucy-agent-{instance_id}")
+
+    async def submit(self, instance_id: str, message: "Message", priority: bool = False) -> None:
+        """send a stimuli to an agent, loading it first if needed."""
+        agent = await self.load(instance_id)
+        # waits for room if the agent's queue applies backpressure
+        with tracer.span("stimuli.enque", {"lucy.instance_id": instance_id, "lucy.stimuli.count": 1}) as span:
+            await agent.stimuli_queue.aenque(message, priority=priority)
+            span.set("lucy.stimuli.depth", agent.stimuli_queue.depth)
+        stats = self._stats[instance_id]
+        stats.queue_depth = agent.stimuli_queue.depth
+        stats.last_active = datetime.now().timestamp()
+
+    async def _supervise(self, agent: "Agent", stopping: asyncio.Event) -> None:
+        """the per-agent loop: sleep on the event loop, beat on the worker pool. Runs until stopping is set."""
+        loop = asyncio.get_running_loop()
+        stats = self._stats[agent.instance_id]
+        while not stopping.is_set():
+            await agent.until_heartbeat()
+            # checked as well as cancelling the supervisor, since a cancel that lands as the agent wakes can be lost
+            if stopping.is_set():
+                return
+            stats.queue_depth = agent.stimuli_queue.depth
+            started = time.perf_counter()
+            self._turns[agent.instance_id] = turn = loop.run_in_executor(self.executor, agent.beat)
+            try:
+                # shielded so an eviction waits for the turn to finish instead of abandoning it mid-thought
+                thought = await asyncio.shield(turn)
+            except Exception:
+                # one broken agent must not take the host down with it
+                logger.exception("agent %s failed to take its turn", agent.instance_id)
+                thought = False
+            finally:
+                if turn.done():
+                    self._turns.pop(agent.instance_id, None)
+            stats.queue_depth = agent.stimuli_queue.depth
+            stats.coalesced_stimuli = agent.stimuli_queue.coalesced
+            if not thought:
+                continue
+            latency = time.perf_counter() - started
+            stats.turns += 1
+            stats.last_turn_latency = latency
+            stats.total_turn_latency += latency
+            stats.max_turn_latency = max(stats.max_turn_latency or 0.0, latency)
+            stats.last_active = datetime.now().timestamp()
+
+    async def evict(self, instance_id: str) -> None:
+        """persist an agent's core memory and unload it. If it can't be persisted, the agent is kept loaded and the error raised."""
+        loop = asyncio.get_running_loop()
+        agent = self.agents.pop(instance_id)
+        supervisor = self._supervisors.pop(instance_id)
+        stopping = self._stopping.pop(instance_id)
+        stats = self._stats.pop(instance_id)
+        self._evicting[instance_id] = evicting = loop.create_future()
+        try:
+            stopping.set()
+            supervisor.cancel()
+            # and wake it, so it sees it's stopping even if the cancel is lost
+            agent.stimuli_queue.notify()
+            await asyncio.gather(supervisor, return_exceptions=True)
+            if turn := self._turns.pop(instance_id, None):
+                await asyncio.gather(turn, return_exceptions=True)
+            try:
+                await loop.run_in_executor(self.executor, self._persist, agent)
+            except Exception:
+                # unloaded, the writes it couldn't persist would be lost with it
+                self._host(instance_id, agent, stats)
+                raise
+        finally:
+            del self._evicting[instance_id]
+            evicting.set_result(None)
+        logger.debug("evicted agent %s", instance_id)
+
+    @staticmethod
+    def _persist(agent: "Agent") -> None:
+        # recall and archival first, so if either fails core memory is still tracked for the agent that's kept
+        agent.recall_memory.flush(raise_errors=True)
+        agent.archival_memory.flush(raise_errors=True)
+        if agent.instance_id:
+            agent.core_cache.evict(agent.instance_id)
+        else:
+            agent.persisted_core_memory.core = agent.core_memory
+        agent.tool_engine.close()
+
+    async def evict_idle(self) -> list[str]:
+        """evict every agent that is idle, not mid-turn and has nothing waiting in its queue.
+        Agents whose queue can't count what's waiting (a depth of None) are never evicted, since stimuli may be waiting for them.
+        """
+        cutoff = datetime.now().timestamp() - self.idle_timeout
+        evicted = []
+        for instance_id in [instance_id for instance_id in self._stats if self._idle(instance_id, cutoff)]:
+            # checked again, since a submit or turn during an earlier eviction may have woken it (or something else evicted it)
+            if self._idle(instance_id, cutoff):
+                try:
+                    await self.evict(instance_id)
+                except Exception:
+                    logger.exception("failed to evict agent %s, keeping it loaded", instance_id)
+                    continue
+                evicted.append(instance_id)
+        return evicted
+
+    def _idle(self, instance_id: str, cutoff: float) -> bool:
+        stats = self._stats.get(instance_id)
+        return (stats is not None
+                and stats.last_active < cutoff
+                and instance_id not in self._turns
+                and self.agents[instance_id].stimuli_queue.depth == 0)
+
+    async def run(self) -> None:
+        """sweep for idle agents forever. Run as a task alongside whatever is feeding the host stimuli."""
+        while "hosting":
+            await asyncio.sleep(self.reap_interval)
+            if evicted := await self.evict_idle():
+                logger.info("evicted %s idle agents", len(evicted))
+
+    async def shutdown(self) -> None:
+        """evict (and so persist) every agent, then stop the worker pool.
+        Raises if any agent couldn't be persisted, leaving those agents loaded and the pool running so shutdown can be retried.
+        """
+        failed = []
+        for instance_id in list(self.agents):
+            try:
+                await self.evict(instance_id)
+            except Exception:
+                logger.exception("failed to evict agent %s", instance_id)
+                failed.append(instance_id)
+        if failed:
+            raise RuntimeError(f"failed to persist agents {', '.join(failed)}, they're still loaded")
+        self.executor.shutdown(wait=True)
+
+    def stats(self) -> dict[str, AgentStats]:
+        """the current stats for every loaded agent, keyed by instance_id."""
+        for instance_id, agent in self.agents.items():
+            self._stats[instance_id].queue_depth = agent.stimuli_queue.depth
+        return dict(self._stats)
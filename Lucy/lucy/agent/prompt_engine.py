@@ -1,14 +1,53 @@
+from typing import Callable
+from functools import lru_cache
+import threading
 import jinja2
 
 
-class PromptEngine:
-    """an abstraction for the jinja2 templating engine with some Lucy specific functionality."""
+class CompiledTemplates:
+    """every template in a package, compiled once and pinned, plus a bounded LRU of their renders."""
 
-    def __init__(self, package:str, templates_directory: str):
+    def __init__(self, package: str, templates_directory: str, render_cache_size: int):
         self.env = jinja2.Environment(
             loader=jinja2.PackageLoader(package, templates_directory),
+            # templates are pinned below, there is nothing to reload or evict
+            auto_reload=False,
+            cache_size=-1,
         )
+        self.templates = {name: self.env.get_template(name) for name in self.env.list_templates()}
+        self.cached_render: Callable[[str, tuple], str] = lru_cache(maxsize=render_cache_size)(self.render)
+
+    def render(self, template: str, kwargs: tuple) -> str:
+        if (compiled := self.templates.get(template)) is None:
+            compiled = self.env.get_template(template)
+        return compiled.render(**dict(kwargs))
+
+
+class PromptEngine:
+    """an abstraction for the jinja2 templating engine with some Lucy specific functionality.
+
+    Every template in the package is compiled once per process, when the first engine for that package is created,
+    and shared by every engine (and so every agent) using it with the same render_cache_size.
+    Renders with hashable kwargs are memoized in a bounded LRU of render_cache_size renders.
+    """
+    _compiled: dict[tuple[str, str, int], CompiledTemplates] = {}
+    _compiling = threading.Lock()
+
+    def __init__(self, package:str, templates_directory: str, render_cache_size: int = 1024):
+        # an engine asking for a different cache size gets its own templates and cache, rather than silently sharing a cache of another size
+        key = (package, templates_directory, render_cache_size)
+        if (compiled := self._compiled.get(key)) is None:
+            with self._compiling:
+                if (compiled := self._compiled.get(key)) is None:
+                    compiled = self._compiled[key] = CompiledTemplates(package, templates_directory, render_cache_size)
+        self.compiled = compiled
+        self.env = compiled.env
 
     def render(self, template: str, **kwargs) -> str:
         """renders a template with kwargs"""
-        return self.env.get_template(template).render(**kwargs)
\ No newline at end of file
+        arguments = tuple(sorted(kwargs.items()))
+        try:
+            return self.compiled.cached_render(template, arguments)
+        except TypeError:
+            # unhashable kwargs can't be memoized
+            return self.compiled.render(template, arguments)
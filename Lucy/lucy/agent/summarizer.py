@@ -0,0 +1,125 @@
+from typing import List, Optional, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+
+import jinja2
+
+from lucy.schema import Message, Role, Turn
+
+if TYPE_CHECKING:
+    from lucy.backends.inference_backend_base import LucyInferenceBackendBase
+    from lucy.agent.prompt_engine import PromptEngine
+    from lucy.schema import LucyMemoryCore
+
+logger = logging.getLogger("lucy.agent.summarizer")
+
+# used when the inference backend doesn't ship a `recall_summary` template of its own
+DEFAULT_PROMPT = """You maintain the running summary of a conversation whose oldest messages have been moved out of view.
+Rewrite the summary so it also covers the messages below, keeping the facts, decisions, open questions and anything about the human worth remembering.
+Answer with the new summary only, in at most {{ max_chars }} characters.
+
+Current summary:
+{{ summary or "(none yet)" }}
+
+Messages moved out of view:
+{{ transcript }}"""
+_default_prompt = jinja2.Template(DEFAULT_PROMPT)
+
+
+class RecallSummarizer:
+    """Folds the messages evicted from core memory's history into the rolling `summary` segment of core memory, so the agent keeps the gist of them
+    without the history growing (MemGPT's recursive summary: each summary is the previous one rewritten to cover the newly evicted messages).
+
+    Summarizing is an extra generation, so it runs on a worker pool shared by every agent in the process, off the agent's turn:
+    `submit` the evicted messages and carry on, then `apply` the finished summary at the start of a later turn.
+    Batches evicted while a summary is being written are folded in together by the next one, in the order they were evicted.
+    The raw messages still go to recall memory as before; each new summary is written there too.
+
+    Args:
+        inference_backend: writes the summaries
+        prompt_engine: renders the backend's `recall_summary` template, if it has one
+        max_chars: the longest the summary may be, defaults to the backend's limit for the human segment
+    """
+    max_workers: int = 4
+    _executor: Optional[ThreadPoolExecutor] = None
+    _starting = threading.Lock()
+
+    def __init__(self,
+                 inference_backend: "LucyInferenceBackendBase",
+                 prompt_engine: Optional["PromptEngine"] = None,
+                 max_chars: Optional[int] = None):
+        self.inference_backend = inference_backend
+        self.prompt_engine = prompt_engine
+        self.max_chars = max_chars or inference_backend.core_memory_maximum_chars_in_human
+        self.summaries = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._pending: List[Message] = []
+        self._running = False
+        # the summary the next batch is folded into, and the newest one not yet applied to core memory
+        self._summary: Optional[str] = None
+        self._ready: Optional[str] = None
+
+    @classmethod
+    def _pool(cls) -> ThreadPoolExecutor:
+        with cls._starting:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=cls.max_workers, thread_name_prefix="lucy-summarizer")
+            return cls._executor
+
+    def submit(self, core: "LucyMemoryCore", messages: List[Message]) -> None:
+        """queue evicted messages (oldest first) to be folded into core's summary. Returns right away."""
+        if not messages:
+            return
+        with self._lock:
+            if self._summary is None:
+                self._summary = core.summary
+            self._pending.extend(messages)
+            if self._running:
+                return
+            self._running = True
+        self._pool().submit(self._run)
+
+    def apply(self, core: "LucyMemoryCore") -> Optional[Message]:
+        """Sets core's summary to the newest one written, if there's a new one.
+        Returns it as a message to store in recall memory, None if nothing changed.
+        """
+        with self._lock:
+            summary, self._ready = self._ready, None
+        if summary is None or summary == core.summary:
+            return None
+        core.summary = summary
+        return Message(role=Role.system, content=f"Summary of the earlier conversation:\n{summary}")
+
+    def _run(self) -> None:
+        while "batches are pending":
+            with self._lock:
+                batch, self._pending = self._pending, []
+                if not batch:
+                    self._running = False
+                    return
+                summary = self._summary
+            try:
+                summary = self.summarize(summary, batch)
+            except Exception as e:
+                # the messages are in recall memory regardless, the summary just misses them
+                self.failures += 1
+                logger.warning("failed to summarize %s evicted messages: %r", len(batch), e)
+                continue
+            with self._lock:
+                self.summaries += 1
+                self._summary = self._ready = summary
+
+    def summarize(self, summary: str, messages: List[Message]) -> str:
+        """the summary rewritten to cover messages too."""
+        transcript = "\n".join(f"{message.role.value}: {message.content}" for message in messages if message.content)
+        turn = self.inference_backend.generate(Turn(request_messages=[Message(role=Role.user, content=self.prompt(summary, transcript))],
+                                                    request_tools=[]))
+        return (turn.response_message.content or summary).strip()[:self.max_chars]
+
+    def prompt(self, summary: str, transcript: str) -> str:
+        arguments = {"summary": summary, "transcript": transcript, "max_chars": self.max_chars}
+        if self.prompt_engine is not None and "recall_summary" in self.prompt_engine.compiled.templates:
+            return self.prompt_engine.render("recall_summary", **arguments)
+        return _default_prompt.render(**arguments)
@@ -1,3 +1,5 @@
-from lucy.agent.tool_engine.tool_engine import ToolEngine
+from lucy.agent.tool_engine.tool_engine import ToolEngine, ToolStats, cacheable, timeout
+from lucy.agent.tool_engine.registry import ToolRegistry
+from lucy.agent.tool_engine.index import ToolIndex
 
-__all__ = ["ToolEngine"]
\ No newline at end of file
+__all__ = ["ToolEngine", "ToolStats", "ToolRegistry", "ToolIndex", "cacheable", "timeout"]
\ No newline at end of file
@@ -0,0 +1,73 @@
+from typing import Iterable, Optional, TYPE_CHECKING
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+from lucy.backends.embedders import HashingEmbeddingBackend
+
+if TYPE_CHECKING:
+    from lucy.backends.embedding_backend_base import LucyEmbeddingBackendBase
+    from lucy.schema import Tool
+
+
+class ToolIndex:
+    """Finds the tools most relevant to some text, by the cosine similarity of their embedded names and descriptions.
+
+    Tools are embedded once, into a normalized (tools, dimensions) matrix per set of tools (the last few sets are kept) that is rebuilt only when the set changes,
+    and even then the embedding backend's cache means only new or changed tools are embedded again. A search is one embedding and one matrix product.
+
+    Args:
+        embedding_backend: embeds tools and queries, defaults to a `HashingEmbeddingBackend` (local, no model required)
+    """
+
+    def __init__(self, embedding_backend: Optional["LucyEmbeddingBackendBase"] = None):
+        self.embedding_backend = embedding_backend or HashingEmbeddingBackend()
+        self._indexed: OrderedDict[tuple[str, ...], tuple[list["Tool"], np.ndarray, dict[str, int]]] = OrderedDict()
+        self._last: Optional[tuple[list["Tool"], tuple[list["Tool"], np.ndarray, dict[str, int]]]] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def text(tool: "Tool") -> str:
+        """what is embedded for a tool."""
+        parameters = " ".join(f"{parameter.name} {parameter.description}" for parameter in tool.parameters or [])
+        return f"{tool.name.replace('_', ' ')}: {tool.description} {parameters}".strip()
+
+    def _matrix(self, tools: list["Tool"]) -> tuple[list["Tool"], np.ndarray, dict[str, int]]:
+        """the index of a set of tools: the tools, their normalized embeddings, and each one's row by name."""
+        with self._lock:
+            # the same list as last time (ie an engine's cached tools) is the same set of tools
+            if self._last is not None and self._last[0] is tools:
+                return self._last[1]
+            key = tuple(tool.request_json for tool in tools)
+            if (indexed := self._indexed.get(key)) is not None:
+                self._indexed.move_to_end(key)
+                self._last = (tools, indexed)
+                return indexed
+        embeddings = np.stack(self.embedding_backend.embed_many([self.text(tool) for tool in tools])).astype(np.float32) if tools else np.empty((0, self.embedding_backend.dimensions), dtype=np.float32)
+        indexed = (list(tools),
+                   embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12),
+                   {tool.name: row for row, tool in enumerate(tools)})
+        with self._lock:
+            self._indexed[key] = indexed
+            self._last = (tools, indexed)
+            while len(self._indexed) > 8:
+                self._indexed.popitem(last=False)
+        return indexed
+
+    def search(self, query: str, tools: list["Tool"], k: int, exclude: Iterable[str] = ()) -> list["Tool"]:
+        """the k tools most relevant to query, most relevant first, skipping any named in exclude."""
+        tools, matrix, rows = self._matrix(tools)
+        excluded = [rows[name] for name in exclude if name in rows]
+        k = min(k, len(tools) - len(excluded))
+        if k <= 0:
+            return []
+        embedded = self.embedding_backend.embed(query)
+        scores = matrix @ (embedded / max(float(np.linalg.norm(embedded)), 1e-12))
+        scores[excluded] = -np.inf
+        best = np.argpartition(-scores, k - 1)[:k]
+        return [tools[i] for i in best[np.argsort(-scores[best], kind="stable")]]
+
+
+# the index engines share by default
+tool_index = ToolIndex()
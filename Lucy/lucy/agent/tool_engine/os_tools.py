@@ -41,4 +41,4 @@ def archive_content(content: str):
     Returns:
         str: A message indicating the success or failure of the operation.
     """
-    raise NotImplementedError
\ No newline at end of file
+    raise NotImplementedError
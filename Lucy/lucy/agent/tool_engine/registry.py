@@ -0,0 +1,220 @@
+from typing import Callable, Iterable, Optional
+from importlib import import_module, reload
+from importlib.util import find_spec, module_from_spec, spec_from_file_location
+from types import ModuleType
+import ast
+import inspect
+import logging
+import os
+import re
+import sys
+import textwrap
+import threading
+import time
+
+from lucy.schema import Tool, ToolParameter
+
+logger = logging.getLogger("lucy.agent.tool_engine.registry")
+
+_json_types = {"str": "string", "int": "integer", "float": "number", "bool": "boolean",
+               "list": "array", "List": "array", "tuple": "array", "set": "array", "dict": "object", "Dict": "object"}
+_argument = re.compile(r"^(\*{0,2}\w+)\s*(?:\(([^)]*)\))?\s*:\s*(.*)$")
+
+
+def parse_docstring(docstring: Optional[str]) -> tuple[str, dict[str, tuple[Optional[str], str]]]:
+    """A Google-style docstring's description, and the (type, description) of each argument in its Args section."""
+    description, arguments, section, current = [], {}, None, None
+    for line in (docstring or "").splitlines():
+        stripped = line.strip()
+        if stripped.endswith(":") and not line[:1].isspace() and " " not in stripped:
+            section, current = stripped[:-1].lower(), None
+        elif section is None:
+            description.append(stripped)
+        elif section in ("args", "arguments", "parameters") and stripped:
+            if (match := _argument.match(stripped)) and (current is None or len(line) - len(line.lstrip()) <= current[0]):
+                name, type_, text = match.groups()
+                current = (len(line) - len(line.lstrip()), name.lstrip("*"))
+                arguments[current[1]] = (type_, text)
+            elif current is not None:
+                type_, text = arguments[current[1]]
+                arguments[current[1]] = (type_, f"{text} {stripped}")
+    return " ".join(" ".join(description).split()), arguments
+
+
+def _annotation(node: Optional[ast.expr]) -> tuple[Optional[str], Optional[list[str]]]:
+    """the json schema type (and enum, for Literals) of a parameter's annotation."""
+    if node is None:
+        return None, None
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        # a string annotation
+        try:
+            return _annotation(ast.parse(node.value, mode="eval").body)
+        except SyntaxError:
+            return None, None
+    if isinstance(node, ast.Subscript):
+        outer = ast.unparse(node.value).split(".")[-1]
+        if outer == "Literal":
+            values = node.slice.elts if isinstance(node.slice, ast.Tuple) else [node.slice]
+            constants = [value.value for value in values if isinstance(value, ast.Constant)]
+            return _json_types.get(type(constants[0]).__name__, "string") if constants else None, [str(value) for value in constants]
+        if outer == "Optional":
+            return _annotation(node.slice)
+        return _json_types.get(outer), None
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+        # X | None
+        return _annotation(node.right if ast.unparse(node.left) == "None" else node.left)
+    return _json_types.get(ast.unparse(node).split(".")[-1]), None
+
+
+def parse_tools(source: str) -> list[Tool]:
+    """The tools defined in python source: every public function at module level, described by its signature and Google-style docstring.
+    Nothing is imported or run.
+    """
+    return [_tool(node) for node in ast.parse(source).body
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and not node.name.startswith("_")]
+
+
+def method_tool(method: Callable) -> Tool:
+    """The tool a method defines, described like `parse_tools` describes a function but without its self argument
+    (ie an os tool the engine answers itself, so the tool and the method that runs it can't drift apart).
+    """
+    node = ast.parse(textwrap.dedent(inspect.getsource(method))).body[0]
+    node.args.args = node.args.args[1:]
+    return _tool(node)
+
+
+def _tool(node: "ast.FunctionDef | ast.AsyncFunctionDef") -> Tool:
+    description, documented = parse_docstring(ast.get_docstring(node))
+    positional = node.args.posonlyargs + node.args.args
+    defaults = [None] * (len(positional) - len(node.args.defaults)) + node.args.defaults
+    parameters = []
+    for argument, default in [*zip(positional, defaults), *zip(node.args.kwonlyargs, node.args.kw_defaults)]:
+        type_, enum = _annotation(argument.annotation)
+        documented_type, text = documented.get(argument.arg, (None, ""))
+        parameters.append(ToolParameter(name=argument.arg,
+                                        type=type_ or _json_types.get(documented_type or "", "string"),
+                                        description=text,
+                                        default="" if default is None else ast.unparse(default),
+                                        required=default is None,
+                                        enum=enum))
+    return Tool(name=node.name, description=description, parameters=parameters or None)
+
+
+class ToolSource:
+    """A python file of tools: parsed up front, imported only when one of its tools is first called."""
+
+    def __init__(self, path: str, module_name: Optional[str] = None):
+        self.path = path
+        # importable modules are imported by name, so they're never loaded twice
+        self.module_name = module_name
+        self.mtime = os.stat(path).st_mtime_ns
+        with open(path, encoding="utf-8") as file:
+            self.tools = parse_tools(file.read())
+        self._module: Optional[ModuleType] = None
+
+    @property
+    def module(self) -> ModuleType:
+        if self._module is None:
+            if self.module_name:
+                self._module = import_module(self.module_name)
+            else:
+                name = f"lucy_tools_{os.path.splitext(os.path.basename(self.path))[0]}_{abs(hash(self.path))}"
+                spec = spec_from_file_location(name, self.path)
+                self._module = module_from_spec(spec)
+                spec.loader.exec_module(self._module)
+        return self._module
+
+    def reloaded(self) -> "ToolSource":
+        """the source re-parsed, and re-imported when next called, after the file changed."""
+        source = ToolSource(self.path, self.module_name)
+        if self._module is not None and self.module_name and sys.modules.get(self.module_name) is self._module:
+            source._module = reload(self._module)
+        return source
+
+
+class ToolRegistry:
+    """Every tool available to agents, parsed from the tool sources once and cached.
+
+    Sources are python files, directories of them, or importable module names, in increasing precedence (ie os tools, then backend tools, then user tools):
+    a tool defined in a later source replaces one with the same name in an earlier one.
+    Tools are parsed from the source without importing it (see `parse_tools`), so startup stays fast; a source is imported when one of its tools is first called.
+    The parsed `Tool`s memoize their request schema, json and token counts, so they cost nothing to send after the first turn.
+    `refresh` (at most once every check_interval seconds) re-parses any source that changed and picks up files added to (or removed from) a directory.
+
+    Args:
+        sources: python files, directories of them, or importable module names
+        check_interval: the fewest seconds between checks for changed sources. None to never check
+    """
+    _shared: dict[tuple, "ToolRegistry"] = {}
+    _sharing = threading.Lock()
+
+    def __init__(self, sources: Iterable[str], check_interval: Optional[float] = 2.0):
+        self.sources = tuple(sources)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._files: dict[str, ToolSource] = {}
+        self._checked = time.monotonic()
+        self.tools: dict[str, Tool] = {}
+        # bumped whenever the tools change
+        self.version = 0
+        self._origins: dict[str, ToolSource] = {}
+        self._scan()
+
+    @classmethod
+    def shared(cls, sources: Iterable[str], check_interval: Optional[float] = 2.0) -> "ToolRegistry":
+        """the registry for these sources, shared by every agent in the process so tools are only parsed once."""
+        sources = tuple(sources)
+        with cls._sharing:
+            if (registry := cls._shared.get(sources)) is None:
+                registry = cls._shared[sources] = cls(sources, check_interval)
+            return registry
+
+    def _paths(self) -> list[tuple[str, Optional[str]]]:
+        """the files (and module names, for importable modules) to parse, in order of precedence."""
+        paths = []
+        for source in self.sources:
+            if os.path.isdir(source):
+                paths.extend((os.path.join(source, name), None) for name in sorted(os.listdir(source))
+                             if name.endswith(".py") and not name.startswith("_"))
+            elif os.path.exists(source):
+                paths.append((source, None))
+            else:
+                paths.append((find_spec(source).origin, source))
+        return paths
+
+    def _scan(self) -> None:
+        with self._lock:
+            files, changed = {}, False
+            for path, module_name in self._paths():
+                if (known := self._files.get(path)) is None:
+                    files[path], changed = ToolSource(path, module_name), True
+                elif known.mtime != os.stat(path).st_mtime_ns:
+                    logger.info("reloading tools from %s", path)
+                    files[path], changed = known.reloaded(), True
+                else:
+                    files[path] = known
+            if not changed and files.keys() == self._files.keys():
+                return
+            tools, origins = {}, {}
+            for source in files.values():
+                for tool in source.tools:
+                    tools[tool.name], origins[tool.name] = tool, source
+            self._files, self.tools, self._origins = files, tools, origins
+            self.version += 1
+
+    def refresh(self) -> None:
+        """re-parse whatever changed since the last check, if check_interval has passed."""
+        if self.check_interval is None or time.monotonic() - self._checked < self.check_interval:
+            return
+        self._checked = time.monotonic()
+        self._scan()
+
+    def source_of(self, name: str) -> Optional[ToolSource]:
+        return self._origins.get(name)
+
+    def function(self, name: str) -> Optional[Callable]:
+        """the function behind a tool, importing its source if this is the first call. None if there's no such tool."""
+        if (source := self._origins.get(name)) is None:
+            return None
+        with self._lock:
+            return getattr(source.module, name, None)
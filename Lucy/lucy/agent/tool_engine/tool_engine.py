@@ -1,5 +1,63 @@
-from typing import List
-from lucy.schema import ToolCall, Message, Tool
+from typing import Any, Callable, List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import cache
+import asyncio
+import inspect
+import json
+import logging
+import threading
+import time
+
+from pydantic import Field
+
+from lucy.schema import LucySchema, ToolCall, Message, Role, Tool
+from lucy.backends.cache import LucyCacheBase, LRUCache, cache_key
+from lucy.agent.tool_engine import os_tools
+from lucy.agent.tool_engine.registry import ToolRegistry, method_tool
+from lucy.agent.tool_engine.index import ToolIndex, tool_index as default_tool_index
+from lucy.tracing import tracer
+
+logger = logging.getLogger("lucy.agent.tool_engine")
+
+
+def timeout(seconds: float) -> Callable:
+    """decorate a tool to give it its own timeout, rather than the engine's."""
+    def decorate(function: Callable) -> Callable:
+        function.timeout = seconds
+        return function
+    return decorate
+
+
+def cacheable(ttl: Optional[float] = None) -> Callable:
+    """decorate a deterministic tool so its results are cached, by its arguments, for ttl seconds (None for as long as the cache keeps them).
+    Only tools without side effects should be cacheable: a cached call doesn't run at all.
+    """
+    def decorate(function: Callable) -> Callable:
+        function.cacheable = True
+        function.cache_ttl = ttl
+        return function
+    return decorate
+
+
+# the results of cacheable tools, shared by every engine that isn't given a cache of its own
+tool_cache = LRUCache(max_items=4096)
+
+
+class ToolStats(LucySchema):
+    """call counts and latency for a single tool."""
+    name: str = Field(description="the tool these stats belong to")
+    calls: int = Field(description="the number of times the tool has been called", default=0)
+    failures: int = Field(description="calls that raised an exception", default=0)
+    timeouts: int = Field(description="calls that didn't finish in time", default=0)
+    cache_hits: int = Field(description="calls answered from the cache, without running the tool", default=0)
+    last_latency: Optional[float] = Field(description="seconds the most recent call took to run", default=None)
+    max_latency: Optional[float] = Field(description="seconds the slowest call took to run", default=None)
+    total_latency: float = Field(description="seconds spent running the tool in all calls combined", default=0.0)
+
+    @property
+    def mean_latency(self) -> Optional[float]:
+        finished = self.calls - self.timeouts - self.cache_hits
+        return self.total_latency / finished if finished else None
 
 
 class ToolEngine:
@@ -16,21 +74,230 @@ class ToolEngine:
     3. os defined
 
     if the stack gets too large (inference backend setting?) it needs to add functionality to search tools and add those to the following Turn.
+
+    The tool calls in a response run concurrently: plain functions on the engine's own bounded thread pool, coroutine functions on its own event loop,
+    so a response asking for three slow tools takes as long as the slowest rather than all three.
+    Every call has its own timeout (the engine's, or the tool's own, see `timeout`); a call that runs out of time is cancelled and answered with an error.
+    A thread can't be interrupted, so a timed out plain function runs on in the pool and its result is thrown away.
+    Threads and the event loop are only started once the agent first calls a tool.
+    Tools are discovered through a `ToolRegistry` shared by every engine with the same tools, so they're parsed once per process.
+
+    Tools marked `cacheable` are answered from the cache when they're called again with the same arguments (in any order), until their ttl passes.
+
+    When there are more tools than a turn can carry, `select` sends the os tools, then any the agent found with the `search_tools` os tool,
+    then the tools most relevant to the conversation (see `ToolIndex`); the rest can still be found with `search_tools`.
+
+    Args:
+        alternate_tools_path: a python file (or directory of them) of user-defined tools, which take precedence over the os tools
+        max_workers: the number of plain function tools that can run at once
+        timeout: the seconds a tool call may take, unless the tool sets its own
+        tool_index: finds the tools relevant to a turn, defaults to the process-wide `tool_index`
+        cache: keeps the results of cacheable tools, defaults to the process-wide `tool_cache`
     """
+    stats: dict[str, ToolStats]
+
+    def __init__(self,
+                 alternate_tools_path: Optional[str] = None,
+                 max_workers: int = 4,
+                 timeout: float = 30.0,
+                 tool_index: Optional[ToolIndex] = None,
+                 cache: Optional[LucyCacheBase] = None):
+        self.alternate_tools_path = alternate_tools_path
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.stats = {}
+        # os tools first, so user-defined tools replace them
+        self.registry = ToolRegistry.shared([os_tools.__name__, *([alternate_tools_path] if alternate_tools_path else [])])
+        self.tool_index = tool_index or default_tool_index
+        self.cache = cache if cache is not None else tool_cache
+        # tools the agent found with search_tools, sent with every turn until its next search
+        self.searched: list[str] = []
+        self._listed: Optional[tuple[int, List[Tool], List[Tool]]] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._starting = threading.Lock()
+
+    def _catalog(self) -> tuple[List[Tool], List[Tool]]:
+        """every tool, and the os tools, listed once per version of the registry. `search_tools` is always the engine's own."""
+        self.registry.refresh()
+        if self._listed is None or self._listed[0] != self.registry.version:
+            search = _search_tool()
+            tools = [tool for tool in self.registry.tools.values() if tool.name != search.name] + [search]
+            self._listed = (self.registry.version, tools,
+                            [tool for tool in tools if tool is search or self.registry.source_of(tool.name).module_name == os_tools.__name__])
+        return self._listed[1], self._listed[2]
 
+    @property
+    def tools(self) -> List[Tool]:
+        """every tool the agent can call, user-defined tools replacing os tools of the same name. Shared, so don't change it."""
+        return self._catalog()[0]
+
+    def function(self, name: str) -> Optional[Callable]:
+        """the function behind a tool, None if there's no such tool."""
+        if name == "search_tools":
+            return self.search_tools
+        return self.registry.function(name)
+
+    def select(self, context: str, limit: Optional[int] = None) -> List[Tool]:
+        """The tools to send with a turn: all of them if they fit in limit, otherwise the os tools,
+        then the tools the agent searched for, then those most relevant to context (ie the newest messages).
+        """
+        tools = self.tools
+        if limit is None or len(tools) <= limit:
+            return tools
+        chosen = {tool.name: tool for tool in self.os_tools}
+        for name in self.searched:
+            if name in self.registry.tools:
+                chosen.setdefault(name, self.registry.tools[name])
+        selected = list(chosen.values())[:limit]
+        return selected + self.tool_index.search(context, tools, limit - len(selected), exclude=chosen)
+
+    def search_tools(self, query: str, k: int = 5) -> str:
+        """Search for tools that aren't currently available to you. The tools found are available from your next turn.
 
-    def execute(self, tool_call:ToolCall) -> Message:
+        Args:
+            query (str): What you need a tool to do.
+            k (int): The most tools to find.
+
+        Returns:
+            str: The names and descriptions of the tools found.
+        """
+        # the `search_tools` os tool, described to the model by this signature and docstring (see `_search_tool`):
+        # finds the k tools (that aren't os tools) most relevant to query, and sends them with the agent's turns until its next search
+        found = self.tool_index.search(query, self.tools, k, exclude={tool.name for tool in self.os_tools})
+        self.searched = [tool.name for tool in found]
+        if not found:
+            return "No tools found."
+        return "\n".join(f"{tool.name}: {tool.description}" for tool in found)
+
+    def execute(self, tool_call: ToolCall) -> Message:
         """Executes the tool call and returns the result.
         """
+        return self.execute_many([tool_call])[0]
+
+    def execute_many(self, tool_calls: List[ToolCall]) -> List[Message]:
+        """Executes the tool calls concurrently, and returns their results in the order they were called."""
+        with tracer.span("tools.execute", {"lucy.tools.count": len(tool_calls)}):
+            started = time.monotonic()
+            running = [(tool_call, *self._start(tool_call)) for tool_call in tool_calls]
+            return [self._finish(tool_call, call, key, started) for tool_call, call, key in running]
+
+    def _start(self, tool_call: ToolCall) -> tuple[Future, Optional[str]]:
+        """the running call, and its cache key if the tool is cacheable. A call answered from the cache is already done, with no latency."""
+        name = tool_call.function.name
+        function = self.function(name)
+        if function is None:
+            future = Future()
+            future.set_exception(LookupError(f"there is no tool named {name}"))
+            return future, None
+        key = None
+        if getattr(function, "cacheable", False):
+            # keyed on the file the tool came from and its version, so engines over different tools (or a tool since edited) don't share results
+            source = self.registry.source_of(name)
+            key = cache_key("tool", source and source.path, source and source.mtime, name, tool_call.function.arguments)
+            if (cached := self.cache.get(key)) is not None:
+                future = Future()
+                future.set_result((cached, None))
+                return future, None
+        if inspect.iscoroutinefunction(function):
+            return asyncio.run_coroutine_threadsafe(self._timed_coroutine(function, tool_call.function.arguments), self._event_loop()), key
+        return self._pool().submit(self._timed, function, tool_call.function.arguments), key
+
+    @staticmethod
+    def _timed(function: Callable, arguments: dict) -> tuple[Any, float]:
+        started = time.perf_counter()
+        result = function(**arguments)
+        return result, time.perf_counter() - started
+
+    @staticmethod
+    async def _timed_coroutine(function: Callable, arguments: dict) -> tuple[Any, float]:
+        started = time.perf_counter()
+        result = await function(**arguments)
+        return result, time.perf_counter() - started
+
+    def _finish(self, tool_call: ToolCall, call: Future, key: Optional[str], started: float) -> Message:
+        """waits out the call's timeout (counted from when the calls started) and answers with its result or error, caching the result under key."""
+        name = tool_call.function.name
+        function = self.function(name)
+        limit = getattr(function, "timeout", self.timeout)
+        stats = self.stats.setdefault(name, ToolStats(name=name))
+        stats.calls += 1
         try:
-            # look up, parse, and execute the tool here
-            pass
+            result, latency = call.result(timeout=max(0.0, started + limit - time.monotonic()))
         except Exception as e:
-            # construct a tools message with the error
-            # also warn the shit out of someone - this could turn into a broken loop otherwise
-            pass
+            # (a tool can raise TimeoutError too, only a call that's still running timed out)
+            if isinstance(e, FutureTimeout) and not call.done():
+                call.cancel()
+                stats.timeouts += 1
+                outcome, latency = "timeout", time.monotonic() - started
+                logger.warning("tool %s timed out after %ss", name, limit)
+                content = f"Error: {name} timed out after {limit} seconds"
+            else:
+                # warn loudly: a tool that keeps failing can send the agent round in a loop
+                stats.failures += 1
+                outcome, latency = "error", time.monotonic() - started
+                logger.warning("tool %s failed: %r", name, e)
+                content = f"Error: {type(e).__name__}: {e}"
+        else:
+            content = result if isinstance(result, str) else json.dumps(result, default=str)
+            outcome = "ok"
+            if latency is None:
+                stats.cache_hits += 1
+                outcome, latency = "cached", 0.0
+            else:
+                stats.last_latency = latency
+                stats.total_latency += latency
+                stats.max_latency = max(stats.max_latency or 0.0, latency)
+                if key is not None:
+                    self.cache.set(key, content, getattr(function, "cache_ttl", None))
+        if tracer.enabled:
+            # timed on the worker, so recorded once it's over
+            tracer.record("tool.call", latency, {"lucy.tool.name": name, "lucy.tool.outcome": outcome})
+        return Message(role=Role.tool, tool_call_id=tool_call.id, content=content)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._starting:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="lucy-tool")
+            return self._executor
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._starting:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._run_loop, args=(self._loop,), name="lucy-tool-loop", daemon=True).start()
+            return self._loop
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop) -> None:
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_forever()
+        finally:
+            # let abandoned calls see their cancellation before the loop goes away
+            running = asyncio.all_tasks(loop)
+            for task in running:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*running, return_exceptions=True))
+            loop.close()
+
+    def close(self) -> None:
+        """stop the engine's threads and event loop (ie when the agent is unloaded). Calls still running are abandoned."""
+        with self._starting:
+            executor, self._executor = self._executor, None
+            loop, self._loop = self._loop, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
 
     @property
     def os_tools(self) -> List[Tool]:
         """get only the tools that are used by the Lucy 'Operating System' - including all those offered by the inference and different memory backends"""
-        raise NotImplementedError
\ No newline at end of file
+        return self._catalog()[1]
+
+
+@cache
+def _search_tool() -> Tool:
+    """the `search_tools` os tool, parsed from `ToolEngine.search_tools` once."""
+    return method_tool(ToolEngine.search_tools)
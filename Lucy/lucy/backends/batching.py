@@ -0,0 +1,123 @@
+from typing import Any, TYPE_CHECKING
+from concurrent.futures import Future
+import asyncio
+import logging
+import threading
+
+if TYPE_CHECKING:
+    from lucy.backends.inference_backend_base import LucyInferenceBackendBase
+    from lucy.schema import Turn
+
+logger = logging.getLogger("lucy.backends.batching")
+
+
+class MicroBatchDispatcher:
+    """Collects the turns of many agents sharing an inference backend for a short window,
+    then sends them to the backend together with `agenerate_many` and routes each completed turn back to the agent that submitted it.
+
+    The dispatcher stands in for the backend it wraps (everything it doesn't override is read from the backend),
+    so it can be handed to agents as their inference_backend as-is.
+
+    Args:
+        backend: the inference backend to batch turns for
+        window: seconds to wait for more turns after the first turn of a batch arrives
+        max_batch_size: a batch is dispatched right away once it is this big
+    """
+    batches: int
+    batched_turns: int
+
+    def __init__(self,
+                 backend: "LucyInferenceBackendBase",
+                 window: float = 0.01,
+                 max_batch_size: int = 32):
+        self.backend = backend
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.batched_turns = 0
+        self._pending: list[tuple["Turn", Future]] = []
+        self._batch_id = 0
+        self._lock = threading.Lock()
+        self._in_flight: set[asyncio.Task] = set()
+        # batches are dispatched from a loop of our own, so both sync and async callers can submit
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="lucy-batching", daemon=True)
+        self._thread.start()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.backend, name)
+
+    def submit(self, turn: "Turn") -> Future:
+        """add a turn to the current batch. The future resolves to the completed turn."""
+        future = Future()
+        with self._lock:
+            self._pending.append((turn, future))
+            if len(self._pending) >= self.max_batch_size:
+                self._loop.call_soon_threadsafe(self._dispatch, self._take())
+            elif len(self._pending) == 1:
+                self._loop.call_soon_threadsafe(self._loop.call_later, self.window, self._flush, self._batch_id)
+        return future
+
+    def generate(self, turn: "Turn") -> "Turn":
+        """Batches the turn with those of other agents and blocks until it is complete.
+        Never call this from the dispatcher's own loop!
+        """
+        return self.submit(turn).result()
+
+    async def agenerate(self, turn: "Turn") -> "Turn":
+        """Batches the turn with those of other agents without blocking the caller's event loop."""
+        return await asyncio.wrap_future(self.submit(turn))
+
+    def close(self) -> None:
+        """dispatch anything still pending, wait for every batch in flight, then stop the dispatcher loop."""
+        with self._lock:
+            if self._pending:
+                self._loop.call_soon_threadsafe(self._dispatch, self._take())
+        asyncio.run_coroutine_threadsafe(self._drain(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _drain(self) -> None:
+        while self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def _take(self) -> list[tuple["Turn", Future]]:
+        """take the pending batch and start a new one. Caller must hold the lock."""
+        batch, self._pending = self._pending, []
+        self._batch_id += 1
+        return batch
+
+    def _flush(self, batch_id: int) -> None:
+        """the window for a batch has closed; dispatch it unless it already went out for being full."""
+        with self._lock:
+            if batch_id != self._batch_id or not self._pending:
+                return
+            batch = self._take()
+        self._dispatch(batch)
+
+    def _dispatch(self, batch: list[tuple["Turn", Future]]) -> None:
+        self.batches += 1
+        self.batched_turns += len(batch)
+        task = self._loop.create_task(self._generate(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _generate(self, batch: list[tuple["Turn", Future]]) -> None:
+        logger.debug("dispatching a batch of %s turns", len(batch))
+        try:
+            completed = await self.backend.agenerate_many([turn for turn, _ in batch])
+            for (_, future), turn in zip(batch, completed):
+                if not future.done():
+                    future.set_result(turn)
+            if len(completed) != len(batch):
+                raise RuntimeError(f"{type(self.backend).__name__}.agenerate_many completed {len(completed)} of a batch of {len(batch)} turns")
+        except Exception as e:
+            logger.exception("batch of %s turns failed", len(batch))
+            error = e
+        else:
+            return
+        # every agent still waiting gets the error, rather than waiting forever
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
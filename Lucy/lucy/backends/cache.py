@@ -0,0 +1,235 @@
+from typing import Any, Optional, TYPE_CHECKING
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import time
+
+from pydantic import Field
+
+from lucy import encoding
+from lucy.schema import LucySchema
+
+if TYPE_CHECKING:
+    import sqlite3
+
+
+def canonical(value: Any) -> str:
+    """value as json that's the same however it was built (ie whatever order a dict's keys were added in)."""
+    return encoding.dumps(value, sort_keys=True, default=str)
+
+
+def cache_key(*parts: Any) -> str:
+    """a key for parts, by a hash of their canonical json."""
+    return hashlib.sha256(canonical(parts).encode()).hexdigest()
+
+
+class CacheStats(LucySchema):
+    """how well a cache is doing."""
+    hits: int = Field(description="lookups answered from the cache", default=0)
+    misses: int = Field(description="lookups that found nothing (or only an expired entry)", default=0)
+    stores: int = Field(description="entries written to the cache", default=0)
+    evictions: int = Field(description="entries removed to keep the cache within its size", default=0)
+    expirations: int = Field(description="entries found past their ttl and removed", default=0)
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+
+
+class LucyCacheBase(ABC):
+    """All caches must implement this interface.
+
+    Caches map string keys (see `cache_key`) to string values (ie json), each with an optional ttl in seconds.
+    Expiry is by wall clock time, so entries in a cache shared between processes expire for all of them at once.
+    """
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    ### Required methods ###
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[tuple[str, Optional[float]]]:
+        """the value for key and the time it expires (None for never), or None if there's no unexpired value.
+        Implementations should count expired entries they remove in `stats.expirations`.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def _set(self, key: str, value: str, expires: Optional[float]) -> None:
+        """store value for key until expires (None for never). Implementations should count the entries they evict in `stats.evictions`."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self) -> None:
+        """remove every entry."""
+        raise NotImplementedError
+
+    ### These methods are generally fine to inherit ###
+
+    def get(self, key: str) -> Optional[str]:
+        """the value for key, None if there is none (or it expired)."""
+        found = self._get(key)
+        if found is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return found[0]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        """store value for key, for ttl seconds (None for as long as the cache keeps it)."""
+        self._set(key, value, None if ttl is None else time.time() + ttl)
+        self.stats.stores += 1
+
+
+class LRUCache(LucyCacheBase):
+    """A cache in process memory, that evicts the least recently used entries once it holds max_items, or its values add up to more than max_chars.
+
+    Args:
+        max_items: the most entries kept
+        max_chars: the most characters of values kept, None for no limit
+    """
+
+    def __init__(self, max_items: int = 1024, max_chars: Optional[int] = 16_000_000):
+        super().__init__()
+        self.max_items = max_items
+        self.max_chars = max_chars
+        self.chars = 0
+        self._entries: "OrderedDict[str, tuple[str, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, key: str) -> Optional[tuple[str, Optional[float]]]:
+        with self._lock:
+            if (entry := self._entries.get(key)) is None:
+                return None
+            if entry[1] is not None and entry[1] <= time.time():
+                del self._entries[key]
+                self.chars -= len(entry[0])
+                self.stats.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _set(self, key: str, value: str, expires: Optional[float]) -> None:
+        if self.max_chars is not None and len(value) > self.max_chars:
+            return
+        with self._lock:
+            if (replaced := self._entries.pop(key, None)) is not None:
+                self.chars -= len(replaced[0])
+            self._entries[key] = (value, expires)
+            self.chars += len(value)
+            while len(self._entries) > self.max_items or (self.max_chars is not None and self.chars > self.max_chars):
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.chars -= len(evicted)
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.chars = 0
+
+
+class SQLiteCache(LucyCacheBase):
+    """A cache in a SQLite file on local disk, shared by every process on the host that opens the same path (ie the web and worker processes),
+    and kept across restarts. Once it holds more than max_items, the least recently used entries are removed.
+
+    Args:
+        path: the SQLite file, created if it doesn't exist
+        max_items: the most entries kept
+        prune_every: how many writes between checks of the cache's size
+    """
+
+    def __init__(self, path: str, max_items: int = 100_000, prune_every: int = 256):
+        super().__init__()
+        self.path = os.path.expanduser(path)
+        self.max_items = max_items
+        self.prune_every = prune_every
+        self._writes = 0
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS lucy_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL, used REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS lucy_cache_used ON lucy_cache (used)")
+
+    def _connection(self) -> "sqlite3.Connection":
+        """this thread's connection, sqlite connections can't be shared between threads."""
+        if (connection := getattr(self._local, "connection", None)) is None:
+            import sqlite3
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            # readers don't block the writer (or each other), and writes only sync at checkpoints
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _get(self, key: str) -> Optional[tuple[str, Optional[float]]]:
+        connection = self._connection()
+        row = connection.execute("SELECT value, expires FROM lucy_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] is not None and row[1] <= now:
+            connection.execute("DELETE FROM lucy_cache WHERE key = ? AND expires <= ?", (key, now))
+            self.stats.expirations += 1
+            return None
+        connection.execute("UPDATE lucy_cache SET used = ? WHERE key = ?", (now, key))
+        return row[0], row[1]
+
+    def _set(self, key: str, value: str, expires: Optional[float]) -> None:
+        connection = self._connection()
+        connection.execute("INSERT OR REPLACE INTO lucy_cache (key, value, expires, used) VALUES (?, ?, ?, ?)", (key, value, expires, time.time()))
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def prune(self) -> None:
+        """remove expired entries, then the least recently used until there are max_items."""
+        connection = self._connection()
+        connection.execute("DELETE FROM lucy_cache WHERE expires <= ?", (time.time(),))
+        over = connection.execute("SELECT COUNT(*) FROM lucy_cache").fetchone()[0] - self.max_items
+        if over > 0:
+            connection.execute("DELETE FROM lucy_cache WHERE key IN (SELECT key FROM lucy_cache ORDER BY used LIMIT ?)", (over,))
+            self.stats.evictions += over
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM lucy_cache").fetchone()[0]
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM lucy_cache")
+
+
+class TieredCache(LucyCacheBase):
+    """Caches in front of each other, fastest first (ie an `LRUCache` in front of a `SQLiteCache`).
+    Lookups try each tier in turn and copy a hit into the tiers in front of the one it came from; writes go to every tier.
+    Each tier keeps its own stats, these are for the cache as a whole.
+    """
+
+    def __init__(self, *tiers: LucyCacheBase):
+        super().__init__()
+        self.tiers = tiers
+
+    def _get(self, key: str) -> Optional[tuple[str, Optional[float]]]:
+        for depth, tier in enumerate(self.tiers):
+            if (found := tier._get(key)) is not None:
+                tier.stats.hits += 1
+                for faster in self.tiers[:depth]:
+                    faster._set(key, *found)
+                return found
+            tier.stats.misses += 1
+        return None
+
+    def _set(self, key: str, value: str, expires: Optional[float]) -> None:
+        for tier in self.tiers:
+            tier._set(key, value, expires)
+            tier.stats.stores += 1
+
+    def clear(self) -> None:
+        for tier in self.tiers:
+            tier.clear()
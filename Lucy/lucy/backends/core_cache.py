@@ -0,0 +1,93 @@
+from typing import Optional, TYPE_CHECKING
+import logging
+import threading
+
+from lucy.backends.write_behind import WriteBehindBuffer
+
+if TYPE_CHECKING:
+    from lucy.backends.memory_backend_base import LucyMemoryBackendBase
+    from lucy.schema import CoreMemoryChanges, LucyMemoryCore
+
+logger = logging.getLogger("lucy.backends.core_cache")
+
+
+class CoreMemoryCache:
+    """Keeps the live core memory of every agent instance in the process, and persists only what changed in it.
+
+    A core is read from its backend once, when it's first loaded, and is the same object for every agent on the instance from then on.
+    At the end of each turn `save` takes the segments that changed and the messages appended to (and dropped from) the history,
+    and the backend persists just those (see `LucyMemoryBackendBase.persist_core_changes`).
+    With a flush_interval, turns' changes are batched behind a WriteBehindBuffer and merged per instance before they're persisted.
+
+    Args:
+        flush_interval: persist changes at most this many seconds after the turn that made them. None persists at the end of every turn
+        max_pending: persist as soon as this many turns' changes are waiting
+    """
+
+    def __init__(self, flush_interval: Optional[float] = None, max_pending: int = 256):
+        self._cores: dict[str, tuple["LucyMemoryBackendBase", "LucyMemoryCore"]] = {}
+        self._lock = threading.Lock()
+        self.buffer = WriteBehindBuffer(self._persist, max_items=max_pending, max_delay=flush_interval) if flush_interval is not None else None
+        self.persisted = 0
+
+    def load(self, backend: "LucyMemoryBackendBase") -> Optional["LucyMemoryCore"]:
+        """the live core for the backend's instance, read from the backend the first time. None if it has never been persisted."""
+        with self._lock:
+            if (cached := self._cores.get(backend.instance_id)) is not None:
+                return cached[1]
+        if (core := backend.core) is None:
+            return None
+        core.mark_persisted()
+        with self._lock:
+            return self._cores.setdefault(backend.instance_id, (backend, core))[1]
+
+    def track(self, backend: "LucyMemoryBackendBase", core: "LucyMemoryCore") -> None:
+        """keep a new core live; it is persisted as a whole the first time it's saved."""
+        with self._lock:
+            self._cores[backend.instance_id] = (backend, core)
+
+    def save(self, instance_id: str) -> None:
+        """persist (or queue) whatever changed in an instance's core since it was last saved."""
+        with self._lock:
+            backend, core = self._cores[instance_id]
+        if (changes := core.take_changes()).empty:
+            return
+        if self.buffer is None:
+            self._persist([(backend, core, changes)])
+        else:
+            self.buffer.add([(backend, core, changes)])
+
+    def flush(self) -> None:
+        """persist any changes waiting in the buffer now."""
+        if self.buffer is not None:
+            self.buffer.flush()
+
+    def evict(self, instance_id: str) -> None:
+        """persist an instance's changes and stop keeping its core live."""
+        self.save(instance_id)
+        self.flush()
+        with self._lock:
+            self._cores.pop(instance_id, None)
+
+    def _persist(self, batch: list[tuple["LucyMemoryBackendBase", "LucyMemoryCore", "CoreMemoryChanges"]]) -> list:
+        """persists each instance's merged changes, returning those that failed to be retried (appending history twice would duplicate it)."""
+        merged: dict[str, tuple["LucyMemoryBackendBase", "LucyMemoryCore", "CoreMemoryChanges"]] = {}
+        for backend, core, changes in batch:
+            if (pending := merged.get(backend.instance_id)) is not None:
+                changes = pending[2].merge(changes)
+            merged[backend.instance_id] = (backend, core, changes)
+        failed = []
+        for backend, core, changes in merged.values():
+            try:
+                backend.persist_core_changes(core, changes)
+            except Exception:
+                if self.buffer is None:
+                    raise
+                logger.exception("failed to persist core memory changes for %s", backend.instance_id)
+                failed.append((backend, core, changes))
+        self.persisted += len(merged) - len(failed)
+        return failed
+
+
+# the process-wide cache agents share by default
+core_memory_cache = CoreMemoryCache()
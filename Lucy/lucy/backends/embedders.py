@@ -0,0 +1,66 @@
+import hashlib
+import re
+
+import numpy as np
+
+from lucy.backends.embedding_backend_base import LucyEmbeddingBackendBase
+
+_words = re.compile(r"\w+")
+
+
+class HashingEmbeddingBackend(LucyEmbeddingBackendBase):
+    """Embeds text by hashing its words (and word pairs) into a fixed number of buckets.
+    Deterministic, instant and needs nothing to run, so it suits tests and development;
+    it only captures shared vocabulary, not meaning.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        super().__init__()
+        self._dimensions = dimensions
+
+    @property
+    def name(self) -> str:
+        return f"hashing:{self._dimensions}"
+
+    @property
+    def dimensions(self) -> int:
+        return self._dimensions
+
+    def embed_batch(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self._dimensions), dtype=np.float32)
+        for vector, text in zip(vectors, texts):
+            words = _words.findall(text.lower())
+            for feature in (*words, *(f"{a} {b}" for a, b in zip(words, words[1:]))):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                # the sign bit keeps collisions from only ever adding up
+                vector[digest % self._dimensions] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+class SentenceTransformerEmbeddingBackend(LucyEmbeddingBackendBase):
+    """Embeds text locally with a sentence-transformers model, on CPU by default (ie all-MiniLM-L6-v2, 384 dimensions).
+    Requires the `sentence-transformers` package.
+    """
+
+    def __init__(self, model: str = "sentence-transformers/all-MiniLM-L6-v2", device: str = "cpu", batch_size: int = 64):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("SentenceTransformerEmbeddingBackend requires the `sentence-transformers` package, "
+                              "try `pip install sentence-transformers`") from e
+        super().__init__()
+        self.model = model
+        self.batch_size = batch_size
+        self.encoder = SentenceTransformer(model, device=device)
+
+    @property
+    def name(self) -> str:
+        return f"sentence-transformers:{self.model}"
+
+    @property
+    def dimensions(self) -> int:
+        return self.encoder.get_sentence_embedding_dimension()
+
+    def embed_batch(self, texts: list[str]) -> np.ndarray:
+        return self.encoder.encode(texts, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True)
@@ -0,0 +1,111 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import asyncio
+import hashlib
+import threading
+
+import numpy as np
+
+from lucy.schema import Document, as_embedding
+
+
+def _frozen(vector) -> np.ndarray:
+    """a vector made read-only, so one caller can't change what the cache hands every other."""
+    vector = as_embedding(vector)
+    vector.setflags(write=False)
+    return vector
+
+
+class LucyEmbeddingBackendBase(ABC):
+    """All embedding backends must implement this interface.
+
+    Embedding backends turn text into vectors for archival memory, both for the documents archived and the queries that search them.
+    Texts are embedded in batches of batch_size, and vectors are cached by a hash of the model name and text,
+    so archiving the same content twice (or paging through a search) only embeds it once.
+    Vectors are float32 arrays, see `lucy.schema.Embedding`. Cached vectors are shared by every caller that embeds the same text,
+    so they're read-only: copy one before changing it.
+    Share one embedding backend between every memory backend in the process so they share the cache.
+    """
+
+    def __init__(self):
+        self._vectors: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    ### Required attributes ###
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """A unique name for the model in use. Cached vectors are keyed on it, so it must change whenever the vectors would.
+        """
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def dimensions(self) -> int:
+        """The length of every vector the model produces.
+        """
+        raise NotImplementedError
+
+    ### Optional attributes ###
+    batch_size: int = 64
+    """The most texts embedded at once. Bigger batches are faster per text, up to what the model's hardware can hold."""
+
+    cache_size: int = 10000
+    """The most vectors kept in the cache."""
+
+    ### Required methods ###
+    @abstractmethod
+    def embed_batch(self, texts: list[str]) -> "list[np.ndarray] | np.ndarray":
+        """Embeds up to batch_size texts at once, returning one vector per text in the same order (or a matrix with a row per text).
+        """
+        raise NotImplementedError
+
+    ### These methods are generally fine to inherit ###
+    def embed(self, text: str) -> np.ndarray:
+        """Embeds a single text."""
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: list[str]) -> list[np.ndarray]:
+        """Embeds texts in batches, skipping any that are cached (or repeated)."""
+        keys = [self._key(text) for text in texts]
+        found = self._cached(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            pending = list(missing.items())
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                vectors = self.embed_batch([text for _, text in batch])
+                found.update(zip((key for key, _ in batch), map(_frozen, vectors)))
+            self._cache([(key, found[key]) for key in missing])
+        return [found[key] for key in keys]
+
+    async def aembed_many(self, texts: list[str]) -> list[np.ndarray]:
+        """Embeds texts without blocking the event loop."""
+        return await asyncio.to_thread(self.embed_many, texts)
+
+    def embed_documents(self, documents: list[Document]) -> list[Document]:
+        """Fills in the embeddings of any documents that don't have them yet, in one pass."""
+        if pending := [document for document in documents if document.embeddings is None]:
+            for document, vector in zip(pending, self.embed_many([document.content for document in pending])):
+                document.embeddings = vector
+        return documents
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.blake2b(f"{self.name}\x00{text}".encode(), digest_size=16).digest()
+
+    def _cached(self, keys: list[bytes]) -> dict[bytes, np.ndarray]:
+        vectors = self._vectors
+        with self._lock:
+            found = {}
+            for key in keys:
+                if (vector := vectors.get(key)) is not None:
+                    vectors.move_to_end(key)
+                    found[key] = vector
+            return found
+
+    def _cache(self, items: list[tuple[bytes, np.ndarray]]) -> None:
+        vectors = self._vectors
+        with self._lock:
+            vectors.update(items)
+            while len(vectors) > self.cache_size:
+                vectors.popitem(last=False)
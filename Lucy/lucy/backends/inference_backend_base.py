@@ -1,6 +1,15 @@
+from typing import AsyncIterator, Optional
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 
-from lucy.schema import Turn
+from lucy import encoding
+from lucy.schema import Turn, Message, MessageDelta, ToolCallDelta
+from lucy.backends.tokenizers import LucyTokenizerBase, EstimatingTokenizer
+
+_estimating_tokenizer = EstimatingTokenizer()
+# the most threads the default `generate_many` runs a batch on
+_generate_many_workers = 16
 
 class LucyInferenceBackendBase(ABC):
     """All Inference backends must implement this interface.
@@ -67,6 +76,32 @@ class LucyInferenceBackendBase(ABC):
         """
         return "templates"
 
+    @property
+    def tokenizer(self) -> LucyTokenizerBase:
+        """The tokenizer that counts tokens the way the model does.
+        Defaults to an estimate; backends should supply the model's own tokenizer (ie `HuggingFaceTokenizer` with a local tokenizer.json) where they can.
+        """
+        return _estimating_tokenizer
+
+    @property
+    def context_window_tokens(self) -> Optional[int]:
+        """The size of the model's context window in tokens. None means core memory is only bounded by the character and message limits.
+        """
+        return None
+
+    @property
+    def response_reserved_tokens(self) -> int:
+        """Tokens of the context window kept free for the model's response.
+        """
+        return 1024
+
+    @property
+    def temperature(self) -> Optional[float]:
+        """The sampling temperature, None for the model's default.
+        At 0 the model's responses are deterministic, so they can be cached (see `CachingInferenceBackend`).
+        """
+        return None
+
     ### Required methods ###
 
     @abstractmethod
@@ -78,6 +113,48 @@ class LucyInferenceBackendBase(ABC):
 
     ### These methods are generally fine to inherit ###
 
+    def count_tokens(self, message:Message) -> int:
+        """the number of tokens a message takes up in the context window (memoized on the message).
+        """
+        return message.token_count(self.tokenizer)
+
+    async def agenerate(self, turn:Turn) -> Turn:
+        """The async version of `generate`.
+        Backends with an async client should override this; by default generate runs on a worker thread.
+        """
+        return await asyncio.to_thread(self.generate, turn)
+
+    def generate_many(self, turns:list[Turn]) -> list[Turn]:
+        """Completes a batch of turns (usually from many different agents), returning them in the same order.
+        Backends whose server accepts batched requests should override this and `agenerate_many` to send the turns as one batch;
+        by default they are generated concurrently, on up to 16 threads.
+        """
+        if len(turns) < 2:
+            return [self.generate(turn) for turn in turns]
+        with ThreadPoolExecutor(max_workers=min(len(turns), _generate_many_workers), thread_name_prefix="lucy-generate") as executor:
+            return list(executor.map(self.generate, turns))
+
+    async def agenerate_many(self, turns:list[Turn]) -> list[Turn]:
+        """The async version of `generate_many`. By default the turns are generated concurrently with `agenerate`.
+        """
+        return list(await asyncio.gather(*(self.agenerate(turn) for turn in turns)))
+
+    async def astream(self, turn:Turn) -> AsyncIterator[MessageDelta]:
+        """Streams the response as MessageDeltas as they arrive from the model.
+        turn.response_message is set to the complete message once the stream is exhausted.
+        Backends that can stream should override this; by default the whole response from `agenerate` is yielded as a single delta.
+        """
+        turn = await self.agenerate(turn)
+        response = turn.response_message
+        yield MessageDelta(
+            content=response.content,
+            tool_calls=[ToolCallDelta(index=index,
+                                      id=call.id,
+                                      name=call.function.name,
+                                      arguments=encoding.dumps(call.function.arguments))
+                        for index, call in enumerate(response.tool_calls or [])] or None,
+        )
+
     @property
     def prompt_engine_args(self) -> tuple:
         """returns the arguments to pass to the prompt engine.
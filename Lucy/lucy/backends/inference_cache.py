@@ -0,0 +1,140 @@
+from typing import Any, AsyncIterator, Optional
+from datetime import datetime
+from uuid import uuid4
+import hashlib
+
+from lucy import encoding
+
+from lucy.schema import Turn, Message, MessageDelta, ToolCallDelta
+from lucy.backends.cache import LucyCacheBase, canonical
+from lucy.backends.inference_backend_base import LucyInferenceBackendBase
+
+
+def _forwarded(name: str) -> property:
+    return property(lambda self: getattr(self.backend, name), doc=f"the wrapped backend's {name}")
+
+
+class CachingInferenceBackend(LucyInferenceBackendBase):
+    """Answers turns the wrapped backend has already answered from a cache, rather than generating them again
+    (ie the same OS prompt to resize core memory, sent by many agents with the same persona).
+
+    Only turns for a backend at temperature 0 are cached, anything else samples a fresh response every time and is passed straight through.
+    Turns are keyed by a hash of what's sent to the model: the model, and each message's role, content and tool calls, and the tools
+    (not timestamps, so the same conversation at a different time is the same turn).
+    A cached response gets fresh tool call ids, so they stay unique within the conversation.
+    Everything else (limits, tokenizer, templates) is the wrapped backend's.
+
+    Args:
+        backend: the backend that generates whatever isn't cached
+        cache: where responses are kept, ie a `TieredCache` of an `LRUCache` in front of a `SQLiteCache` shared by every process on the host
+        ttl: the seconds a response is kept, None for as long as the cache keeps it
+    """
+    package_name = _forwarded("package_name")
+    model = _forwarded("model")
+    core_memory_maximum_number_of_messages_in_history = _forwarded("core_memory_maximum_number_of_messages_in_history")
+    core_memory_maximum_total_chars = _forwarded("core_memory_maximum_total_chars")
+    core_memory_maximum_chars_in_persona = _forwarded("core_memory_maximum_chars_in_persona")
+    core_memory_maximum_chars_in_human = _forwarded("core_memory_maximum_chars_in_human")
+    core_memory_maximum_tool_count = _forwarded("core_memory_maximum_tool_count")
+    templates_directory = _forwarded("templates_directory")
+    tokenizer = _forwarded("tokenizer")
+    context_window_tokens = _forwarded("context_window_tokens")
+    response_reserved_tokens = _forwarded("response_reserved_tokens")
+    temperature = _forwarded("temperature")
+    prompt_engine_args = _forwarded("prompt_engine_args")
+
+    def __init__(self, backend: LucyInferenceBackendBase, cache: LucyCacheBase, ttl: Optional[float] = None):
+        self.backend = backend
+        self.cache = cache
+        self.ttl = ttl
+
+    def __getattr__(self, name: str) -> Any:
+        # anything particular to the wrapped backend (ie its client)
+        if name == "backend":
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    def key(self, turn: Turn) -> Optional[str]:
+        """the cache key for a turn, None if its response can't be cached."""
+        if self.backend.temperature != 0:
+            return None
+        digest = hashlib.sha256(canonical([self.backend.model, self.backend.temperature]).encode())
+        for message in turn.request_messages:
+            stored = message.stored
+            digest.update(canonical([stored["role"], stored["content"], stored["tool_calls"], stored["tool_call_id"]]).encode())
+        for tool in turn.request_tools:
+            digest.update(tool.request_json.encode())
+        return digest.hexdigest()
+
+    def _cached(self, key: Optional[str]) -> Optional[Message]:
+        if key is None or (cached := self.cache.get(key)) is None:
+            return None
+        message = Message.model_validate_json(cached)
+        message.timestamp = datetime.now().timestamp()
+        for call in message.tool_calls or []:
+            call.id = f"call_{uuid4().hex[:24]}"
+        return message
+
+    def _store(self, key: Optional[str], turn: Turn) -> Turn:
+        if key is not None and turn.response_message is not None:
+            self.cache.set(key, encoding.dumps(turn.response_message.stored), self.ttl)
+        return turn
+
+    def generate(self, turn: Turn) -> Turn:
+        key = self.key(turn)
+        if (cached := self._cached(key)) is not None:
+            turn.response_message = cached
+            return turn
+        return self._store(key, self.backend.generate(turn))
+
+    async def agenerate(self, turn: Turn) -> Turn:
+        key = self.key(turn)
+        if (cached := self._cached(key)) is not None:
+            turn.response_message = cached
+            return turn
+        return self._store(key, await self.backend.agenerate(turn))
+
+    def _split(self, turns: list[Turn]) -> tuple[list[Optional[str]], list[int]]:
+        """every turn's key, answering the cached ones in place, and the positions of those left to generate."""
+        keys, missing = [self.key(turn) for turn in turns], []
+        for position, (turn, key) in enumerate(zip(turns, keys)):
+            if (cached := self._cached(key)) is not None:
+                turn.response_message = cached
+            else:
+                missing.append(position)
+        return keys, missing
+
+    def generate_many(self, turns: list[Turn]) -> list[Turn]:
+        """only the turns that aren't cached are sent to the wrapped backend, as one batch."""
+        turns = list(turns)
+        keys, missing = self._split(turns)
+        if missing:
+            for position, turn in zip(missing, self.backend.generate_many([turns[position] for position in missing])):
+                turns[position] = self._store(keys[position], turn)
+        return turns
+
+    async def agenerate_many(self, turns: list[Turn]) -> list[Turn]:
+        turns = list(turns)
+        keys, missing = self._split(turns)
+        if missing:
+            for position, turn in zip(missing, await self.backend.agenerate_many([turns[position] for position in missing])):
+                turns[position] = self._store(keys[position], turn)
+        return turns
+
+    async def astream(self, turn: Turn) -> AsyncIterator[MessageDelta]:
+        """a cached response arrives as a single delta, anything else is streamed from the wrapped backend (and cached once complete)."""
+        key = self.key(turn)
+        if (cached := self._cached(key)) is not None:
+            turn.response_message = cached
+            yield MessageDelta(
+                content=cached.content,
+                tool_calls=[ToolCallDelta(index=index,
+                                          id=call.id,
+                                          name=call.function.name,
+                                          arguments=encoding.dumps(call.function.arguments))
+                            for index, call in enumerate(cached.tool_calls or [])] or None,
+            )
+            return
+        async for delta in self.backend.astream(turn):
+            yield delta
+        self._store(key, turn)
@@ -1,17 +1,25 @@
-from typing import List, Union, Callable
+from typing import List, Optional, Union, Callable
 from abc import ABC, abstractmethod
 
-from lucy.schema import MemoryType, LucyMemoryCore, RecallSearchResult, ArchivalSearchResult, Message, Document
+from lucy.schema import MemoryType, LucyMemoryCore, CoreMemoryChanges, RecallSearchResult, ArchivalSearchResult, Message, Document
+from lucy.backends.write_behind import WriteBehindBuffer
+from lucy.backends.embedding_backend_base import LucyEmbeddingBackendBase
+from lucy.tracing import tracer
 
 class LucyMemoryBackendBase(ABC):
     """All memory backends must implement this interface.
 
+    When an embedding_backend is set, archival documents without embeddings are embedded as each batch is written
+    (with write-behind, when the buffer flushes), and backends use it to embed archival search queries.
+
     Args:
         instance_id: the unique identifier for the agent instance
         memory_type: the type of memory to be used
     """
     instance_id: str
     memory_type: MemoryType
+    write_buffer: Optional[WriteBehindBuffer] = None
+    embedding_backend: Optional[LucyEmbeddingBackendBase] = None
 
     def __init__(self,
                  instance_id: str,
@@ -29,8 +37,10 @@ class LucyMemoryBackendBase(ABC):
 
     @property
     @abstractmethod
-    def core(self) -> "LucyMemoryCore":
-        """Returns the persisted (memory state) core IF this is a core memory backend."""
+    def core(self) -> Optional["LucyMemoryCore"]:
+        """Returns the persisted (memory state) core IF this is a core memory backend.
+        Returns None if no core has been persisted for this instance yet.
+        """
         raise NotImplementedError
 
     @core.setter
@@ -39,6 +49,12 @@ class LucyMemoryBackendBase(ABC):
         """Sets the persisted (memory state) core IF this is a core memory backend."""
         raise NotImplementedError
 
+    def persist_core_changes(self, core: "LucyMemoryCore", changes: "CoreMemoryChanges") -> None:
+        """Persists only what changed in core since it was last persisted (see `lucy.backends.core_cache.CoreMemoryCache`).
+        Backends that can update segments and append to the history in place should override this; by default the whole core is rewritten.
+        """
+        self.core = core
+
     @abstractmethod
     def factory(cls, *args, **kwargs) -> Callable:
         """Override this factory so that a global callable can be used to set up db connections, initialize documents etc.
@@ -47,29 +63,53 @@ class LucyMemoryBackendBase(ABC):
         """
         raise NotImplementedError
 
+    def buffer_writes(self, max_items: int = 256, max_delay: float = 1.0) -> None:
+        """Batches writes behind a WriteBehindBuffer instead of persisting them as they are made.
+        Call `flush` before depending on them being persisted.
+        """
+        self.write_buffer = WriteBehindBuffer(self._write, max_items=max_items, max_delay=max_delay)
+
+    def flush(self, raise_errors: bool = False) -> None:
+        """Persists any buffered writes. What can't be written is kept to retry with the next flush, and raised if raise_errors."""
+        if self.write_buffer is not None:
+            self.write_buffer.flush(raise_errors=raise_errors)
+
     def write(self, items: List[Union[Message, Document]]) -> None:
         """Writes a list of messages to the correct memory."""
+        with tracer.span("memory.write", {"lucy.memory.type": self.memory_type.value, "lucy.memory.count": len(items)}) as span:
+            if self.write_buffer is not None and self.memory_type != MemoryType.core:
+                span.set("lucy.memory.buffered", True)
+                self.write_buffer.add(items)
+                return
+            self._write(items)
+
+    def _write(self, items: List[Union[Message, Document]]) -> None:
         match self.memory_type:
             case MemoryType.core:
                 raise ValueError("Core memory must be written to directly as a LucyCoreMemory object!")
             case MemoryType.recall:
                 self._write_to_recall(items)
             case MemoryType.archival:
+                if self.embedding_backend is not None:
+                    self.embedding_backend.embed_documents(items)
                 self._write_to_archival(items)
             case _:
                 raise ValueError(f"unknown memory type {self.memory_type}, unable to write to it")
 
     def search(self, value: str, page: int = 1) -> Union[RecallSearchResult, ArchivalSearchResult]:
         """Searches the correct memory for a value."""
-        match self.memory_type:
-            case MemoryType.core:
-                raise ValueError("cannot search core memory, you already have it!")
-            case MemoryType.recall:
-                return self._search_recall(value, page)
-            case MemoryType.archival:
-                return self._search_archival(value, page)
-            case _:
-                raise ValueError(f"unknown memory type {self.memory_type}, unable to search it")
+        with tracer.span("memory.search", {"lucy.memory.type": self.memory_type.value, "lucy.memory.page": page}) as span:
+            match self.memory_type:
+                case MemoryType.core:
+                    raise ValueError("cannot search core memory, you already have it!")
+                case MemoryType.recall:
+                    found = self._search_recall(value, page)
+                case MemoryType.archival:
+                    found = self._search_archival(value, page)
+                case _:
+                    raise ValueError(f"unknown memory type {self.memory_type}, unable to search it")
+            span.set("lucy.memory.count", len(found.results))
+            return found
 
     # search recall
     def _search_recall(self, value: str, page: int = 1) -> RecallSearchResult:
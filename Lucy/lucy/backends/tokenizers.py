@@ -0,0 +1,63 @@
+from abc import ABC, abstractmethod
+
+from lucy.schema import estimate_tokens
+
+
+class LucyTokenizerBase(ABC):
+    """All tokenizers must implement this interface.
+
+    Tokenizers count tokens the way the model does, so core memory can be packed into the model's context window.
+    Counts are memoized on each Message by tokenizer name, so the name must change whenever the counts would.
+    """
+
+    ### Required attributes ###
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """A unique name for the tokenizer (and vocabulary) in use.
+        """
+        raise NotImplementedError
+
+    ### Optional attributes ###
+    @property
+    def message_overhead(self) -> int:
+        """Tokens the chat template adds around every message (role markers etc).
+        """
+        return 4
+
+    ### Required methods ###
+    @abstractmethod
+    def count(self, text: str) -> int:
+        """The number of tokens in text.
+        """
+        raise NotImplementedError
+
+
+class EstimatingTokenizer(LucyTokenizerBase):
+    """Estimates ~4 chars per token. Good enough to stay inside a context window with some headroom, and needs nothing to run.
+    """
+    name = "estimate"
+
+    def count(self, text: str) -> int:
+        return estimate_tokens(text)
+
+
+class HuggingFaceTokenizer(LucyTokenizerBase):
+    """Counts tokens exactly, offline, with a local `tokenizer.json` file from the model's repo.
+    Requires the `tokenizers` package.
+    """
+
+    def __init__(self, path: str):
+        try:
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("HuggingFaceTokenizer requires the `tokenizers` package, try `pip install tokenizers`") from e
+        self.path = path
+        self.tokenizer = Tokenizer.from_file(path)
+
+    @property
+    def name(self) -> str:
+        return f"huggingface:{self.path}"
+
+    def count(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
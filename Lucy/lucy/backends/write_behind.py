@@ -0,0 +1,116 @@
+from typing import Any, Callable, Optional
+from itertools import count
+import heapq
+import logging
+import threading
+import time
+import weakref
+
+logger = logging.getLogger("lucy.backends.write_behind")
+
+
+class _Flusher:
+    """A single daemon thread that flushes every buffer in the process when its max_delay runs out,
+    so idle buffers cost nothing and thousands of agents don't mean thousands of timer threads.
+    """
+
+    def __init__(self):
+        self._due: list[tuple[float, int, weakref.ref]] = []
+        self._order = count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, deadline: float, buffer: "WriteBehindBuffer") -> None:
+        with self._condition:
+            heapq.heappush(self._due, (deadline, next(self._order), weakref.ref(buffer)))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="lucy-write-behind", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self) -> None:
+        while "flushing":
+            with self._condition:
+                while not self._due or (wait := self._due[0][0] - time.monotonic()) > 0:
+                    self._condition.wait(None if not self._due else wait)
+                deadline, _, reference = heapq.heappop(self._due)
+            # flushing a buffer that was already flushed by size (or is gone) is a no-op
+            if (buffer := reference()) is not None:
+                buffer._flush_if_due(deadline)
+
+
+_flusher = _Flusher()
+
+
+class WriteBehindBuffer:
+    """Collects writes and hands them to `write` in batches: as soon as max_items are pending,
+    or max_delay seconds after the first pending write, whichever comes first.
+
+    Writes are acknowledged before they are persisted, so anything still pending is lost if the process dies.
+    Call `flush` before depending on the writes (ie when an agent is unloaded); failed batches are logged and retried with the next flush,
+    or raised with `flush(raise_errors=True)` by callers that mustn't carry on as though they were written.
+
+    Args:
+        write: persists a batch of items, in the order they were added. May return the items it couldn't persist, to retry just those
+        max_items: flush as soon as this many items are pending
+        max_delay: the longest (in seconds) an item waits to be flushed
+    """
+
+    def __init__(self,
+                 write: Callable[[list], Optional[list]],
+                 max_items: int = 256,
+                 max_delay: float = 1.0):
+        self.write = write
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self.flushed = 0
+        self._pending: list = []
+        self._deadline: Optional[float] = None
+        self._lock = threading.Lock()
+        # batches go out one at a time and in order
+        self._writing = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, items: list[Any]) -> None:
+        """queue items to be written."""
+        with self._lock:
+            self._pending.extend(items)
+            if len(self._pending) < self.max_items:
+                if self._deadline is None:
+                    self._deadline = time.monotonic() + self.max_delay
+                    _flusher.schedule(self._deadline, self)
+                return
+        self.flush()
+
+    def flush(self, raise_errors: bool = False) -> None:
+        """write everything pending now. Whatever fails is kept to retry with the next flush, and raised if raise_errors."""
+        with self._writing:
+            with self._lock:
+                batch, self._pending, self._deadline = self._pending, [], None
+            if not batch:
+                return
+            error = None
+            try:
+                failed = self.write(batch) or []
+            except Exception as e:
+                if not raise_errors:
+                    logger.exception("failed to write %s buffered items, retrying with the next flush", len(batch))
+                failed, error = batch, e
+            self.flushed += len(batch) - len(failed)
+            if failed:
+                self._retry(failed)
+                if raise_errors:
+                    raise error or RuntimeError(f"failed to write {len(failed)} of {len(batch)} buffered items")
+
+    def _retry(self, items: list) -> None:
+        with self._lock:
+            self._pending[:0] = items
+            if self._deadline is None:
+                self._deadline = time.monotonic() + self.max_delay
+                _flusher.schedule(self._deadline, self)
+
+    def _flush_if_due(self, deadline: float) -> None:
+        if self._deadline == deadline:
+            self.flush()
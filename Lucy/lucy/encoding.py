@@ -0,0 +1,31 @@
+"""JSON encoding for the payloads Lucy writes and reads (stimuli, stored messages and records, cache entries, tool results):
+orjson when it's installed (several times faster), the standard library otherwise. Both produce compact UTF-8 json.
+"""
+from typing import Any, Callable, Optional
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps_bytes(value: Any, sort_keys: bool = False, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """value as compact json, utf-8 encoded."""
+    if orjson is not None:
+        return orjson.dumps(value, default=default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_SORT_KEYS if sort_keys else 0))
+    return json.dumps(value, sort_keys=sort_keys, default=default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def dumps(value: Any, sort_keys: bool = False, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """value as compact json."""
+    if orjson is not None:
+        return dumps_bytes(value, sort_keys=sort_keys, default=default).decode()
+    return json.dumps(value, sort_keys=sort_keys, default=default, separators=(",", ":"), ensure_ascii=False)
+
+
+def loads(data: "str | bytes | bytearray | memoryview") -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(bytes(data) if isinstance(data, memoryview) else data)
@@ -1,10 +1,25 @@
 from datetime import datetime
-from typing import Optional, Literal, List
+from collections import deque
+from functools import cached_property
+from itertools import islice
+import base64
+from typing import TYPE_CHECKING, Annotated, Any, ClassVar, Iterable, Iterator, Optional, Literal, List
 from enum import Enum
-from pydantic import BaseModel, Field, model_validator
+import numpy as np
+from pydantic import BaseModel, Field, GetCoreSchemaHandler, GetJsonSchemaHandler, PrivateAttr, TypeAdapter, model_validator
+from pydantic_core import core_schema
+
+from lucy import encoding
+
+if TYPE_CHECKING:
+    from lucy.backends.tokenizers import LucyTokenizerBase
 
 """The Lucy Schema acts as a canonical representation of the data for all things in Lucy."""
 
+def estimate_tokens(text: str) -> int:
+    """a rough token count for text (~4 chars per token) for when no tokenizer is at hand."""
+    return (len(text) + 3) // 4
+
 class Role(str, Enum):
     """The role of a message in a conversation."""
     assistant = "assistant"
@@ -31,6 +46,9 @@ class ToolCall(LucySchema):
     type: Literal["function"] = Field(description="the type of the tool to be executed, always function at the moment", default = "function")
     function: ToolCallFunction = Field(description="the function to be executed")
 
+# the cached properties of a Message (below), kept in its instance dict
+_message_memos = ("stored", "payload", "_token_counts", "_receipt")
+
 class Message(LucySchema):
     """The canonical packet containing text - often (incorrectly) referred to as a prompt.
     The message object is bidirectional - the LLM receives a message and returns a message.
@@ -43,13 +61,117 @@ class Message(LucySchema):
     tool_calls: Optional[list[ToolCall]] = Field(description="a list of tool calls requested to be executed", default = None)
     tool_call_id: Optional[str] = Field(description="the id of the tool call that was executed", default = None)
 
-    @model_validator(mode="before")
+    @model_validator(mode="after")
+    def valid_tool_message(self):
+        if self.role == Role.tool and self.tool_call_id is None:
+            raise ValueError("Messages from tools must contain a tool call id")
+        return self
+
+    def __setattr__(self, name: str, value) -> None:
+        super().__setattr__(name, value)
+        if name in type(self).model_fields:
+            # the memoized dumps are of the message as it was
+            self.__dict__.pop("stored", None)
+            self.__dict__.pop("payload", None)
+        if name in ("content", "tool_calls",):
+            self._token_counts.clear()
+
+    def __copy__(self) -> "Message":
+        # copies (ie `model_copy(update=...)`) start with none of the original's memos, which may not hold for them
+        copied = super().__copy__()
+        for name in _message_memos:
+            copied.__dict__.pop(name, None)
+        return copied
+
+    def __deepcopy__(self, memo: Optional[dict] = None) -> "Message":
+        copied = super().__deepcopy__(memo)
+        for name in _message_memos:
+            copied.__dict__.pop(name, None)
+        return copied
+
+    # memoized in the instance dict (see `Tool`) rather than as private attributes, which cost more to set up than the rest of the message
+
+    @cached_property
+    def _token_counts(self) -> dict[str, int]:
+        return {}
+
+    @cached_property
+    def _receipt(self) -> Any:
+        """set by stimuli queues that need the message acknowledged once it's handled."""
+        return None
+
+    @cached_property
+    def stored(self) -> dict:
+        """the message as json-ready data, ie to store or enqueue it; `from_stored` turns it back into a message. Dumped once, so don't change it."""
+        return self.model_dump(mode="json")
+
+    @cached_property
+    def payload(self) -> dict:
+        """the message as it's sent to the model in an OpenAI style inference request: `stored` without the timestamp or empty fields,
+        and tool call arguments json encoded. Dumped once, so don't change it.
+        """
+        payload = {name: value for name, value in self.stored.items() if value is not None and name != "timestamp"}
+        if self.tool_calls:
+            payload["tool_calls"] = [{**call, "function": {**call["function"], "arguments": encoding.dumps(call["function"]["arguments"])}}
+                                     for call in payload["tool_calls"]]
+        return payload
+
+    @classmethod
+    def from_stored(cls, stored: dict) -> "Message":
+        """the message `stored` was dumped from."""
+        return cls.model_validate(stored)
+
+    @classmethod
+    def from_stored_many(cls, stored: Iterable[dict]) -> list["Message"]:
+        """the messages a list of `stored` was dumped from, validated as one list (cheaper than one by one, ie for a whole history)."""
+        return _message_list.validate_python(stored if isinstance(stored, list) else list(stored))
+
+    def token_count(self, tokenizer: Optional["LucyTokenizerBase"] = None) -> int:
+        """the number of tokens this message takes up in the context window, memoized per tokenizer.
+        Estimated if no tokenizer is given.
+        """
+        name = tokenizer.name if tokenizer else "estimate"
+        if (count := self._token_counts.get(name)) is None:
+            text = self.content
+            if self.tool_calls:
+                text += encoding.dumps([call.function.model_dump() for call in self.tool_calls])
+            count = tokenizer.count(text) + tokenizer.message_overhead if tokenizer else estimate_tokens(text) + 4
+            self._token_counts[name] = count
+        return count
+
     @classmethod
-    def valid_tool_message(cls, values):
-        if values["role"] == "tool":
-            if values["tool_call_id"] is None:
-                raise ValueError("Messages from tools must contain a tool call id")
-        return values
+    def from_deltas(cls, deltas: list["MessageDelta"]) -> "Message":
+        """assembles a complete assistant message from the deltas of a streamed response."""
+        content = []
+        calls: dict[int, dict] = {}
+        for delta in deltas:
+            if delta.content:
+                content.append(delta.content)
+            for call in delta.tool_calls or []:
+                assembled = calls.setdefault(call.index, {"id": None, "name": "", "arguments": []})
+                assembled["id"] = call.id or assembled["id"]
+                assembled["name"] += call.name or ""
+                assembled["arguments"].append(call.arguments)
+        tool_calls = [ToolCall(id=call["id"],
+                               function=ToolCallFunction(name=call["name"],
+                                                         arguments=encoding.loads("".join(call["arguments"]) or "{}")))
+                      for _, call in sorted(calls.items())]
+        return cls(role=Role.assistant, content="".join(content), tool_calls=tool_calls or None)
+
+# built once, validating a whole list of messages in one call
+_message_list = TypeAdapter(list[Message])
+
+class ToolCallDelta(LucySchema):
+    """a fragment of a tool call, as it streams in from the model."""
+    index: int = Field(description="which of the response's tool calls this fragment belongs to")
+    id: Optional[str] = Field(description="the unique identifier for the tool call, sent with the first fragment", default=None)
+    name: Optional[str] = Field(description="the name of the function to be executed, sent with the first fragment", default=None)
+    arguments: str = Field(description="a fragment of the json encoded arguments", default="")
+
+class MessageDelta(LucySchema):
+    """a fragment of a response message, as it streams in from the model."""
+    content: Optional[str] = Field(description="the next piece of the message text", default=None)
+    tool_calls: Optional[list[ToolCallDelta]] = Field(description="fragments of requested tool calls", default=None)
 
 class ToolParameter(LucySchema):
     """representation of a parameter that a tool takes."""
@@ -67,6 +189,46 @@ class Tool(LucySchema):
     name: str = Field(description="the name of the tool", patter=r"^[a-zA-Z0-9_-]{1,64}$")
     parameters: Optional[list[ToolParameter]] = Field(description="the parameters that the tool takes", default= None)
 
+    # memoized in the instance dict rather than as private attributes, which are much slower to read on every turn
+
+    @cached_property
+    def request_schema(self) -> dict:
+        """the tool as an (OpenAI style) function definition for inference requests, built once. Tools are assumed not to change once they're built."""
+        parameters = self.parameters or []
+        return {
+            "type": self.type,
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": {parameter.name: {"type": parameter.type,
+                                                    "description": parameter.description,
+                                                    **({"enum": parameter.enum} if parameter.enum else {})}
+                                   for parameter in parameters},
+                    "required": [parameter.name for parameter in parameters if parameter.required],
+                },
+            },
+        }
+
+    @cached_property
+    def request_json(self) -> str:
+        """`request_schema`, serialized once."""
+        return encoding.dumps(self.request_schema)
+
+    @cached_property
+    def _token_counts(self) -> dict[str, int]:
+        return {}
+
+    def token_count(self, tokenizer: Optional["LucyTokenizerBase"] = None) -> int:
+        """the number of tokens the tool's definition takes up in the context window, memoized per tokenizer.
+        Estimated if no tokenizer is given.
+        """
+        name = tokenizer.name if tokenizer else "estimate"
+        if (count := self._token_counts.get(name)) is None:
+            count = self._token_counts[name] = tokenizer.count(self.request_json) if tokenizer else estimate_tokens(self.request_json)
+        return count
+
 class Turn(LucySchema):
     """Much like a board game, a 'turn' in Lucy represents one complete pass through the model.
     A turn consists of the payload sent to the LLM and the response from the LLM.
@@ -76,13 +238,64 @@ class Turn(LucySchema):
     request_messages: list[Message]
     request_tools: list[Tool]
     response_message: Optional[Message] = None
+    prefix_key: Optional[str] = Field(description="identifies the stable prompt prefix (boot, bios and persona) the request starts with, for backends that cache prefixes server-side", default=None)
 
 ### KNOWLEDGE ###
 
+def as_embedding(value: Any) -> np.ndarray:
+    """Coerces a vector into a 1-D float32 array: from a list of floats, any array, raw little-endian float32 bytes (or any buffer of them),
+    or those bytes base64 encoded. Float32 arrays and buffers are used as-is, without copying.
+    """
+    if isinstance(value, np.ndarray):
+        embedding = value.astype(np.float32, copy=False)
+    elif isinstance(value, str):
+        embedding = np.frombuffer(base64.b64decode(value), dtype="<f4")
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        embedding = np.frombuffer(value, dtype="<f4")
+    else:
+        embedding = np.asarray(value, dtype=np.float32)
+    if embedding.ndim != 1:
+        raise ValueError(f"embeddings must be one dimensional, not {embedding.ndim}")
+    return embedding
+
+def embedding_bytes(embedding: np.ndarray) -> bytes:
+    """the raw little-endian float32 bytes of an embedding."""
+    return embedding.astype("<f4", copy=False).tobytes()
+
+class _EmbeddingSchema:
+    """Holds embeddings as float32 arrays (4 bytes a dimension, vs ~32 for a list of floats) and serializes them to base64 in JSON."""
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        return core_schema.no_info_plain_validator_function(
+            as_embedding,
+            serialization=core_schema.plain_serializer_function_ser_schema(cls.serialize, info_arg=True),
+        )
+
+    @classmethod
+    def __get_pydantic_json_schema__(cls, schema: core_schema.CoreSchema, handler: GetJsonSchemaHandler) -> dict:
+        return {"type": "string", "contentEncoding": "base64", "description": "little-endian float32 values"}
+
+    @staticmethod
+    def serialize(embedding: np.ndarray, info: core_schema.SerializationInfo) -> Any:
+        if info.mode_is_json():
+            return base64.b64encode(embedding_bytes(embedding)).decode()
+        return embedding
+
+Embedding = Annotated[np.ndarray, _EmbeddingSchema]
+
 class Document(LucySchema):
     """A document is a piece of knowledge that the LLM can use to generate responses."""
     content: str = Field(description="the text of the document")
-    embeddings: list[float] = Field(description="the embeddings of the document")
+    embeddings: Optional[Embedding] = Field(description="the embeddings of the document, filled in by the embedding backend when archived if missing", default=None)
+
+    def __eq__(self, other: object) -> bool:
+        # arrays compare element-wise, so the default field by field comparison can't be used
+        if not isinstance(other, Document):
+            return NotImplemented
+        if self.embeddings is None or other.embeddings is None:
+            return self.content == other.content and self.embeddings is other.embeddings
+        return self.content == other.content and np.array_equal(self.embeddings, other.embeddings)
 
 
 ### MEMORY ###
@@ -93,21 +306,215 @@ class MemoryType(str, Enum):
     archival = "archival"
     recall = "recall"
 
+class MessageHistory:
+    """The visible message history of an agent.
+    A deque of Messages that keeps a running total of their chars and tokens, so appending, evicting and sizing are all O(1) per message.
+    Messages are assumed not to change once they are in the history.
+    Tokens are estimated until a tokenizer is set with `use_tokenizer`.
+    It also counts the messages appended and dropped (from the front) since `mark_persisted`, so only those need persisting.
+    """
+    chars: int
+    tokens: int
+    tokenizer: Optional["LucyTokenizerBase"]
+    appended: int
+    dropped: int
+
+    def __init__(self, messages: Iterable[Message] = ()):
+        self._messages: deque[Message] = deque()
+        self.chars = 0
+        self.tokens = 0
+        self.tokenizer = None
+        self.mark_persisted()
+        for message in messages:
+            self.append(message)
+        self.mark_persisted()
+
+    def append(self, message: Message) -> None:
+        self._messages.append(message)
+        self.chars += len(message.content)
+        self.tokens += message.token_count(self.tokenizer)
+        self.appended += 1
+
+    def popleft(self) -> Message:
+        if self.appended >= len(self._messages):
+            # never persisted, so there's nothing to drop
+            self.appended -= 1
+        else:
+            self.dropped += 1
+        message = self._messages.popleft()
+        self.chars -= len(message.content)
+        self.tokens -= message.token_count(self.tokenizer)
+        return message
+
+    def newest(self, count: int) -> List[Message]:
+        """the newest count messages, oldest first."""
+        return list(islice(reversed(self._messages), count))[::-1]
+
+    def mark_persisted(self) -> None:
+        """start counting appended and dropped messages afresh."""
+        self.appended = 0
+        self.dropped = 0
+
+    def use_tokenizer(self, tokenizer: Optional["LucyTokenizerBase"]) -> None:
+        """count tokens with this tokenizer from now on. Recounts the history if the tokenizer changed."""
+        if (tokenizer and tokenizer.name) == (self.tokenizer and self.tokenizer.name):
+            return
+        self.tokenizer = tokenizer
+        self.tokens = sum(message.token_count(tokenizer) for message in self._messages)
+
+    def evict(self,
+              max_length: Optional[int] = None,
+              max_chars: Optional[int] = None,
+              max_tokens: Optional[int] = None) -> List[Message]:
+        """Removes the oldest messages until the history is within max_length messages, max_chars and max_tokens.
+        The newest message is never evicted to meet the char or token budget.
+        Returns the evicted messages, oldest first.
+        """
+        evicted = []
+        while self._messages and max_length is not None and len(self._messages) > max_length:
+            evicted.append(self.popleft())
+        while len(self._messages) > 1 and ((max_chars is not None and self.chars > max_chars)
+                                           or (max_tokens is not None and self.tokens > max_tokens)):
+            evicted.append(self.popleft())
+        return evicted
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self) -> Iterator[Message]:
+        return iter(self._messages)
+
+    def __getitem__(self, index: int) -> Message:
+        return self._messages[index]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, MessageHistory):
+            other = other._messages
+        return list(self._messages) == list(other)
+
+    def __repr__(self) -> str:
+        return f"MessageHistory({list(self._messages)!r})"
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        # validates from (and serializes to) a plain list of Messages
+        messages = handler.generate_schema(list[Message])
+        return core_schema.union_schema(
+            [core_schema.is_instance_schema(cls),
+             core_schema.no_info_after_validator_function(cls, messages)],
+            serialization=core_schema.plain_serializer_function_ser_schema(list, return_schema=messages),
+        )
+
+class CoreMemoryChanges(LucySchema):
+    """What changed in a core memory since it was last persisted, so backends can persist just that."""
+    segments: dict[str, str] = Field(description="the segments that changed, with their new values", default_factory=dict)
+    dropped: int = Field(description="how many messages were evicted from the front of the persisted history", default=0)
+    appended: list[Message] = Field(description="the messages appended to the history, oldest first", default_factory=list)
+    history: Optional[list[Message]] = Field(description="the whole history, when it has to be rewritten (ie it has never been persisted)", default=None)
+    length: int = Field(description="the length of the history after these changes")
+
+    @property
+    def empty(self) -> bool:
+        return not (self.segments or self.dropped or self.appended or self.history is not None)
+
+    def merge(self, later: "CoreMemoryChanges") -> "CoreMemoryChanges":
+        """these changes followed by later ones, as one set of changes."""
+        segments = {**self.segments, **later.segments}
+        if later.history is not None:
+            return CoreMemoryChanges(segments=segments, history=later.history, length=later.length)
+        if self.history is not None:
+            return CoreMemoryChanges(segments=segments, history=self.history[later.dropped:] + later.appended, length=later.length)
+        # the persisted messages still in the history after these changes; later drops those first, then what these changes appended
+        kept = self.length - len(self.appended)
+        cut = max(0, later.dropped - kept)
+        return CoreMemoryChanges(segments=segments,
+                                 dropped=self.dropped + min(later.dropped, kept),
+                                 appended=self.appended[cut:] + later.appended,
+                                 length=later.length)
+
 class LucyMemoryCore(LucySchema):
-    """The core memory components of an agent."""
+    """The core memory components of an agent.
+    Tracks which segments changed (and what was appended to or dropped from the history) since it was last persisted, see `take_changes`.
+    """
     boot: str = Field(description="the system 'boot' message section of core memory, which introduces the LLM to the new agent instance")
     bios: str = Field(description="the system 'bios' message section of core memory, which details how core memory is to be used to the LLM")
     persona: str = Field(description="the persona section of core memory, describing the agent's personality")
     human: str = Field(description="the human section of core memory, describing the user")
-    history: list[Message] = Field(description="the visible message history for the agent")
+    summary: str = Field(description="a rolling summary of the history evicted from core memory, so the agent keeps the gist of it", default="")
+    history: MessageHistory = Field(description="the visible message history for the agent")
+
+    _segment_chars: dict[str, int] = PrivateAttr(default_factory=dict)
+    _changed: set[str] = PrivateAttr(default_factory=set)
+    _persisted: bool = PrivateAttr(default=False)
+
+    segments: ClassVar[tuple[str, ...]] = ("boot", "bios", "persona", "human", "summary",)
+
+    def model_post_init(self, __context) -> None:
+        for segment in self.segments:
+            self._segment_chars[segment] = len(getattr(self, segment))
+
+    def __setattr__(self, name: str, value) -> None:
+        super().__setattr__(name, value)
+        if name in self.segments:
+            self._segment_chars[name] = len(value)
+            self._changed.add(name)
+        elif name == "history":
+            self._changed.add(name)
+
+    def mark_persisted(self) -> None:
+        """the core as it is now has been persisted (ie it was just loaded), track changes from here."""
+        self._changed.clear()
+        self._persisted = True
+        self.history.mark_persisted()
+
+    def take_changes(self) -> CoreMemoryChanges:
+        """What changed since the last call (or `mark_persisted`), and tracks changes afresh from here.
+        A core that has never been persisted changes as a whole.
+        """
+        history = self.history
+        if not self._persisted or "history" in self._changed:
+            changed = self.segments if not self._persisted else self._changed - {"history"}
+            changes = CoreMemoryChanges(segments={segment: getattr(self, segment) for segment in changed},
+                                        history=list(history),
+                                        length=len(history))
+        else:
+            changes = CoreMemoryChanges(segments={segment: getattr(self, segment) for segment in self._changed},
+                                        dropped=history.dropped,
+                                        appended=history.newest(history.appended),
+                                        length=len(history))
+        self.mark_persisted()
+        return changes
+
+    @property
+    def stored(self) -> dict:
+        """core memory as json-ready data, ie to persist it, reusing each message's memoized dump (see `Message.stored`)."""
+        return {**{segment: getattr(self, segment) for segment in self.segments}, "history": [message.stored for message in self.history]}
+
+    @classmethod
+    def from_stored(cls, stored: dict) -> "LucyMemoryCore":
+        """the core memory `stored` was dumped from."""
+        return cls(**{segment: stored[segment] for segment in cls.segments if segment in stored},
+                   history=MessageHistory(Message.from_stored_many(stored.get("history") or [])))
+
+    def chars_in(self, segment: str) -> int:
+        """the cached size of a segment of core memory, in chars."""
+        return self._segment_chars[segment]
+
+    @property
+    def total_chars(self) -> int:
+        """the size of core memory as a whole, in chars."""
+        return sum(self._segment_chars.values()) + self.history.chars
 
-    def fifo_history(self, message: Message, max_length: int = 100) -> List[Optional[Message]]:
-        """Adds a message to the history, removing the oldest message if the history is at the maximum length."""
+    def fifo_history(self, message: Message, max_length: int = 100, max_total_chars: Optional[int] = None) -> List[Message]:
+        """Adds a message to the history, removing the oldest messages while the history is over the maximum length
+        or core memory as a whole is over max_total_chars.
+        Returns the removed messages, oldest first.
+        """
         self.history.append(message)
-        removed = []
-        while len(self.history) > max_length:
-            removed.append(self.history.pop(0))
-        return removed
+        max_history_chars = None
+        if max_total_chars is not None:
+            max_history_chars = max_total_chars - sum(self._segment_chars.values())
+        return self.history.evict(max_length=max_length, max_chars=max_history_chars)
 
 class RecallSearchResult(LucySchema):
     """A resultset from a recall memory search."""
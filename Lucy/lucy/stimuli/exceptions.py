@@ -0,0 +1,2 @@
+class StimuliQueueFull(Exception):
+    pass
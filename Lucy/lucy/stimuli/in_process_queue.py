@@ -0,0 +1,97 @@
+from typing import List, Optional
+from collections import deque
+import asyncio
+import threading
+
+from lucy.schema import Message
+from lucy.stimuli.exceptions import StimuliQueueFull
+from lucy.stimuli.stimuli_base import LucyStimuliBase
+
+
+class InProcessStimuliQueue(LucyStimuliBase):
+    """A two-lane stimuli queue in process memory, for agents fed from the same process (ie by an `AgentHost`).
+
+    The priority lane is always emptied before the normal lane, each in the order stimuli arrived. Enqueuing and dequeuing are O(1).
+    A stimuli enqueued with a coalesce_key replaces the one with the same key still waiting (keeping its place in line, or moving it up to the priority lane),
+    so an agent asked for the same thing again before it got to it only spends one turn on it; `coalesced` counts the turns saved.
+
+    Backpressure: once max_depth stimuli are waiting, `enque` refuses more normal stimuli with `StimuliQueueFull` and `aenque` waits for room.
+    Priority stimuli are always taken, so an agent enqueuing its own tool responses and OS messages can never block itself.
+
+    Args:
+        max_depth: the most stimuli that can be waiting before normal stimuli are refused. None for no limit
+    """
+
+    def __init__(self, max_depth: Optional[int] = 1000):
+        self.max_depth = max_depth
+        # entries are [message, coalesce_key]; an entry moved to the priority lane by coalescing is left behind with no message
+        self._lanes: tuple[deque[list], deque[list]] = (deque(), deque())
+        self._keyed: dict[str, tuple[bool, list]] = {}
+        self._depth = 0
+        self._coalesced = 0
+        self._lock = threading.Lock()
+        self._room: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    @property
+    def coalesced(self) -> int:
+        return self._coalesced
+
+    def enque(self, message: Message, priority: Optional[bool] = True, coalesce_key: Optional[str] = None) -> None:
+        priority = bool(priority)
+        with self._lock:
+            if coalesce_key is not None and (waiting := self._keyed.get(coalesce_key)) is not None:
+                self._coalesced += 1
+                lane, entry = waiting
+                if lane or not priority:
+                    entry[0] = message
+                    return
+                entry[0] = None
+                self._depth -= 1
+            elif not priority and self.max_depth is not None and self._depth >= self.max_depth:
+                raise StimuliQueueFull(f"{self._depth} stimuli are already waiting")
+            entry = [message, coalesce_key]
+            self._lanes[0 if priority else 1].append(entry)
+            self._depth += 1
+            if coalesce_key is not None:
+                self._keyed[coalesce_key] = (priority, entry)
+        self.notify()
+
+    async def aenque(self, message: Message, priority: Optional[bool] = True, coalesce_key: Optional[str] = None) -> None:
+        """enqueue, waiting for room if the queue is full."""
+        loop = asyncio.get_running_loop()
+        while "no room":
+            try:
+                return self.enque(message, priority=priority, coalesce_key=coalesce_key)
+            except StimuliQueueFull:
+                room = loop.create_future()
+                with self._lock:
+                    if self._depth < self.max_depth:
+                        continue
+                    self._room.append((loop, room))
+                await room
+
+    def deque(self) -> Optional[Message]:
+        messages = self.deque_many(1)
+        return messages[0] if messages else None
+
+    def deque_many(self, count: int) -> List[Message]:
+        messages = []
+        with self._lock:
+            for lane in self._lanes:
+                while lane and len(messages) < count:
+                    message, coalesce_key = lane.popleft()
+                    if message is None:
+                        continue
+                    if coalesce_key is not None:
+                        del self._keyed[coalesce_key]
+                    messages.append(message)
+            self._depth -= len(messages)
+            room, self._room = (self._room, []) if messages and self._room else ([], self._room)
+        for loop, waiter in room:
+            # every waiter retries; those that don't fit wait again
+            loop.call_soon_threadsafe(lambda waiter=waiter: waiter.done() or waiter.set_result(None))
+        return messages
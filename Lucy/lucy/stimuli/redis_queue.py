@@ -0,0 +1,207 @@
+from typing import Any, Callable, List, Optional
+from collections import deque
+from functools import partial
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+import weakref
+
+from lucy import encoding
+from lucy.schema import Message
+from lucy.stimuli.stimuli_base import LucyStimuliBase
+
+logger = logging.getLogger("lucy.stimuli.redis")
+
+# clients are shared by every queue in the process (per event loop, for the asyncio clients) so agents don't each hold a pool
+_clients: dict[str, Any] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, Any]]" = weakref.WeakKeyDictionary()
+_connecting = threading.Lock()
+
+
+def _redis():
+    try:
+        import redis
+    except ImportError as e:
+        raise ImportError("RedisStimuliQueue requires the `redis` package, try `pip install redis`") from e
+    return redis
+
+
+class RedisStimuliQueue(LucyStimuliBase):
+    """A stimuli queue in Redis (or anything that speaks its streams API), so an agent can be fed from any node.
+
+    Each agent instance has a stream per lane, `<prefix>:<instance_id>:priority` and `<prefix>:<instance_id>:normal`,
+    read through a consumer group: a dequeued stimulus stays pending until it's acknowledged with `ack` (at-least-once delivery),
+    and stimuli left pending by a consumer that died are claimed by the next one to dequeue after claim_idle seconds.
+    Acknowledged stimuli are deleted, so the streams only ever hold what's waiting or in flight.
+
+    `wait` blocks in Redis (XREADGROUP BLOCK) rather than polling, so a stimulus enqueued on any node wakes the agent as soon as it's written.
+    Stimuli are read batch_size at a time and handed out from a local buffer, priority lane first.
+
+    Args:
+        instance_id: the agent instance this queue feeds
+        url: the Redis server, used when no client is given
+        client: a redis-py client (ie `fakeredis.FakeRedis` in tests)
+        async_client: a redis.asyncio client for `wait`, defaults to one for url (or a blocking read of client on a thread)
+        consumer: this reader's name within the instance's consumer group, defaults to one per process
+        batch_size: how many stimuli to read at a time
+        claim_idle: claim stimuli another consumer has held unacknowledged for this many seconds
+        prefix: the prefix of the stream keys
+    """
+    group: str = "lucy"
+
+    def __init__(self,
+                 instance_id: str,
+                 url: str = "redis://localhost:6379/0",
+                 client: Optional[Any] = None,
+                 async_client: Optional[Any] = None,
+                 consumer: Optional[str] = None,
+                 batch_size: int = 32,
+                 claim_idle: float = 30.0,
+                 prefix: str = "lucy:stimuli"):
+        self.instance_id = instance_id
+        self.url = url
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = batch_size
+        self.claim_idle = claim_idle
+        self.lanes = {"priority": f"{prefix}:{instance_id}:priority", "normal": f"{prefix}:{instance_id}:normal"}
+        self._async_client = async_client
+        self.client = client or self._shared_client(url)
+        self._buffer: dict[str, deque[Message]] = {lane: deque() for lane in self.lanes}
+        self._buffering = threading.Lock()
+        self._claimed_at = 0.0
+        for stream in self.lanes.values():
+            self._create_group(stream)
+
+    @classmethod
+    def factory(cls, **kwargs) -> Callable:
+        """returns a callable that creates the queue for an agent instance, with any of the other constructor options."""
+        return partial(cls, **kwargs)
+
+    @staticmethod
+    def _shared_client(url: str) -> Any:
+        with _connecting:
+            if (client := _clients.get(url)) is None:
+                client = _clients[url] = _redis().Redis.from_url(url)
+            return client
+
+    def _create_group(self, stream: str) -> None:
+        try:
+            self.client.xgroup_create(stream, self.group, id="0", mkstream=True)
+        except _redis().ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def enque(self, message: Message, priority: Optional[bool] = True, coalesce_key: Optional[str] = None) -> None:
+        """coalesce_key is ignored, stimuli already written to the stream are never replaced."""
+        # the write itself wakes whoever is blocked in `wait`, on any node
+        self.client.xadd(self.lanes["priority" if priority else "normal"], {"message": encoding.dumps_bytes(message.stored)})
+
+    def deque(self) -> Optional[Message]:
+        messages = self.deque_many(1)
+        return messages[0] if messages else None
+
+    def deque_many(self, count: int, timeout: Optional[float] = None) -> List[Message]:
+        """get up to count of the next available stimuli, priority lane first.
+        With a timeout, blocks up to that many seconds for stimuli to arrive if none are waiting.
+        """
+        if (short := count - self._buffered()) > 0:
+            self._claim()
+            batch = max(short, self.batch_size)
+            self._fill(self.client.xreadgroup(self.group, self.consumer, {self.lanes["priority"]: ">"}, count=batch))
+            if len(self._buffer["priority"]) < count:
+                self._fill(self.client.xreadgroup(self.group, self.consumer, {self.lanes["normal"]: ">"}, count=batch))
+            if not self._buffered() and timeout:
+                self._fill(self.client.xreadgroup(self.group, self.consumer, {stream: ">" for stream in self.lanes.values()},
+                                                  count=batch, block=max(1, int(timeout * 1000))))
+        messages = []
+        with self._buffering:
+            for lane in self._buffer.values():
+                while lane and len(messages) < count:
+                    messages.append(lane.popleft())
+        return messages
+
+    def ack(self, messages: List[Message]) -> None:
+        """acknowledge and delete the stimuli, so they're never redelivered."""
+        receipts = [message._receipt for message in messages if message._receipt is not None]
+        if not receipts:
+            return
+        pipeline = self.client.pipeline(transaction=False)
+        for stream in self.lanes.values():
+            if ids := [entry for lane, entry in receipts if lane == stream]:
+                pipeline.xack(stream, self.group, *ids)
+                pipeline.xdel(stream, *ids)
+        pipeline.execute()
+        for message in messages:
+            message._receipt = None
+
+    @property
+    def depth(self) -> int:
+        """the stimuli waiting or in flight (dequeued but not yet acknowledged)."""
+        pipeline = self.client.pipeline(transaction=False)
+        for stream in self.lanes.values():
+            pipeline.xlen(stream)
+        return sum(pipeline.execute())
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """block in Redis until stimuli arrive on either lane or the timeout passes, whichever is first.
+        Returns True if there are stimuli to dequeue.
+        """
+        streams = {stream: ">" for stream in self.lanes.values()}
+        client = self._async()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._buffered():
+            # BLOCK 0 waits forever; None doesn't block at all
+            block = 0 if deadline is None else int(max(0.0, deadline - time.monotonic()) * 1000) or None
+            if client is None:
+                read = await asyncio.to_thread(self.client.xreadgroup, self.group, self.consumer, streams, count=self.batch_size, block=block)
+            else:
+                read = await client.xreadgroup(self.group, self.consumer, streams, count=self.batch_size, block=block)
+            self._fill(read)
+            if block is None:
+                break
+        return self._buffered() > 0
+
+    def _async(self) -> Optional[Any]:
+        """the asyncio client for the running loop, if there is one."""
+        if self._async_client is not None:
+            return self._async_client
+        if self.client is not _clients.get(self.url):
+            # a client was given but no asyncio counterpart
+            return None
+        clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+        if (client := clients.get(self.url)) is None:
+            client = clients[self.url] = _redis().asyncio.Redis.from_url(self.url)
+        return client
+
+    def _buffered(self) -> int:
+        return sum(len(lane) for lane in self._buffer.values())
+
+    def _fill(self, read: Optional[list]) -> None:
+        """buffer the entries read from the streams, by lane."""
+        lanes = {stream: lane for lane, stream in self.lanes.items()}
+        with self._buffering:
+            for stream, entries in read or ():
+                stream = stream.decode() if isinstance(stream, bytes) else stream
+                for entry, fields in entries:
+                    self._buffer[lanes[stream]].append(self._message(stream, entry, fields))
+
+    @staticmethod
+    def _message(stream: str, entry: Any, fields: dict) -> Message:
+        message = Message.model_validate_json(fields.get(b"message") or fields["message"])
+        message._receipt = (stream, entry)
+        return message
+
+    def _claim(self) -> None:
+        """take over stimuli left unacknowledged by another consumer for claim_idle seconds (at most once every claim_idle seconds)."""
+        if time.monotonic() - self._claimed_at < self.claim_idle:
+            return
+        self._claimed_at = time.monotonic()
+        for stream in self.lanes.values():
+            _, entries, *_ = self.client.xautoclaim(stream, self.group, self.consumer, int(self.claim_idle * 1000), "0-0", count=self.batch_size)
+            if entries:
+                logger.info("claimed %s stimuli left unacknowledged on %s", len(entries), stream)
+                # entries deleted since they were read come back as None
+                self._fill([(stream, [(entry, fields) for entry, fields in entries if fields])])
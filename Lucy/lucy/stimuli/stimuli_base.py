@@ -1,15 +1,23 @@
-from typing import Optional
+from typing import Callable, List, Optional
 from abc import ABC, abstractmethod
+import asyncio
 
 from lucy.schema import Message
 
 class LucyStimuliBase(ABC):
     """All Stimuli must implement this interface.
+
+    Implementations should call `notify()` every time a new stimuli is enqueued,
+    so that agents sleeping in `wait()` wake up right away instead of at their next heartbeat.
     """
+    _stimulated: Optional[asyncio.Event] = None
+    _waiting_loop: Optional[asyncio.AbstractEventLoop] = None
 
     @abstractmethod
-    def enque(self, message:Message, priority:Optional[bool]=True) -> None:
+    def enque(self, message:Message, priority:Optional[bool]=True, coalesce_key:Optional[str]=None) -> None:
         """Add this new stimuli to the stimuli queue.
+        A stimuli with a coalesce_key replaces any stimuli with the same key still waiting in the queue (if the queue supports coalescing),
+        ie so repeated system messages asking for the same action only cost one turn.
         """
         raise NotImplementedError
 
@@ -18,4 +26,81 @@ class LucyStimuliBase(ABC):
         """get the next available stimuli (if any exist) from the stimuli queue.
         Returns None if no stimuli are available.
         """
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    ### These methods are generally fine to inherit ###
+
+    @classmethod
+    def factory(cls, **kwargs) -> Callable:
+        """returns a callable that creates a queue for an agent with any of the constructor options.
+        NOTE: the callable has the signature (instance_id: Optional[str]) -> LucyStimuliBase; queues kept per instance override this to pass instance_id on.
+        """
+        def create(instance_id: Optional[str] = None) -> "LucyStimuliBase":
+            return cls(**kwargs)
+        return create
+
+    async def aenque(self, message: Message, priority: Optional[bool] = True, coalesce_key: Optional[str] = None) -> None:
+        """`enque` for producers on an event loop. Queues that apply backpressure wait here for room rather than refusing the stimuli."""
+        self.enque(message, priority=priority, coalesce_key=coalesce_key)
+
+    def deque_many(self, count: int) -> List[Message]:
+        """get up to count of the next available stimuli, in the order `deque` would return them."""
+        messages = []
+        while len(messages) < count and (message := self.deque()) is not None:
+            messages.append(message)
+        return messages
+
+    def ack(self, messages: List[Message]) -> None:
+        """acknowledge stimuli once they've been fully handled (ie the turn they were taken into is done).
+        Queues that redeliver unacknowledged stimuli (see `RedisStimuliQueue`) must override this; by default dequeuing is final.
+        """
+        pass
+
+    @property
+    def depth(self) -> Optional[int]:
+        """the number of stimuli waiting in the queue.
+        Returns None if the queue can't count them cheaply.
+        """
+        return None
+
+    @property
+    def coalesced(self) -> Optional[int]:
+        """the number of stimuli merged into one already waiting (ie turns saved) by coalescing.
+        Returns None if the queue doesn't coalesce.
+        """
+        return None
+
+    def notify(self) -> None:
+        """wake up any agent waiting on this queue. Safe to call from any thread."""
+        if self._stimulated is None:
+            self._stimulated = asyncio.Event()
+        loop = self._waiting_loop
+        if loop is None or loop.is_closed():
+            # nobody has waited yet, so the event is not bound to a loop
+            self._stimulated.set()
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._stimulated.set()
+        else:
+            loop.call_soon_threadsafe(self._stimulated.set)
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """sleep until new stimuli are enqueued or the timeout passes, whichever is first.
+        Returns True if woken by new stimuli, False if the timeout passed.
+        """
+        loop = asyncio.get_running_loop()
+        if self._stimulated is None or (self._waiting_loop is not None and self._waiting_loop is not loop):
+            self._stimulated = asyncio.Event()
+        self._waiting_loop = loop
+        # not wait_for, which (before 3.12) swallows a cancel that lands as the event is set, leaving the waiter uncancellable
+        try:
+            async with asyncio.timeout(timeout):
+                await self._stimulated.wait()
+        except TimeoutError:
+            return False
+        self._stimulated.clear()
+        return True
@@ -0,0 +1,288 @@
+"""Tracing for the agent loop: timed spans around each beat and turn, inference, tool calls, memory reads and writes, and the stimuli queue,
+sent to whichever exporters are added to the shared `tracer` (ie `InMemoryExporter` in tests, `LangfuseExporter` for the compose stack).
+
+With no exporters, `tracer.span` hands back one shared do-nothing span, so tracing costs a method call where it's disabled.
+Attributes that take work to gather should only be gathered `if span.recording`.
+"""
+from typing import Any, Optional
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from itertools import count
+import base64
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("lucy.tracing")
+
+_span_ids = count(1)
+
+
+class Span:
+    """One timed operation, and what happened in it. Use it as a context manager; spans opened inside it are its children.
+
+    Attribute names follow OpenTelemetry's conventions where there is one (ie `gen_ai.usage.input_tokens`), and are `lucy.*` otherwise.
+    """
+    __slots__ = ("tracer", "name", "attributes", "span_id", "parent_id", "trace_id", "started_ns", "started", "duration", "error", "_token")
+    recording = True
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Optional[dict] = None):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes or {}
+        self.span_id = next(_span_ids)
+        self.parent_id: Optional[int] = None
+        self.trace_id = self.span_id
+        # wall clock start for exporters, monotonic for the duration
+        self.started_ns = time.time_ns()
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add(self, key: str, amount: float = 1) -> None:
+        """add amount to a counting attribute, ie the messages evicted during the span."""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def __enter__(self) -> "Span":
+        self.tracer._start(self)
+        return self
+
+    def __exit__(self, kind, error, traceback) -> bool:
+        if error is not None:
+            self.error = f"{kind.__name__}: {error}"
+        self.tracer._end(self)
+        return False
+
+    def __repr__(self) -> str:
+        return f"Span({self.name!r}, duration={self.duration}, attributes={self.attributes})"
+
+
+class _NoopSpan:
+    """what `tracer.span` returns while tracing is disabled: records nothing."""
+    __slots__ = ()
+    recording = False
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def add(self, key: str, amount: float = 1) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, kind, error, traceback) -> bool:
+        return False
+
+
+_noop = _NoopSpan()
+_current: ContextVar[Optional[Span]] = ContextVar("lucy_span", default=None)
+
+
+class LucySpanExporterBase(ABC):
+    """All span exporters must implement this interface.
+
+    Exporters are called on the thread the span ran on, in the middle of the agent's turn, so anything slow (ie sending spans over the network)
+    should be buffered and done in the background. An exporter that raises is logged and otherwise ignored.
+    """
+
+    @abstractmethod
+    def export(self, span: Span) -> None:
+        """take a finished span."""
+        raise NotImplementedError
+
+    ### These methods are generally fine to inherit ###
+
+    def start(self, span: Span) -> None:
+        """a span has started, before any of its children. Exporters that need the parent open first (ie OpenTelemetry) override this."""
+        pass
+
+    def flush(self) -> None:
+        """send anything buffered."""
+        pass
+
+
+class Tracer:
+    """Opens spans and hands them to its exporters. Lucy records to the shared `tracer`; add an exporter to it to turn tracing on."""
+
+    def __init__(self):
+        # replaced rather than changed, so spans can read it without a lock
+        self.exporters: tuple[LucySpanExporterBase, ...] = ()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def add_exporter(self, exporter: LucySpanExporterBase) -> None:
+        with self._lock:
+            if exporter not in self.exporters:
+                self.exporters = (*self.exporters, exporter)
+
+    def remove_exporter(self, exporter: LucySpanExporterBase) -> None:
+        with self._lock:
+            self.exporters = tuple(e for e in self.exporters if e is not exporter)
+
+    def span(self, name: str, attributes: Optional[dict] = None) -> "Span | _NoopSpan":
+        """a span to time an operation with, ie `with tracer.span("memory.search") as span:`. Does nothing while there are no exporters."""
+        if not self.exporters:
+            return _noop
+        return Span(self, name, attributes)
+
+    def current(self) -> "Span | _NoopSpan":
+        """the innermost open span (in this thread or task), to add attributes to from deeper down, ie a backend's exact token usage."""
+        if not self.exporters:
+            return _noop
+        return _current.get() or _noop
+
+    def record(self, name: str, duration: float, attributes: Optional[dict] = None) -> None:
+        """a span for an operation that's already over, ending now, ie one timed on another thread."""
+        if not self.exporters:
+            return
+        span = Span(self, name, attributes)
+        span.started_ns -= int(duration * 1e9)
+        span.started -= duration
+        span.duration = duration
+        with span:
+            pass
+
+    def _start(self, span: Span) -> None:
+        if (parent := _current.get()) is not None:
+            span.parent_id = parent.span_id
+            span.trace_id = parent.trace_id
+        span._token = _current.set(span)
+        for exporter in self.exporters:
+            try:
+                exporter.start(span)
+            except Exception:
+                logger.exception("span exporter %r failed", exporter)
+
+    def _end(self, span: Span) -> None:
+        if span.duration is None:
+            span.duration = time.perf_counter() - span.started
+        try:
+            _current.reset(span._token)
+        except ValueError:
+            # ended in another context than it started in (ie an async generator closed elsewhere)
+            pass
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception:
+                logger.exception("span exporter %r failed", exporter)
+
+    def flush(self) -> None:
+        for exporter in self.exporters:
+            exporter.flush()
+
+
+# the tracer every part of Lucy records to
+tracer = Tracer()
+
+
+class InMemoryExporter(LucySpanExporterBase):
+    """Keeps finished spans in a list, for tests and benchmarks."""
+
+    def __init__(self):
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def named(self, name: str) -> list[Span]:
+        return [span for span in self.spans if span.name == name]
+
+    def children(self, span: Span) -> list[Span]:
+        return [child for child in self.spans if child.parent_id == span.span_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+def _otel_value(value: Any) -> Any:
+    """OpenTelemetry attributes are primitives or lists of them."""
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, (list, tuple)) and all(isinstance(item, (str, bool, int, float)) for item in value):
+        return list(value)
+    return str(value)
+
+
+class OpenTelemetryExporter(LucySpanExporterBase):
+    """Sends spans to OpenTelemetry, as spans of the same name and parentage (so any OpenTelemetry backend can show Lucy's turns).
+    Requires opentelemetry-sdk (`pip install opentelemetry-sdk`).
+
+    Args:
+        tracer_provider: the provider to create spans with, the globally configured one by default
+    """
+
+    def __init__(self, tracer_provider: Any = None):
+        try:
+            from opentelemetry import trace
+            from opentelemetry.trace import Status, StatusCode
+        except ImportError as e:
+            raise ImportError("OpenTelemetryExporter requires opentelemetry (pip install opentelemetry-sdk)") from e
+        self._trace, self._error = trace, lambda description: Status(StatusCode.ERROR, description)
+        self.tracer_provider = tracer_provider or trace.get_tracer_provider()
+        self.tracer = self.tracer_provider.get_tracer("lucy")
+        # the OpenTelemetry span for every open Lucy span, so children are created under their parents
+        self._open: dict[int, Any] = {}
+
+    def start(self, span: Span) -> None:
+        parent = self._open.get(span.parent_id) if span.parent_id is not None else None
+        self._open[span.span_id] = self.tracer.start_span(
+            span.name,
+            context=self._trace.set_span_in_context(parent) if parent is not None else None,
+            start_time=span.started_ns,
+        )
+
+    def export(self, span: Span) -> None:
+        if (opened := self._open.pop(span.span_id, None)) is None:
+            # started before the exporter was added
+            return
+        opened.set_attributes({key: _otel_value(value) for key, value in span.attributes.items() if value is not None})
+        if span.error is not None:
+            opened.set_status(self._error(span.error))
+        opened.end(end_time=span.started_ns + int(span.duration * 1e9))
+
+    def flush(self) -> None:
+        if hasattr(self.tracer_provider, "force_flush"):
+            self.tracer_provider.force_flush()
+
+
+class LangfuseExporter(OpenTelemetryExporter):
+    """Sends spans to Langfuse (ie the `lucy_langfuse` service in docker-compose.yml) through its OpenTelemetry endpoint.
+    Inference spans carry `gen_ai.*` attributes, so Langfuse shows them as generations with their model and token usage.
+    Requires opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http (`pip install opentelemetry-sdk opentelemetry-exporter-otlp-proto-http`).
+
+    Args:
+        host: the Langfuse server, `LANGFUSE_HOST` by default
+        public_key: the project's public key, `LANGFUSE_PUBLIC_KEY` by default
+        secret_key: the project's secret key, `LANGFUSE_SECRET_KEY` by default
+    """
+
+    def __init__(self, host: Optional[str] = None, public_key: Optional[str] = None, secret_key: Optional[str] = None):
+        try:
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError as e:
+            raise ImportError("LangfuseExporter requires opentelemetry (pip install opentelemetry-sdk opentelemetry-exporter-otlp-proto-http)") from e
+        host = (host or os.environ.get("LANGFUSE_HOST", "http://lucy-langfuse:3000")).rstrip("/")
+        credentials = f"{public_key or os.environ['LANGFUSE_PUBLIC_KEY']}:{secret_key or os.environ['LANGFUSE_SECRET_KEY']}"
+        provider = TracerProvider(resource=Resource.create({"service.name": "lucy"}))
+        # batched, so spans are sent off the agent's turn
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(
+            endpoint=f"{host}/api/public/otel/v1/traces",
+            headers={"Authorization": f"Basic {base64.b64encode(credentials.encode()).decode()}"},
+        )))
+        super().__init__(tracer_provider=provider)
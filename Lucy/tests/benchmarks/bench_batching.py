@@ -0,0 +1,47 @@
+"""Benchmarks turn throughput with and without the micro-batching dispatcher, against a fake backend with injected latency.
+
+    python -m tests.benchmarks.bench_batching [agent_count] [turns_per_agent]
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lucy.backends.batching import MicroBatchDispatcher
+from lucy.schema import Turn, Message, Role
+from tests.fakes import FakeInferenceBackend
+
+
+def agent_turns(backend, turns: int) -> None:
+    """an agent taking its turns one after the other."""
+    for _ in range(turns):
+        backend.generate(Turn(request_messages=[Message(role=Role.user, content="hi")], request_tools=[]))
+
+
+def throughput(backend, agents: int, turns: int) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=agents) as executor:
+        for _ in range(agents):
+            executor.submit(agent_turns, backend, turns)
+    return agents * turns / (time.perf_counter() - started)
+
+
+def fake_server() -> FakeInferenceBackend:
+    # a server that can work on 4 requests at a time, each taking 50ms, plus 0.5ms per turn in a batch
+    return FakeInferenceBackend(latency=0.05, slots=4, batch_latency_per_turn=0.0005)
+
+
+if __name__ == "__main__":
+    agents = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    turns = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    direct = fake_server()
+    print(f"{agents} agents, one request per turn: {throughput(direct, agents, turns):.0f} turns/s "
+          f"({direct.requests} requests)")
+
+    for window in (0.002, 0.01, 0.05):
+        server = fake_server()
+        dispatcher = MicroBatchDispatcher(server, window=window, max_batch_size=32)
+        rate = throughput(dispatcher, agents, turns)
+        dispatcher.close()
+        print(f"{agents} agents, micro-batched ({window * 1000:.0f}ms window): {rate:.0f} turns/s "
+              f"({server.requests} requests, mean batch {dispatcher.batched_turns / dispatcher.batches:.1f} turns)")
@@ -0,0 +1,39 @@
+"""Benchmarks assembling a turn from core memory as the history grows.
+
+    python -m tests.benchmarks.bench_context
+"""
+import time
+
+from lucy.agent.context import ContextAssembler
+from lucy.schema import LucyMemoryCore, Message, Role
+from tests.fakes import FakeInferenceBackend
+
+
+def timed(function, repeat: int = 20) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+if __name__ == "__main__":
+    backend = FakeInferenceBackend()
+    backend.context_window_tokens = 32768
+    backend.core_memory_maximum_number_of_messages_in_history = 1_000_000
+    assembler = ContextAssembler(backend)
+
+    for size in (10, 100, 1_000, 10_000, 100_000):
+        core = LucyMemoryCore(boot="boot " * 200, bios="bios " * 200, persona="persona " * 100, human="human " * 100, history=[])
+        messages = [Message(role=Role.user if i % 2 else Role.assistant, content=f"message {i} " * 20) for i in range(size)]
+        started = time.perf_counter()
+        for message in messages:
+            core.fifo_history(message, max_length=1_000_000)
+        _, evicted = assembler.assemble(core)
+        cold = time.perf_counter() - started
+
+        def next_turn():
+            core.fifo_history(Message(role=Role.user, content="and another thing " * 10), max_length=1_000_000)
+            assembler.assemble(core)
+
+        print(f"{size:>7} messages: first assembly {cold * 1000:8.2f}ms (evicted {len(evicted)}), "
+              f"each turn after {timed(next_turn) * 1000:.3f}ms with {len(core.history)} messages in context")
@@ -0,0 +1,62 @@
+"""Benchmarks the asyncio agent daemon: CPU burned per idle agent, and wake-up latency once a stimulus arrives.
+
+    python -m tests.benchmarks.bench_daemon [agent_count] [idle_seconds]
+"""
+import sys
+import time
+import random
+import asyncio
+from datetime import datetime
+
+from lucy.agent.agent import Agent
+from lucy.schema import Message, Role
+from tests.fakes import FakeInferenceBackend, FakeMemoryBackend, FakeStimuliQueue
+
+
+def build_agents(count: int) -> list[Agent]:
+    backend = FakeInferenceBackend()
+    return [Agent(inference_backend=backend,
+                  stimuli_queue=FakeStimuliQueue(),
+                  core_memory_backend=FakeMemoryBackend,
+                  archival_memory_backend=FakeMemoryBackend,
+                  recall_memory_backend=FakeMemoryBackend,
+                  # spread heartrates so the agents don't all beat in lockstep
+                  heartrate=random.randint(600, 3600),
+                  autostart=False)
+            for _ in range(count)]
+
+
+async def run(count: int, idle_seconds: float, stimuli: int = 200):
+    agents = build_agents(count)
+    daemons = [asyncio.create_task(agent.adaemon()) for agent in agents]
+    await asyncio.sleep(0.5)  # let every daemon reach its first sleep
+
+    cpu, wall = time.process_time(), time.perf_counter()
+    await asyncio.sleep(idle_seconds)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    print(f"{count} idle agents for {wall:.1f}s: {cpu * 1000:.1f}ms CPU total, "
+          f"{cpu / count / wall * 1e6:.2f}us CPU per agent per second")
+
+    latencies = []
+    for agent in random.sample(agents, min(stimuli, count)):
+        backend = agent.inference_backend
+        seen = len(backend.generated_at)
+        sent = datetime.now().timestamp()
+        agent.stimuli_queue.enque(Message(role=Role.user, content="hello?"), priority=False)
+        while len(backend.generated_at) == seen:
+            await asyncio.sleep(0)
+        latencies.append(backend.generated_at[seen] - sent)
+    latencies.sort()
+    print(f"wake-up latency over {len(latencies)} stimuli: "
+          f"p50 {latencies[len(latencies) // 2] * 1000:.2f}ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms, "
+          f"max {latencies[-1] * 1000:.2f}ms")
+
+    for daemon in daemons:
+        daemon.cancel()
+    await asyncio.gather(*daemons, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000,
+                    float(sys.argv[2]) if len(sys.argv) > 2 else 5.0))
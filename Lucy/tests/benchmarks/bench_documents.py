@@ -0,0 +1,60 @@
+"""Benchmarks the memory held by cached Documents and the cost of building ArchivalSearchResults, float32 array embeddings vs lists of floats.
+
+    python -m tests.benchmarks.bench_documents [dimensions] [document_count]
+"""
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from pydantic import Field
+
+from lucy.schema import ArchivalSearchResult, Document, LucySchema
+
+
+class ListDocument(LucySchema):
+    """Document as it was, with a list of floats."""
+    content: str = Field(description="the text of the document")
+    embeddings: list[float] = Field(description="the embeddings of the document")
+
+
+class ListArchivalSearchResult(LucySchema):
+    results: list[ListDocument]
+    page: int
+    page_count: int
+    query: str
+
+
+def held(build) -> tuple[float, object]:
+    """bytes allocated (and still held) per document by build."""
+    tracemalloc.start()
+    documents = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(documents), documents
+
+
+def construction(result, documents: list[dict], repeat: int = 20) -> float:
+    """ms to validate one page of search results."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result.model_validate({"results": documents, "page": 1, "page_count": 1, "query": "pickles"})
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+if __name__ == "__main__":
+    dimensions = int(sys.argv[1]) if len(sys.argv) > 1 else 1536
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    vectors = np.random.rand(count, dimensions).astype(np.float32)
+
+    as_lists, _ = held(lambda: [ListDocument(content=f"document {i}", embeddings=vector.tolist()) for i, vector in enumerate(vectors)])
+    as_arrays, _ = held(lambda: [Document(content=f"document {i}", embeddings=vector.copy()) for i, vector in enumerate(vectors)])
+    print(f"per cached document: {as_lists / 1024:.1f}KiB as a list, {as_arrays / 1024:.1f}KiB as float32 ({as_lists / as_arrays:.1f}x smaller)")
+
+    page = vectors[:10]
+    print(f"10 result page: {construction(ListArchivalSearchResult, [{'content': 'x', 'embeddings': v.tolist()} for v in page]):.3f}ms from lists, "
+          f"{construction(ArchivalSearchResult, [{'content': 'x', 'embeddings': v} for v in page]):.3f}ms from arrays")
+
+    document = Document(content="x", embeddings=vectors[0])
+    print(f"json per document: {len(ListDocument(content='x', embeddings=vectors[0].tolist()).model_dump_json())} bytes as a list, "
+          f"{len(document.model_dump_json())} bytes as base64")
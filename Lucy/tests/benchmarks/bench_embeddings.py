@@ -0,0 +1,34 @@
+"""Benchmarks embedding throughput by batch size, and re-archiving cached content, against an embedder with a fixed cost per call
+(the overhead a real model pays per forward pass) plus a small cost per text.
+
+    python -m tests.benchmarks.bench_embeddings [text_count]
+"""
+import sys
+import time
+
+from lucy.backends.embedders import HashingEmbeddingBackend
+
+
+class ModelLikeEmbeddingBackend(HashingEmbeddingBackend):
+    def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(0.005 + 0.0002 * len(texts))
+        return super().embed_batch(texts)
+
+
+def throughput(embedder: HashingEmbeddingBackend, texts: list[str]) -> float:
+    started = time.perf_counter()
+    embedder.embed_many(texts)
+    return len(texts) / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    texts = [f"archived thought number {i} about extra pickles" for i in range(count)]
+
+    for batch_size in (1, 8, 64, 256):
+        embedder = ModelLikeEmbeddingBackend()
+        embedder.batch_size = batch_size
+        print(f"batch size {batch_size:>3}: {throughput(embedder, texts):8.0f} texts/s")
+    embedder = ModelLikeEmbeddingBackend()
+    embedder.embed_many(texts)
+    print(f"re-archiving cached content: {throughput(embedder, texts):8.0f} texts/s")
@@ -0,0 +1,43 @@
+"""Benchmarks template rendering: a fresh jinja2 lookup per render (how PromptEngine used to work) against the compiled and memoized PromptEngine.
+
+    python -m tests.benchmarks.bench_prompt_engine
+"""
+import time
+
+import jinja2
+
+from lucy.agent.prompt_engine import PromptEngine
+from tests.fakes import FakeInferenceBackend
+
+RENDERS = (
+    ("boot", {}),
+    ("bios", {}),
+    ("human", {}),
+    ("persona", {}),
+    ("core_memory_resize", {"segment": "human", "max_chars": 2000}),
+)
+
+
+def per_render(render, repeat: int = 2000) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for template, kwargs in RENDERS:
+            render(template, **kwargs)
+    return (time.perf_counter() - started) / (repeat * len(RENDERS))
+
+
+if __name__ == "__main__":
+    package, templates_directory = FakeInferenceBackend().prompt_engine_args
+
+    started = time.perf_counter()
+    env = jinja2.Environment(loader=jinja2.PackageLoader(package, templates_directory))
+    print(f"before: new environment {(time.perf_counter() - started) * 1e6:.0f}us, "
+          f"render {per_render(lambda template, **kwargs: env.get_template(template).render(**kwargs)) * 1e6:.2f}us")
+
+    started = time.perf_counter()
+    PromptEngine(package, templates_directory)
+    first = time.perf_counter() - started
+    started = time.perf_counter()
+    engine = PromptEngine(package, templates_directory)
+    print(f"after: first engine {first * 1e6:.0f}us, every engine after {(time.perf_counter() - started) * 1e6:.1f}us, "
+          f"render {per_render(engine.render) * 1e6:.2f}us")
@@ -0,0 +1,48 @@
+"""Benchmarks the serialization hot paths: building messages, loading stored ones, dumping a turn's request and encoding payloads.
+
+    python -m tests.benchmarks.bench_serialization
+"""
+import json
+import time
+
+from lucy import encoding
+from lucy.schema import Message, Role, ToolCall, ToolCallFunction
+
+
+def timed(function, repeat: int = 20) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def messages(count: int) -> list[Message]:
+    built = []
+    for i in range(count):
+        if i % 4 == 1:
+            built.append(Message(role=Role.assistant, content="",
+                                 tool_calls=[ToolCall(id=f"call_{i}", function=ToolCallFunction(name="search", arguments={"query": f"thing {i}", "page": 1}))]))
+        elif i % 4 == 2:
+            built.append(Message(role=Role.tool, content=f'{{"results": ["thing {i}"]}}', tool_call_id=f"call_{i - 1}"))
+        else:
+            built.append(Message(role=Role.user if i % 2 else Role.assistant, content=f"message {i} " * 20))
+    return built
+
+
+if __name__ == "__main__":
+    print(f"encoding with {'orjson' if encoding.orjson is not None else 'json (orjson is not installed)'}")
+    for size in (10, 200, 2_000):
+        history = messages(size)
+        stored = [message.model_dump(mode="json") for message in history]
+        encoded = json.dumps(stored)
+
+        print(f"{size:>5} messages:")
+        print(f"    build           {timed(lambda: messages(size)) * 1000:8.3f}ms")
+        print(f"    model_validate  {timed(lambda: [Message.model_validate(message) for message in stored]) * 1000:8.3f}ms"
+              f"    from_stored_many {timed(lambda: Message.from_stored_many(stored)) * 1000:8.3f}ms")
+        print(f"    model_dump      {timed(lambda: [message.model_dump(exclude_none=True) for message in history]) * 1000:8.3f}ms"
+              f"    payload (each turn after the first) {timed(lambda: [message.payload for message in history]) * 1000:8.3f}ms")
+        print(f"    json.dumps      {timed(lambda: json.dumps(stored)) * 1000:8.3f}ms"
+              f"    encoding.dumps {timed(lambda: encoding.dumps_bytes(stored)) * 1000:8.3f}ms")
+        print(f"    json.loads      {timed(lambda: json.loads(encoded)) * 1000:8.3f}ms"
+              f"    encoding.loads {timed(lambda: encoding.loads(encoded)) * 1000:8.3f}ms")
@@ -0,0 +1,37 @@
+"""Benchmarks in-process stimuli queue throughput, and the resize requests coalescing saves an agent whose core memory check keeps failing.
+
+    python -m tests.benchmarks.bench_stimuli_queue [stimuli_count]
+"""
+import sys
+import time
+
+from lucy.schema import Message, Role
+from lucy.stimuli.in_process_queue import InProcessStimuliQueue
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    messages = [Message(role=Role.user, content=f"stimuli {i}") for i in range(count)]
+
+    stimuli = InProcessStimuliQueue(max_depth=None)
+    started = time.perf_counter()
+    for i, message in enumerate(messages):
+        stimuli.enque(message, priority=not i % 10)
+    enqueued = time.perf_counter() - started
+    started = time.perf_counter()
+    while stimuli.deque_many(64):
+        pass
+    dequeued = time.perf_counter() - started
+    print(f"enque: {count / enqueued:10.0f} stimuli/s")
+    print(f"deque: {count / dequeued:10.0f} stimuli/s (64 at a time)")
+
+    # bursts of 4 user messages between turns, each followed by a core memory check that fails
+    for coalesce in (False, True):
+        stimuli, delivered = InProcessStimuliQueue(max_depth=None), 0
+        for turn in range(250):
+            for i in range(4):
+                stimuli.enque(Message(role=Role.user, content=f"user {turn}.{i}"), priority=False)
+                stimuli.enque(Message(role=Role.system, content="resize human"),
+                              coalesce_key="core_memory_resize:human" if coalesce else None)
+            delivered += len(stimuli.deque_many(count))
+        print(f"{'with' if coalesce else 'without'} coalescing: {delivered} stimuli delivered, {stimuli.coalesced} resize requests coalesced")
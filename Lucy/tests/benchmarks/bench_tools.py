@@ -0,0 +1,31 @@
+"""Benchmarks a turn's tool calls run one after another vs concurrently, with tools that sleep to stand in for I/O.
+
+    python -m tests.benchmarks.bench_tools [calls_per_turn] [seconds_per_call]
+"""
+import os
+import sys
+import time
+
+from lucy.agent.tool_engine import ToolEngine
+from lucy.schema import ToolCall, ToolCallFunction
+
+sleepy_tools = os.path.join(os.path.dirname(__file__), "..", "tools", "sleepy_tools.py")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    engine = ToolEngine(sleepy_tools, max_workers=8)
+    for tool in ("sleep", "async_sleep"):
+        calls = [ToolCall(id=str(i), function=ToolCallFunction(name=tool, arguments={"seconds": seconds})) for i in range(count)]
+        started = time.perf_counter()
+        for tool_call in calls:
+            engine.execute(tool_call)
+        one_at_a_time = time.perf_counter() - started
+        started = time.perf_counter()
+        engine.execute_many(calls)
+        concurrent = time.perf_counter() - started
+        print(f"{count} x {tool}({seconds}): {one_at_a_time:.3f}s one at a time, {concurrent:.3f}s concurrently")
+    stats = engine.stats["sleep"]
+    print(f"sleep: {stats.calls} calls, mean {stats.mean_latency:.3f}s, max {stats.max_latency:.3f}s")
+    engine.close()
@@ -0,0 +1,46 @@
+"""Benchmarks what tracing costs the agent loop, disabled (the default) and recording to memory.
+
+    python -m tests.benchmarks.bench_tracing
+"""
+import time
+
+from lucy.agent.agent import Agent
+from lucy.schema import Message, Role
+from lucy.tracing import InMemoryExporter, tracer
+from tests.fakes import FakeInferenceBackend, FakeMemoryBackend, FakeStimuliQueue
+
+
+def timed(function, repeat: int = 20) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def span():
+    with tracer.span("bench", {"lucy.instance_id": "bench"}) as span:
+        if span.recording:
+            span.set("lucy.memory.count", 1)
+
+
+if __name__ == "__main__":
+    agent = Agent(instance_id="bench",
+                  inference_backend=FakeInferenceBackend(),
+                  stimuli_queue=FakeStimuliQueue(),
+                  core_memory_backend=FakeMemoryBackend,
+                  archival_memory_backend=FakeMemoryBackend,
+                  recall_memory_backend=FakeMemoryBackend,
+                  summarize_recall=False,
+                  autostart=False)
+
+    def turn():
+        agent.stimuli_queue.enque(Message(role=Role.user, content="and another thing " * 10), priority=False)
+        agent.beat()
+
+    for enabled in (False, True):
+        exporter = InMemoryExporter()
+        if enabled:
+            tracer.add_exporter(exporter)
+        print(f"tracing {'to memory' if enabled else 'disabled'}: "
+              f"a span {timed(span, repeat=100_000) * 1e6:.3f}µs, a turn {timed(turn, repeat=1_000) * 1000:.3f}ms")
+        tracer.remove_exporter(exporter)
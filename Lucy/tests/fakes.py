@@ -0,0 +1,121 @@
+"""In-process fakes of the Lucy backends, used by the tests and benchmarks so they can run without an LLM, database or queue server."""
+from typing import Callable, List, Optional
+from collections import deque
+from datetime import datetime
+import asyncio
+import threading
+import time
+
+from lucy.schema import Turn, Message, Role, MemoryType, LucyMemoryCore, Document
+from lucy.backends.inference_backend_base import LucyInferenceBackendBase
+from lucy.backends.memory_backend_base import LucyMemoryBackendBase
+from lucy.stimuli.stimuli_base import LucyStimuliBase
+
+
+class FakeInferenceBackend(LucyInferenceBackendBase):
+    """answers every turn with a canned assistant message after an (optional) injected latency.
+
+    The fake server has a fixed number of request slots; a batch of turns takes one slot for
+    the request latency plus batch_latency_per_turn for each turn in it.
+    """
+    package_name = "tests"
+    model = "fake"
+    core_memory_maximum_number_of_messages_in_history = 10
+    core_memory_maximum_total_chars = 10000
+    core_memory_maximum_chars_in_persona = 2000
+    core_memory_maximum_chars_in_human = 2000
+    core_memory_maximum_tool_count = 10
+    context_window_tokens = None
+
+    def __init__(self, latency: float = 0.0, slots: int = 1024, batch_latency_per_turn: float = 0.0):
+        self.latency = latency
+        self.batch_latency_per_turn = batch_latency_per_turn
+        self.slots = threading.BoundedSemaphore(slots)
+        self.generated_at: List[float] = []
+        self.requests = 0
+
+    def _complete(self, turn: Turn) -> Turn:
+        self.generated_at.append(datetime.now().timestamp())
+        turn.response_message = Message(role=Role.assistant, content="ok")
+        return turn
+
+    def generate(self, turn: Turn) -> Turn:
+        with self.slots:
+            self.requests += 1
+            if self.latency:
+                time.sleep(self.latency)
+            return self._complete(turn)
+
+    def generate_many(self, turns: List[Turn]) -> List[Turn]:
+        with self.slots:
+            self.requests += 1
+            time.sleep(self.latency + self.batch_latency_per_turn * len(turns))
+            return [self._complete(turn) for turn in turns]
+
+    async def agenerate_many(self, turns: List[Turn]) -> List[Turn]:
+        return await asyncio.to_thread(self.generate_many, turns)
+
+
+class FakeMemoryBackend(LucyMemoryBackendBase):
+    """keeps everything in dicts keyed by instance_id."""
+    cores: dict = {}
+    recall: dict = {}
+    archival: dict = {}
+
+    @classmethod
+    def initialize(cls, memory_type: MemoryType):
+        pass
+
+    @classmethod
+    def factory(cls, *args, **kwargs) -> Callable:
+        return cls
+
+    @property
+    def core(self) -> Optional[LucyMemoryCore]:
+        return self.cores.get(self.instance_id)
+
+    @core.setter
+    def core(self, value: LucyMemoryCore):
+        self.cores[self.instance_id] = value
+
+    def _write_to_recall(self, messages: List[Message]) -> None:
+        self.recall.setdefault(self.instance_id, []).extend(messages)
+
+    def _write_to_archival(self, documents: List[Document]) -> None:
+        self.archival.setdefault(self.instance_id, []).extend(documents)
+
+
+class FakeStimuliQueue(LucyStimuliBase):
+    """a bare two-lane deque."""
+
+    def __init__(self):
+        self.priority = deque()
+        self.normal = deque()
+
+    def enque(self, message: Message, priority: Optional[bool] = True, coalesce_key: Optional[str] = None) -> None:
+        (self.priority if priority else self.normal).append(message)
+        self.notify()
+
+    @property
+    def depth(self) -> int:
+        return len(self.priority) + len(self.normal)
+
+    def deque(self) -> Optional[Message]:
+        for lane in (self.priority, self.normal):
+            if lane:
+                return lane.popleft()
+        return None
+
+
+class FlakyWriter:
+    """a batch writer that fails its first few batches, as though the database went away."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.batches = []
+
+    def __call__(self, batch: list) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database went away")
+        self.batches.append(batch)
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from lucy.agent.agent import Agent
+from lucy.schema import Message, Role
+from tests.fakes import FakeInferenceBackend, FakeMemoryBackend, FakeStimuliQueue
+
+
+def fake_agent(heartrate: int = 3600) -> Agent:
+    return Agent(inference_backend=FakeInferenceBackend(),
+                 stimuli_queue=FakeStimuliQueue(),
+                 core_memory_backend=FakeMemoryBackend,
+                 archival_memory_backend=FakeMemoryBackend,
+                 recall_memory_backend=FakeMemoryBackend,
+                 heartrate=heartrate,
+                 autostart=False)
+
+
+class TestAgentDaemon:
+
+    def test_idle_agent_sleeps_until_heartbeat(self):
+        agent = fake_agent()
+
+        async def idle():
+            daemon = asyncio.create_task(agent.adaemon())
+            await asyncio.sleep(0.1)
+            daemon.cancel()
+
+        asyncio.run(idle())
+        assert agent.inference_backend.generated_at == []
+
+    def test_stimuli_wakes_agent_before_heartbeat(self):
+        agent = fake_agent()
+
+        async def stimulate():
+            daemon = asyncio.create_task(agent.adaemon())
+            await asyncio.sleep(0.05)
+            agent.stimuli_queue.enque(Message(role=Role.user, content="hi Lucy"), priority=False)
+            for _ in range(100):
+                if agent.inference_backend.generated_at:
+                    break
+                await asyncio.sleep(0.01)
+            daemon.cancel()
+
+        asyncio.run(stimulate())
+        assert len(agent.inference_backend.generated_at) == 1
+        assert agent.core_memory.history[0].content == "hi Lucy"
+
+    def test_stimuli_sent_before_waiting_is_not_lost(self):
+        queue = FakeStimuliQueue()
+        queue.enque(Message(role=Role.user, content="early"))
+        assert asyncio.run(queue.wait(10))
+
+    def test_cancelling_a_wait_as_stimuli_arrive_still_cancels(self):
+        queue = FakeStimuliQueue()
+
+        async def cancel_as_stimulated():
+            waiting = asyncio.create_task(queue.wait(10))
+            await asyncio.sleep(0)
+            # woken and cancelled in the same pass of the loop
+            queue.notify()
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+
+        asyncio.run(cancel_as_stimulated())
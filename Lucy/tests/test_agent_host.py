@@ -0,0 +1,143 @@
+import asyncio
+import threading
+
+import pytest
+
+from lucy.agent.agent import Agent
+from lucy.agent.host import AgentHost
+from lucy.schema import Message, Role
+from tests.fakes import FakeInferenceBackend, FakeMemoryBackend, FakeStimuliQueue, FlakyWriter
+
+
+def fake_agent_factory(instance_id: str) -> Agent:
+    return Agent(instance_id=instance_id,
+                 inference_backend=FakeInferenceBackend(),
+                 stimuli_queue=FakeStimuliQueue(),
+                 core_memory_backend=FakeMemoryBackend,
+                 archival_memory_backend=FakeMemoryBackend,
+                 recall_memory_backend=FakeMemoryBackend,
+                 heartrate=3600,
+                 autostart=False)
+
+
+async def until(condition, timeout: float = 2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise TimeoutError
+
+
+class TestAgentHost:
+
+    def test_hosts_many_agents_and_reports_stats(self):
+
+        async def host_agents():
+            host = AgentHost(agent_factory=fake_agent_factory, max_workers=4)
+            for i in range(50):
+                await host.submit(f"agent-{i}", Message(role=Role.user, content=f"hi {i}"))
+            stats = host.stats()
+            await until(lambda: all(s.turns == 1 for s in stats.values()))
+            await host.shutdown()
+            return stats
+
+        stats = asyncio.run(host_agents())
+        assert len(stats) == 50
+        assert all(s.queue_depth == 0 and s.mean_turn_latency is not None for s in stats.values())
+
+    def test_evicts_idle_agents_and_restores_them(self):
+
+        async def evict_and_restore():
+            host = AgentHost(agent_factory=fake_agent_factory, idle_timeout=0)
+            await host.submit("sleepy", Message(role=Role.user, content="remember me"))
+            await until(lambda: host.stats()["sleepy"].turns == 1)
+            assert await host.evict_idle() == ["sleepy"]
+            assert "sleepy" not in host.agents
+            restored = await host.load("sleepy")
+            await host.shutdown()
+            return restored
+
+        restored = asyncio.run(evict_and_restore())
+        assert restored.core_memory.history[0].content == "remember me"
+
+    def test_keeps_agents_whose_queue_cant_be_counted(self):
+
+        class UncountedQueue(FakeStimuliQueue):
+            depth = None
+
+        def uncounted_agent_factory(instance_id: str) -> Agent:
+            agent = fake_agent_factory(instance_id)
+            agent.stimuli_queue = UncountedQueue()
+            return agent
+
+        async def evict_uncounted():
+            host = AgentHost(agent_factory=uncounted_agent_factory, idle_timeout=0)
+            await host.submit("uncounted", Message(role=Role.user, content="still here?"))
+            await until(lambda: host.stats()["uncounted"].turns == 1)
+            evicted = await host.evict_idle()
+            await host.shutdown()
+            return evicted
+
+        assert asyncio.run(evict_uncounted()) == []
+
+    def test_evicting_an_agent_as_it_is_stimulated(self):
+
+        async def submit_and_evict():
+            host = AgentHost(agent_factory=fake_agent_factory)
+            await host.load("racing")
+            await host.submit("racing", Message(role=Role.user, content="wait for me"))
+            # one pass later the agent has woken, but its supervisor hasn't run yet: the eviction stops it right then
+            await asyncio.sleep(0)
+            await host.evict("racing")
+            restored = await host.load("racing")
+            await host.shutdown()
+            return restored
+
+        assert asyncio.run(asyncio.wait_for(submit_and_evict(), 2)).instance_id == "racing"
+
+    def test_keeps_agents_stimulated_during_a_sweep(self):
+
+        async def submit_during_sweep():
+            host = AgentHost(agent_factory=fake_agent_factory, idle_timeout=0)
+            for instance_id in ("first", "second"):
+                await host.load(instance_id)
+            persisting, submitted = threading.Event(), threading.Event()
+            persist = host._persist
+
+            def slow_persist(agent: Agent) -> None:
+                persisting.set()
+                submitted.wait(2)
+                persist(agent)
+
+            host._persist = slow_persist
+            sweep = asyncio.create_task(host.evict_idle())
+            await until(persisting.is_set)
+            # "second" was idle when the sweep started, but not by the time it's reached
+            await host.submit("second", Message(role=Role.user, content="still here"))
+            submitted.set()
+            evicted = await asyncio.wait_for(sweep, 2)
+            kept = list(host.agents)
+            await host.shutdown()
+            return evicted, kept
+
+        assert asyncio.run(submit_during_sweep()) == (["first"], ["second"])
+
+    def test_keeps_agents_whose_writes_fail_to_persist(self):
+
+        async def evict_while_the_database_is_down():
+            host = AgentHost(agent_factory=fake_agent_factory)
+            agent = await host.load("unlucky")
+            agent.recall_memory.buffer_writes(max_items=100, max_delay=60)
+            agent.recall_memory.write_buffer.write = writer = FlakyWriter(failures=1)
+            agent.recall_memory.write([Message(role=Role.user, content="don't lose me")])
+            with pytest.raises(ConnectionError):
+                await host.evict("unlucky")
+            kept = host.agents.get("unlucky")
+            # still supervised, and evicted once the database is back
+            await host.submit("unlucky", Message(role=Role.user, content="hi again"))
+            await until(lambda: host.stats()["unlucky"].turns == 1)
+            await host.shutdown()
+            return kept, writer.batches
+
+        kept, written = asyncio.run(evict_while_the_database_is_down())
+        assert kept is not None and [message.content for message in written[0]] == ["don't lose me"]
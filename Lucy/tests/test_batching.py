@@ -0,0 +1,54 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from lucy.backends.batching import MicroBatchDispatcher
+from lucy.schema import Turn, Message, Role
+from tests.fakes import FakeInferenceBackend
+
+
+def turn(content: str) -> Turn:
+    return Turn(request_messages=[Message(role=Role.user, content=content)], request_tools=[])
+
+
+class TestMicroBatchDispatcher:
+
+    def test_routes_each_turn_back_to_its_agent(self):
+        dispatcher = MicroBatchDispatcher(FakeInferenceBackend(), window=0.05, max_batch_size=8)
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            completed = list(executor.map(lambda i: dispatcher.generate(turn(f"agent {i}")), range(20)))
+        dispatcher.close()
+        assert [t.request_messages[0].content for t in completed] == [f"agent {i}" for i in range(20)]
+        assert all(t.response_message.content == "ok" for t in completed)
+        assert dispatcher.batches < 20
+
+    def test_partial_batch_is_sent_when_the_window_closes(self):
+        backend = FakeInferenceBackend()
+        dispatcher = MicroBatchDispatcher(backend, window=0.01, max_batch_size=100)
+
+        async def lonely_agent():
+            return await dispatcher.agenerate(turn("anyone there?"))
+
+        assert asyncio.run(lonely_agent()).response_message.content == "ok"
+        dispatcher.close()
+        assert backend.requests == 1
+
+    def test_turns_a_backend_drops_fail_rather_than_hang(self):
+        class DroppingBackend(FakeInferenceBackend):
+            async def agenerate_many(self, turns):
+                return (await super().agenerate_many(turns))[:-1]
+
+        dispatcher = MicroBatchDispatcher(DroppingBackend(), window=0.05, max_batch_size=2)
+        first, second = dispatcher.submit(turn("first")), dispatcher.submit(turn("second"))
+        assert first.result(timeout=5).response_message.content == "ok"
+        with pytest.raises(RuntimeError):
+            second.result(timeout=5)
+        dispatcher.close()
+
+    def test_stands_in_for_the_backend(self):
+        backend = FakeInferenceBackend()
+        dispatcher = MicroBatchDispatcher(backend)
+        assert dispatcher.core_memory_maximum_tool_count == backend.core_memory_maximum_tool_count
+        assert dispatcher.prompt_engine_args == backend.prompt_engine_args
+        dispatcher.close()
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import time
+
+from lucy.agent.tool_engine import ToolEngine
+from lucy.backends.cache import LRUCache, SQLiteCache, TieredCache, cache_key
+from lucy.backends.inference_cache import CachingInferenceBackend
+from lucy.schema import Message, Role, ToolCall, ToolCallFunction, Turn
+from tests.fakes import FakeInferenceBackend
+
+sleepy_tools = os.path.join(os.path.dirname(__file__), "tools", "sleepy_tools.py")
+
+
+class DeterministicBackend(FakeInferenceBackend):
+    temperature = 0
+
+    def _complete(self, turn: Turn) -> Turn:
+        turn = super()._complete(turn)
+        turn.response_message.tool_calls = [ToolCall(id="call_1", function=ToolCallFunction(name="sleep", arguments={"seconds": 0}))]
+        return turn
+
+
+def turn(content: str = "hello") -> Turn:
+    return Turn(request_messages=[Message(role=Role.system, content="boot"), Message(role=Role.user, content=content)], request_tools=[])
+
+
+class TestCaches:
+
+    def test_lru_evicts_least_recently_used(self):
+        cache = LRUCache(max_items=2, max_chars=10)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+        assert cache.get("b") is None and cache.get("a") == "1"
+        # over max_chars, so everything older goes
+        cache.set("d", "x" * 10)
+        assert len(cache) == 1 and cache.chars == 10
+        assert cache.stats.evictions == 3
+        assert cache.stats.hits == 2 and cache.stats.hit_rate == 2 / 3
+
+    def test_entries_expire(self, tmp_path):
+        for cache in (LRUCache(), SQLiteCache(str(tmp_path / "cache.sqlite"))):
+            cache.set("a", "1", ttl=0.05)
+            cache.set("b", "2")
+            assert cache.get("a") == "1"
+            time.sleep(0.06)
+            assert cache.get("a") is None and cache.get("b") == "2"
+            assert cache.stats.expirations == 1
+
+    def test_sqlite_is_shared_and_pruned(self, tmp_path):
+        path = str(tmp_path / "shared" / "cache.sqlite")
+        writer, reader = SQLiteCache(path, max_items=3, prune_every=1), SQLiteCache(path)
+        for key in "abcd":
+            writer.set(key, key.upper())
+        assert len(reader) == 3
+        assert reader.get("a") is None and reader.get("d") == "D"
+        assert writer.stats.evictions == 1
+
+    def test_tiers_promote_hits(self, tmp_path):
+        memory, disk = LRUCache(), SQLiteCache(str(tmp_path / "cache.sqlite"))
+        disk.set("a", "1", ttl=60)
+        cache = TieredCache(memory, disk)
+        assert cache.get("a") == "1"
+        assert memory._get("a")[1] == disk._get("a")[1]
+        assert cache.get("a") == "1"
+        assert (memory.stats.hits, disk.stats.hits, cache.stats.hits) == (1, 1, 2)
+
+    def test_keys_ignore_argument_order(self):
+        assert cache_key("tool", "f", {"a": 1, "b": 2}) == cache_key("tool", "f", {"b": 2, "a": 1})
+        assert cache_key("tool", "f", {"a": 1}) != cache_key("tool", "g", {"a": 1})
+
+
+class TestToolCaching:
+
+    def call(self, name: str, **arguments) -> ToolCall:
+        return ToolCall(id=f"call-{time.perf_counter_ns()}", function=ToolCallFunction(name=name, arguments=arguments))
+
+    def test_cacheable_tools_are_answered_from_the_cache(self):
+        engine = ToolEngine(sleepy_tools, cache=LRUCache())
+        first, other = engine.execute_many([self.call("lookup", key="a", seconds=0.1), self.call("lookup", key="b")])
+        started = time.perf_counter()
+        again = engine.execute(self.call("lookup", seconds=0.1, key="a"))
+        assert time.perf_counter() - started < 0.05
+        assert again.content == first.content != other.content
+        assert engine.stats["lookup"].cache_hits == 1 and engine.stats["lookup"].calls == 3
+        engine.close()
+
+    def test_results_are_kept_apart_by_the_tools_they_came_from(self, tmp_path):
+        cache, engines = LRUCache(), []
+        for name in ("a", "b"):
+            (tmp_path / f"{name}.py").write_text(f"from lucy.agent.tool_engine import cacheable\n\n\n@cacheable()\ndef lookup():\n    return 'from tools {name}'\n")
+            engines.append(ToolEngine(str(tmp_path / f"{name}.py"), cache=cache))
+        assert [engine.execute(self.call("lookup")).content for engine in engines] == ["from tools a", "from tools b"]
+
+        # an edited tool doesn't answer with what it used to
+        edited, engine = tmp_path / "a.py", engines[0]
+        edited.write_text(edited.read_text().replace("from tools a", "edited"))
+        os.utime(edited, ns=(time.time_ns(), time.time_ns() + 10**9))
+        engine.registry.check_interval = 0
+        engine.registry.refresh()
+        assert engine.execute(self.call("lookup")).content == "edited"
+        for engine in engines:
+            engine.close()
+
+    def test_other_tools_always_run(self):
+        engine = ToolEngine(sleepy_tools, cache=LRUCache())
+        engine.execute_many([self.call("sleep", seconds=0), self.call("sleep", seconds=0)])
+        assert engine.cache.stats.stores == 0 and engine.stats["sleep"].cache_hits == 0
+        engine.close()
+
+
+class TestCachingInferenceBackend:
+
+    def test_deterministic_turns_are_generated_once(self):
+        backend = CachingInferenceBackend(DeterministicBackend(), LRUCache())
+        first = backend.generate(turn()).response_message
+        second = backend.generate(turn()).response_message
+        assert backend.backend.requests == 1
+        assert second.content == first.content
+        # tool call ids stay unique within the conversation
+        assert second.tool_calls[0].id != first.tool_calls[0].id
+        assert backend.cache.stats.hit_rate == 0.5
+
+    def test_only_misses_are_batched(self):
+        backend = CachingInferenceBackend(DeterministicBackend(), LRUCache())
+        backend.generate(turn("a"))
+        turns = asyncio.run(backend.agenerate_many([turn("a"), turn("b"), turn("c")]))
+        assert all(t.response_message for t in turns)
+        assert backend.backend.requests == 2
+        assert backend.cache.stats.hits == 1
+
+    def test_sampled_turns_are_not_cached(self):
+        backend = CachingInferenceBackend(FakeInferenceBackend(), LRUCache())
+        backend.generate(turn())
+        backend.generate(turn())
+        assert backend.backend.requests == 2 and backend.cache.stats.stores == 0
+
+    def test_forwards_the_wrapped_backend(self):
+        wrapped = DeterministicBackend(latency=0.01)
+        backend = CachingInferenceBackend(wrapped, LRUCache())
+        assert backend.prompt_engine_args == wrapped.prompt_engine_args
+        assert backend.core_memory_maximum_tool_count == wrapped.core_memory_maximum_tool_count
+        assert backend.latency == 0.01
@@ -0,0 +1,54 @@
+from lucy.agent.context import ContextAssembler
+from lucy.backends.tokenizers import LucyTokenizerBase
+from lucy.schema import LucyMemoryCore, Message, Role
+from tests.fakes import FakeInferenceBackend
+
+
+class WordTokenizer(LucyTokenizerBase):
+    name = "words"
+    message_overhead = 0
+
+    def __init__(self):
+        self.counted = 0
+
+    def count(self, text: str) -> int:
+        self.counted += 1
+        return len(text.split())
+
+
+class WordCountingBackend(FakeInferenceBackend):
+    response_reserved_tokens = 10
+    core_memory_maximum_number_of_messages_in_history = 100
+    tokenizer = None
+
+    def __init__(self, context_window_tokens: int):
+        super().__init__()
+        self.context_window_tokens = context_window_tokens
+        self.tokenizer = WordTokenizer()
+
+
+class TestContextAssembler:
+
+    def core(self) -> LucyMemoryCore:
+        return LucyMemoryCore(boot="boot", bios="bios", persona="persona", human="human",
+                              history=[Message(role=Role.user, content=f"message number {i}") for i in range(10)])
+
+    def test_packs_history_into_the_token_budget(self):
+        # 4 tokens of system message + 10 reserved for the response leaves room for 2 three word messages
+        assembler = ContextAssembler(WordCountingBackend(context_window_tokens=20))
+        core = self.core()
+        turn, evicted = assembler.assemble(core)
+        assert [m.content for m in evicted] == [f"message number {i}" for i in range(8)]
+        assert [m.content for m in turn.request_messages[1:]] == ["message number 8", "message number 9"]
+        assert turn.request_messages[0].role == Role.system
+
+    def test_token_counts_are_memoized(self):
+        backend = WordCountingBackend(context_window_tokens=1000)
+        assembler = ContextAssembler(backend)
+        core = self.core()
+        assembler.assemble(core)
+        counted = backend.tokenizer.counted
+        core.fifo_history(Message(role=Role.user, content="one more"))
+        assembler.assemble(core)
+        assert backend.tokenizer.counted == counted + 1
+        assert core.history.tokens == 10 * 3 + 2
@@ -0,0 +1,143 @@
+import time
+
+import pytest
+
+from lucy.backends.core_cache import CoreMemoryCache
+from lucy.schema import CoreMemoryChanges, LucyMemoryCore, MemoryType, Message, Role
+from tests.fakes import FakeMemoryBackend
+
+
+def message(content: str) -> Message:
+    return Message(role=Role.user, content=content)
+
+
+def core(*contents: str) -> LucyMemoryCore:
+    return LucyMemoryCore(boot="boot", bios="bios", persona="persona", human="human",
+                          history=[message(content) for content in contents])
+
+
+def contents(messages) -> list[str]:
+    return [message.content for message in messages]
+
+
+class RecordingMemoryBackend(FakeMemoryBackend):
+    """persists changes by applying them to a plain list, and records each set of changes."""
+    changes: dict = {}
+    failing: set = set()
+
+    def persist_core_changes(self, core: LucyMemoryCore, changes: CoreMemoryChanges) -> None:
+        if self.instance_id in self.failing:
+            raise ConnectionError("database unavailable")
+        self.changes.setdefault(self.instance_id, []).append(changes)
+        persisted = self.cores.get(self.instance_id, {"history": []})
+        history = contents(changes.history) if changes.history is not None else persisted["history"][changes.dropped:] + contents(changes.appended)
+        self.cores[self.instance_id] = {**persisted, **changes.segments, "history": history}
+
+
+@pytest.fixture(autouse=True)
+def reset_backend():
+    RecordingMemoryBackend.cores, RecordingMemoryBackend.changes, RecordingMemoryBackend.failing = {}, {}, set()
+
+
+class TestCoreMemoryChanges:
+
+    def test_a_new_core_changes_as_a_whole(self):
+        changes = core("a", "b").take_changes()
+        assert set(changes.segments) == {"boot", "bios", "persona", "human", "summary"}
+        assert contents(changes.history) == ["a", "b"]
+        assert core("a").take_changes().length == 1
+
+    def test_takes_only_what_changed_since_persisted(self):
+        memory = core("a", "b", "c")
+        memory.mark_persisted()
+        memory.human = "a new human"
+        memory.fifo_history(message("d"), max_length=3)
+        changes = memory.take_changes()
+        assert changes.segments == {"human": "a new human"}
+        assert changes.dropped == 1 and contents(changes.appended) == ["d"] and changes.history is None
+        assert memory.take_changes().empty
+
+    def test_messages_dropped_before_they_were_persisted_are_not_counted(self):
+        memory = core("a")
+        memory.mark_persisted()
+        for content in "bcde":
+            memory.fifo_history(message(content), max_length=2)
+        changes = memory.take_changes()
+        assert changes.dropped == 1
+        assert contents(changes.appended) == ["d", "e"]
+
+    def test_merged_changes_match_applying_them_in_turn(self):
+        memory = core("a", "b", "c")
+        memory.mark_persisted()
+        persisted, merged = ["a", "b", "c"], None
+        for content in "defgh":
+            memory.fifo_history(message(content), max_length=3)
+            changes = memory.take_changes()
+            merged = changes if merged is None else merged.merge(changes)
+        persisted = persisted[merged.dropped:] + contents(merged.appended)
+        assert persisted == contents(memory.history) == ["f", "g", "h"]
+
+
+class TestCoreMemoryCache:
+
+    def test_persists_only_deltas(self):
+        cache = CoreMemoryCache()
+        backend = RecordingMemoryBackend("instance", MemoryType.core)
+        memory = core("a", "b")
+        cache.track(backend, memory)
+        cache.save("instance")
+        memory.fifo_history(message("c"), max_length=2)
+        cache.save("instance")
+        cache.save("instance")
+        first, second = backend.changes["instance"]
+        assert first.history is not None
+        assert second.segments == {} and second.dropped == 1 and contents(second.appended) == ["c"]
+        assert backend.cores["instance"]["history"] == ["b", "c"]
+
+    def test_loads_once_and_shares_the_live_core(self):
+        cache = CoreMemoryCache()
+        FakeMemoryBackend.cores["shared"] = core("a")
+        first = cache.load(FakeMemoryBackend("shared", MemoryType.core))
+        del FakeMemoryBackend.cores["shared"]
+        assert cache.load(FakeMemoryBackend("shared", MemoryType.core)) is first
+        assert cache.load(FakeMemoryBackend("never-persisted", MemoryType.core)) is None
+
+    def test_batches_turns_and_merges_them_per_instance(self):
+        cache = CoreMemoryCache(flush_interval=60)
+        backend = RecordingMemoryBackend("batched", MemoryType.core)
+        memory = core("a")
+        cache.track(backend, memory)
+        for content in "bcd":
+            memory.fifo_history(message(content), max_length=2)
+            cache.save("batched")
+        assert not backend.changes
+        cache.flush()
+        assert len(backend.changes["batched"]) == 1
+        assert backend.cores["batched"]["history"] == ["c", "d"]
+
+    def test_retries_only_the_instances_that_failed(self):
+        cache = CoreMemoryCache(flush_interval=60)
+        memories = {instance_id: core("a") for instance_id in ("up", "down")}
+        for instance_id, memory in memories.items():
+            cache.track(RecordingMemoryBackend(instance_id, MemoryType.core), memory)
+        RecordingMemoryBackend.failing.add("down")
+        for instance_id, memory in memories.items():
+            memory.fifo_history(message("b"))
+            cache.save(instance_id)
+        cache.flush()
+        assert len(cache.buffer) == 1 and cache.persisted == 1
+        RecordingMemoryBackend.failing.clear()
+        cache.flush()
+        assert RecordingMemoryBackend.cores["up"]["history"] == RecordingMemoryBackend.cores["down"]["history"] == ["a", "b"]
+        assert len(RecordingMemoryBackend.changes["up"]) == 1
+
+    def test_flushes_on_its_own_after_the_interval(self):
+        cache = CoreMemoryCache(flush_interval=0.05)
+        backend = RecordingMemoryBackend("timed", MemoryType.core)
+        cache.track(backend, core("a"))
+        cache.save("timed")
+        for _ in range(100):
+            if backend.changes:
+                break
+            time.sleep(0.01)
+        assert backend.cores["timed"]["history"] == ["a"]
@@ -0,0 +1,80 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from lucy.backends.embedders import HashingEmbeddingBackend
+from lucy.schema import Document, MemoryType
+from tests.fakes import FakeMemoryBackend
+
+
+class CountingEmbeddingBackend(HashingEmbeddingBackend):
+    def __init__(self, batch_size: int = 64):
+        super().__init__(dimensions=32)
+        self.batch_size = batch_size
+        self.batches = []
+
+    def embed_batch(self, texts: list[str]) -> np.ndarray:
+        self.batches.append(list(texts))
+        return super().embed_batch(texts)
+
+
+class TestEmbeddingBackend:
+
+    def test_hashing_embeddings_are_deterministic_and_normalized(self):
+        embedder = HashingEmbeddingBackend(dimensions=64)
+        vector = embedder.embed("extra pickles, right?")
+        assert np.array_equal(vector, HashingEmbeddingBackend(dimensions=64).embed("extra pickles, right?"))
+        assert vector.shape == (64,) and vector.dtype == np.float32
+        assert np.isclose(np.linalg.norm(vector), 1.0)
+
+    def test_similar_texts_are_closer(self):
+        embedder = HashingEmbeddingBackend()
+        pickles, more_pickles, weather = embedder.embed_many(["extra pickles on rye", "extra pickles please", "rain on tuesday"])
+        assert pickles @ more_pickles > pickles @ weather
+
+    def test_texts_are_embedded_in_batches_once(self):
+        embedder = CountingEmbeddingBackend(batch_size=2)
+        first = embedder.embed_many(["a", "b", "a", "c"])
+        assert embedder.batches == [["a", "b"], ["c"]]
+        assert first[0] is first[2]
+        assert all(a is b for a, b in zip(embedder.embed_many(["c", "b"]), [first[3], first[1]]))
+        assert asyncio.run(embedder.aembed_many(["a"]))[0] is first[0]
+        assert len(embedder.batches) == 2
+
+    def test_cached_vectors_are_read_only(self):
+        embedder = HashingEmbeddingBackend(dimensions=8)
+        vector = embedder.embed("extra pickles")
+        with pytest.raises(ValueError):
+            vector *= 2
+        assert np.isclose(np.linalg.norm(embedder.embed("extra pickles")), 1.0)
+
+    def test_archival_writes_are_embedded(self):
+        embedder = CountingEmbeddingBackend()
+        backend = FakeMemoryBackend("s_embedded", MemoryType.archival)
+        backend.embedding_backend = embedder
+        given = np.zeros(32, dtype=np.float32)
+        backend.write([Document(content="extra pickles"), Document(content="rye", embeddings=given)])
+        pickles, rye = backend.archival["s_embedded"]
+        assert np.array_equal(pickles.embeddings, embedder.embed("extra pickles"))
+        assert rye.embeddings is given
+        assert embedder.batches == [["extra pickles"]]
+
+
+class TestDocumentEmbeddings:
+
+    def test_embeddings_are_held_as_float32(self):
+        document = Document(content="extra pickles", embeddings=[0.25, 0.5, 1.0])
+        assert document.embeddings.dtype == np.float32
+        vector = np.ones(3, dtype=np.float32)
+        assert Document(content="rye", embeddings=vector).embeddings is vector
+
+    def test_embeddings_round_trip_through_json_as_base64(self):
+        document = Document(content="extra pickles", embeddings=np.arange(4, dtype=np.float32))
+        dumped = document.model_dump_json()
+        assert '"embeddings":"' in dumped
+        assert Document.model_validate_json(dumped) == document
+
+    def test_embeddings_load_from_raw_bytes(self):
+        vector = np.arange(4, dtype=np.float32)
+        assert np.array_equal(Document(content="x", embeddings=vector.tobytes()).embeddings, vector)
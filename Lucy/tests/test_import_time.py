@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+# generous, so only a regression (ie a backend or settings imported at module level again) fails on a slow machine
+IMPORT_BUDGET_SECONDS = 2.0
+# what the web and worker processes must never pay for just by importing Lucy
+HEAVY_MODULES = ("lucy_postgres_backend", "sqlalchemy", "psycopg", "pydantic_settings", "redis", "openai", "together")
+
+
+def import_times(statement: str) -> dict[str, int]:
+    """the cumulative microseconds `python -X importtime` reports for each module imported by statement, in a fresh interpreter."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            capture_output=True, text=True, cwd=root, check=True,
+                            env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")]))})
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, module = line.split("|")
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("statement, module", [
+    ("import lucy", "lucy"),
+    ("import lucy.agent.agent", "lucy.agent.agent"),
+    ("import lucy.agent.host", "lucy.agent.host"),
+])
+def test_import_is_light(statement, module):
+    times = import_times(statement)
+    assert not [name for name in times if name.split(".")[0] in HEAVY_MODULES]
+    assert times[module] / 1e6 < IMPORT_BUDGET_SECONDS
+
+
+def test_settings_are_read_on_first_use_without_importing_backends():
+    times = import_times("from lucy.settings import settings; settings.core_backend; settings.memory_backend_options")
+    assert "lucy.settings" in times
+    assert not [name for name in times if name.split(".")[0] in HEAVY_MODULES and name.split(".")[0] != "pydantic_settings"]
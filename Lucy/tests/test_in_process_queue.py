@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from lucy.schema import Message, Role
+from lucy.stimuli.exceptions import StimuliQueueFull
+from lucy.stimuli.in_process_queue import InProcessStimuliQueue
+
+
+def message(content: str) -> Message:
+    return Message(role=Role.system, content=content)
+
+
+class TestInProcessStimuliQueue:
+
+    def test_priority_lane_first_then_in_order(self):
+        stimuli = InProcessStimuliQueue()
+        for content, priority in (("first", False), ("urgent", True), ("second", False), ("also urgent", True)):
+            stimuli.enque(message(content), priority=priority)
+        assert [m.content for m in stimuli.deque_many(10)] == ["urgent", "also urgent", "first", "second"]
+        assert stimuli.deque() is None and stimuli.depth == 0
+
+    def test_coalesces_waiting_stimuli_by_key(self):
+        stimuli = InProcessStimuliQueue()
+        stimuli.enque(message("resize human to 100"), coalesce_key="resize:human")
+        stimuli.enque(message("unrelated"))
+        stimuli.enque(message("resize human to 90"), coalesce_key="resize:human")
+        stimuli.enque(message("resize persona"), coalesce_key="resize:persona")
+        assert stimuli.depth == 3 and stimuli.coalesced == 1
+        assert [m.content for m in stimuli.deque_many(10)] == ["resize human to 90", "unrelated", "resize persona"]
+        # once taken, the next one with the key is a new stimuli
+        stimuli.enque(message("resize human again"), coalesce_key="resize:human")
+        assert stimuli.depth == 1
+
+    def test_coalescing_into_the_priority_lane_moves_the_stimuli_up(self):
+        stimuli = InProcessStimuliQueue()
+        stimuli.enque(message("normal"), priority=False)
+        stimuli.enque(message("later"), priority=False, coalesce_key="key")
+        stimuli.enque(message("now"), priority=True, coalesce_key="key")
+        assert stimuli.depth == 2
+        assert [m.content for m in stimuli.deque_many(10)] == ["now", "normal"]
+
+    def test_refuses_normal_stimuli_when_full_but_not_priority(self):
+        stimuli = InProcessStimuliQueue(max_depth=2)
+        stimuli.enque(message("1"), priority=False)
+        stimuli.enque(message("2"), priority=False)
+        with pytest.raises(StimuliQueueFull):
+            stimuli.enque(message("3"), priority=False)
+        stimuli.enque(message("tool response"), priority=True)
+        assert stimuli.depth == 3
+
+    def test_aenque_waits_for_room(self):
+        stimuli = InProcessStimuliQueue(max_depth=1)
+
+        async def produce_and_consume():
+            stimuli.enque(message("1"), priority=False)
+            producer = asyncio.create_task(stimuli.aenque(message("2"), priority=False))
+            await asyncio.sleep(0.01)
+            assert not producer.done()
+            await asyncio.to_thread(stimuli.deque)
+            await asyncio.wait_for(producer, 1)
+
+        asyncio.run(produce_and_consume())
+        assert stimuli.deque().content == "2"
+
+    def test_wakes_asyncio_waiters(self):
+        stimuli = InProcessStimuliQueue()
+
+        async def wait_and_enque():
+            waiting = asyncio.create_task(stimuli.wait(5))
+            await asyncio.sleep(0.01)
+            await asyncio.to_thread(stimuli.enque, message("hi"))
+            return await asyncio.wait_for(waiting, 1)
+
+        assert asyncio.run(wait_and_enque()) is True
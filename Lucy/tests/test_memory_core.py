@@ -0,0 +1,46 @@
+from lucy.schema import LucyMemoryCore, Message, MessageHistory, Role
+
+
+def message(content: str) -> Message:
+    return Message(role=Role.user, content=content)
+
+
+def core(**kwargs) -> LucyMemoryCore:
+    return LucyMemoryCore(boot="boot", bios="bios", persona="persona", human="human", history=[], **kwargs)
+
+
+class TestLucyMemoryCore:
+
+    def test_fifo_history_evicts_by_count(self):
+        memory = core()
+        evicted = [memory.fifo_history(message(str(i)), max_length=3) for i in range(5)]
+        assert [m.content for batch in evicted for m in batch] == ["0", "1"]
+        assert [m.content for m in memory.history] == ["2", "3", "4"]
+
+    def test_fifo_history_evicts_by_total_chars(self):
+        memory = core()
+        budget = memory.total_chars + 25
+        for _ in range(3):
+            memory.fifo_history(message("x" * 10), max_length=100, max_total_chars=budget)
+        assert len(memory.history) == 2
+        assert memory.total_chars <= budget
+        # the newest message stays even when it alone is over budget
+        assert [m.content for m in memory.fifo_history(message("y" * 100), max_total_chars=budget)] == ["x" * 10] * 2
+        assert memory.history[0].content == "y" * 100
+
+    def test_sizes_are_cached_and_kept_current(self):
+        memory = core()
+        memory.fifo_history(message("hello"))
+        assert memory.history.chars == 5
+        memory.persona = "a much longer persona"
+        assert memory.chars_in("persona") == len("a much longer persona")
+        assert memory.total_chars == len("boot" + "bios" + "a much longer persona" + "human" + "hello")
+
+    def test_history_round_trips_as_a_list(self):
+        memory = core()
+        memory.fifo_history(message("hello"))
+        dumped = memory.model_dump(mode="json")
+        assert [m["content"] for m in dumped["history"]] == ["hello"]
+        restored = LucyMemoryCore.model_validate(dumped)
+        assert isinstance(restored.history, MessageHistory)
+        assert restored.history == memory.history and restored.history.chars == 5
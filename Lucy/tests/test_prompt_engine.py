@@ -0,0 +1,39 @@
+from lucy.agent.context import ContextAssembler
+from lucy.agent.prompt_engine import PromptEngine
+from lucy.schema import LucyMemoryCore, Message, Role
+from tests.fakes import FakeInferenceBackend
+
+
+class TestPromptEngine:
+
+    def test_templates_are_compiled_once_per_package(self):
+        args = FakeInferenceBackend().prompt_engine_args
+        first, second = PromptEngine(*args), PromptEngine(*args)
+        assert first.compiled is second.compiled
+        # a different cache size isn't silently ignored
+        smaller = PromptEngine(*args, render_cache_size=8)
+        assert smaller.compiled is not first.compiled and smaller.compiled.cached_render.cache_info().maxsize == 8
+        assert {"boot", "bios", "human", "persona", "core_memory_resize"} <= set(first.compiled.templates)
+
+    def test_renders_are_memoized(self):
+        engine = PromptEngine(*FakeInferenceBackend().prompt_engine_args)
+        rendered = engine.render("core_memory_resize", segment="human", max_chars=10)
+        hits = engine.compiled.cached_render.cache_info().hits
+        assert engine.render("core_memory_resize", max_chars=10, segment="human") == rendered
+        assert engine.compiled.cached_render.cache_info().hits == hits + 1
+        assert "human" in rendered and "10" in rendered
+
+
+class TestPromptPrefix:
+
+    def test_prefix_is_stable_while_history_and_human_change(self):
+        assembler = ContextAssembler(FakeInferenceBackend())
+        core = LucyMemoryCore(boot="boot", bios="bios", persona="persona", human="human", history=[])
+        first, _ = assembler.assemble(core)
+        core.fifo_history(Message(role=Role.user, content="hello"))
+        core.human = "Dave, who likes pickles"
+        second, _ = assembler.assemble(core)
+        assert first.prefix_key == second.prefix_key
+        assert second.request_messages[0].content.startswith(assembler.prefix(core)[0])
+        core.persona = "grumpy"
+        assert assembler.assemble(core)[0].prefix_key != first.prefix_key
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+
+from lucy.schema import Message, Role
+from lucy.stimuli.redis_queue import RedisStimuliQueue
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def message(content: str) -> Message:
+    return Message(role=Role.user, content=content)
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def queue(server, consumer: str = "node-1", **kwargs) -> RedisStimuliQueue:
+    return RedisStimuliQueue("s_agent",
+                             client=fakeredis.FakeRedis(server=server),
+                             async_client=fakeredis.FakeAsyncRedis(server=server),
+                             consumer=consumer,
+                             **kwargs)
+
+
+class TestRedisStimuliQueue:
+
+    def test_priority_lane_first_then_in_order(self, server):
+        stimuli = queue(server)
+        stimuli.enque(message("first"), priority=False)
+        stimuli.enque(message("second"), priority=False)
+        stimuli.enque(message("urgent"), priority=True)
+        assert [stimuli.deque().content for _ in range(3)] == ["urgent", "first", "second"]
+        assert stimuli.deque() is None
+
+    def test_batch_dequeue_and_ack_empties_the_streams(self, server):
+        stimuli = queue(server, batch_size=4)
+        for i in range(10):
+            stimuli.enque(message(str(i)), priority=False)
+        taken = stimuli.deque_many(6)
+        assert [m.content for m in taken] == [str(i) for i in range(6)]
+        assert stimuli.depth == 10
+        stimuli.ack(taken)
+        assert stimuli.depth == 4
+
+    def test_unacknowledged_stimuli_are_redelivered_to_another_consumer(self, server):
+        crashed = queue(server, consumer="node-1")
+        crashed.enque(message("hello"))
+        assert crashed.deque().content == "hello"
+        survivor = queue(server, consumer="node-2", claim_idle=0.05)
+        assert survivor.deque() is None
+        time.sleep(0.1)
+        redelivered = survivor.deque()
+        assert redelivered.content == "hello"
+        survivor.ack([redelivered])
+        assert survivor.depth == 0
+
+    def test_wait_wakes_on_stimuli_from_another_node(self, server):
+        stimuli, sender = queue(server), queue(server, consumer="node-2")
+
+        async def wait_for_stimuli():
+            waiting = asyncio.create_task(stimuli.wait(5))
+            await asyncio.sleep(0.05)
+            started = time.perf_counter()
+            sender.enque(message("hi"))
+            woken = await waiting
+            return woken, time.perf_counter() - started
+
+        woken, latency = asyncio.run(wait_for_stimuli())
+        assert woken and latency < 1
+        assert stimuli.deque().content == "hi"
+
+    def test_wait_times_out(self, server):
+        assert asyncio.run(queue(server).wait(0.05)) is False
@@ -0,0 +1,42 @@
+from lucy import encoding
+from lucy.schema import LucyMemoryCore, Message, MessageHistory, Role, ToolCall, ToolCallFunction
+
+
+def calling() -> Message:
+    return Message(role=Role.assistant, content="",
+                   tool_calls=[ToolCall(id="call_1", function=ToolCallFunction(name="search", arguments={"query": "pickles"}))])
+
+
+class TestMessageSerialization:
+
+    def test_dumps_are_memoized_until_the_message_changes(self):
+        message = calling()
+        assert message.stored is message.stored
+        assert message.payload == {"role": "assistant", "content": "",
+                                   "tool_calls": [{"id": "call_1", "type": "function", "function": {"name": "search", "arguments": encoding.dumps({"query": "pickles"})}}]}
+        # the stored message keeps what the model isn't sent
+        assert message.stored["timestamp"] == message.timestamp and message.stored["tool_calls"][0]["function"]["arguments"] == {"query": "pickles"}
+        message.content = "searching"
+        assert message.stored["content"] == message.payload["content"] == "searching"
+
+    def test_copies_dump_their_own_content(self):
+        message = Message(role=Role.user, content="a")
+        message._receipt = ("stream", "1-0")
+        counted, _ = message.token_count(), message.stored
+        for copied in (message.model_copy(update={"content": "b"}), message.model_copy(update={"content": "b"}, deep=True)):
+            assert copied.stored["content"] == copied.payload["content"] == "b"
+            assert copied._receipt is None and copied._token_counts is not message._token_counts
+            assert copied.token_count() == counted
+        assert message.stored["content"] == "a" and message._receipt == ("stream", "1-0")
+
+    def test_round_trips_through_storage(self):
+        messages = [calling(), Message(role=Role.tool, content="[]", tool_call_id="call_1")]
+        stored = encoding.loads(encoding.dumps([message.stored for message in messages]))
+        assert Message.from_stored_many(stored) == messages
+        assert Message.from_stored(stored[1]).role == Role.tool
+
+    def test_core_memory_round_trips(self):
+        core = LucyMemoryCore(boot="boot", bios="bios", persona="persona", human="human", summary="earlier",
+                              history=MessageHistory([calling()]))
+        restored = LucyMemoryCore.from_stored(encoding.loads(encoding.dumps_bytes(core.stored)))
+        assert restored.summary == "earlier" and list(restored.history) == list(core.history)
@@ -0,0 +1,62 @@
+import pytest
+
+from lucy.settings import Settings, import_string
+from lucy.agent.agent import Agent
+from lucy.stimuli.in_process_queue import InProcessStimuliQueue
+from lucy.tracing import InMemoryExporter, tracer
+from tests.fakes import FakeInferenceBackend, FakeMemoryBackend
+
+
+def test_import_string():
+    assert import_string("tests.fakes.FakeMemoryBackend") is FakeMemoryBackend
+    assert import_string("tests.fakes:FakeMemoryBackend.factory") == FakeMemoryBackend.factory
+    with pytest.raises(ImportError):
+        import_string("tests.fakes.NoSuchBackend")
+    with pytest.raises(ImportError):
+        import_string("FakeMemoryBackend")
+
+
+def test_backends_resolve_from_the_environment(monkeypatch):
+    monkeypatch.setenv("LUCY_MEMORY_BACKEND", "tests.fakes.FakeMemoryBackend")
+    monkeypatch.setenv("LUCY_INFERENCE_BACKEND", "tests.fakes.FakeInferenceBackend")
+    monkeypatch.setenv("LUCY_INFERENCE_BACKEND_OPTIONS", '{"latency": 0.5}')
+    monkeypatch.setenv("LUCY_STIMULI_QUEUE_OPTIONS", '{"max_depth": 5}')
+    settings = Settings()
+
+    for name in ("core_backend", "archive_backend", "recall_backend"):
+        assert settings.resolve(name) is FakeMemoryBackend
+    backend = settings.resolve("inference_backend")
+    assert isinstance(backend, FakeInferenceBackend) and backend.latency == 0.5
+    # built once, then kept
+    assert settings.resolve("inference_backend") is backend
+    queue = settings.resolve("stimuli_queue")(instance_id="a")
+    assert isinstance(queue, InProcessStimuliQueue) and queue.max_depth == 5
+
+
+def test_agents_are_built_from_settings(monkeypatch):
+    settings = Settings(memory_backend=FakeMemoryBackend, inference_backend=FakeInferenceBackend())
+    monkeypatch.setattr("lucy.settings.get_settings", lambda: settings)
+    first, second = Agent(autostart=False), Agent(autostart=False)
+
+    assert first.inference_backend is second.inference_backend
+    # every agent gets its own queue
+    assert isinstance(first.stimuli_queue, InProcessStimuliQueue) and first.stimuli_queue is not second.stimuli_queue
+    assert isinstance(first.recall_memory, FakeMemoryBackend)
+
+
+def test_agents_need_an_inference_backend(monkeypatch):
+    monkeypatch.setattr("lucy.settings.get_settings", lambda: Settings(memory_backend=FakeMemoryBackend))
+    with pytest.raises(ValueError):
+        Agent(autostart=False)
+
+
+def test_agents_trace_to_the_configured_exporter(monkeypatch):
+    settings = Settings(memory_backend=FakeMemoryBackend, inference_backend=FakeInferenceBackend(), trace_exporter="lucy.tracing.InMemoryExporter")
+    monkeypatch.setattr("lucy.settings.get_settings", lambda: settings)
+    exporter = settings.resolve("trace_exporter")
+    try:
+        Agent(autostart=False)
+        Agent(autostart=False)
+        assert isinstance(exporter, InMemoryExporter) and tracer.exporters == (exporter,)
+    finally:
+        tracer.remove_exporter(exporter)
@@ -0,0 +1,113 @@
+import threading
+import time
+
+from lucy.agent.agent import Agent
+from lucy.agent.context import ContextAssembler
+from lucy.agent.summarizer import RecallSummarizer
+from lucy.schema import LucyMemoryCore, Message, Role, Turn
+from tests.fakes import FakeInferenceBackend, FakeMemoryBackend, FakeStimuliQueue
+
+
+class SummarizingBackend(FakeInferenceBackend):
+    """summarizes by listing what it was asked to summarize; blocks until released, so tests can pile up batches."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.release.set()
+        self.summarizing = threading.Event()
+        self.prompts = []
+
+    def generate(self, turn: Turn) -> Turn:
+        prompt = turn.request_messages[-1].content
+        if "Messages moved out of view" not in prompt:
+            return super().generate(turn)
+        self.summarizing.set()
+        self.release.wait(5)
+        self.prompts.append(prompt)
+        covered = [line.split(": ", 1)[1] for line in prompt.split("Messages moved out of view:\n")[1].splitlines()]
+        previous = prompt.split("Current summary:\n")[1].split("\n")[0]
+        turn.response_message = Message(role=Role.assistant, content=" ".join(([] if previous == "(none yet)" else [previous]) + covered))
+        return turn
+
+
+def core() -> LucyMemoryCore:
+    return LucyMemoryCore(boot="boot", bios="bios", persona="persona", human="human", history=[])
+
+
+def wait_for(summarizer: RecallSummarizer, summaries: int):
+    deadline = time.monotonic() + 5
+    while summarizer.summaries < summaries and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def messages(*contents):
+    return [Message(role=Role.user, content=content) for content in contents]
+
+
+class TestRecallSummarizer:
+
+    def test_folds_batches_into_a_rolling_summary(self):
+        summarizer = RecallSummarizer(SummarizingBackend())
+        memory = core()
+        summarizer.submit(memory, messages("a", "b"))
+        wait_for(summarizer, 1)
+        assert summarizer.apply(memory).content.endswith("a b")
+        assert memory.summary == "a b"
+        # the next batch is folded into the last summary
+        summarizer.submit(memory, messages("c"))
+        wait_for(summarizer, 2)
+        summarizer.apply(memory)
+        assert memory.summary == "a b c"
+        assert summarizer.apply(memory) is None
+
+    def test_batches_evicted_while_summarizing_are_folded_in_together(self):
+        backend = SummarizingBackend()
+        backend.release.clear()
+        summarizer = RecallSummarizer(backend)
+        memory = core()
+        summarizer.submit(memory, messages("a"))
+        assert backend.summarizing.wait(5)
+        summarizer.submit(memory, messages("b"))
+        summarizer.submit(memory, messages("c"))
+        backend.release.set()
+        wait_for(summarizer, 2)
+        summarizer.apply(memory)
+        assert memory.summary == "a b c"
+        assert summarizer.summaries == 2
+
+    def test_summary_is_capped(self):
+        summarizer = RecallSummarizer(SummarizingBackend(), max_chars=5)
+        memory = core()
+        summarizer.submit(memory, messages("a long message"))
+        wait_for(summarizer, 1)
+        summarizer.apply(memory)
+        assert memory.summary == "a lon"
+
+    def test_summary_goes_in_the_system_message(self):
+        memory = core()
+        assembler = ContextAssembler(FakeInferenceBackend())
+        assert "earlier conversation" not in assembler.system_message(memory).content
+        memory.summary = "we met"
+        assert assembler.system_message(memory).content.endswith("Summary of the earlier conversation:\nwe met")
+
+
+def test_agent_summarizes_evicted_history_off_its_turn():
+    backend = SummarizingBackend()
+    agent = Agent(instance_id="summarized",
+                  inference_backend=backend,
+                  stimuli_queue=FakeStimuliQueue(),
+                  core_memory_backend=FakeMemoryBackend,
+                  archival_memory_backend=FakeMemoryBackend,
+                  recall_memory_backend=FakeMemoryBackend,
+                  autostart=False)
+    for i in range(backend.core_memory_maximum_number_of_messages_in_history + 2):
+        agent.adust_recall_memory(Message(role=Role.user, content=f"message {i}"))
+    wait_for(agent.summarizer, 1)
+    agent.think()
+
+    assert agent.core_memory.summary.startswith("message 0")
+    recalled = [message.content for message in FakeMemoryBackend.recall["summarized"]]
+    # the raw messages still go to recall memory, then the summary
+    assert recalled[:2] == ["message 0", "message 1"]
+    assert any(content.startswith("Summary of the earlier conversation") for content in recalled)
@@ -0,0 +1,60 @@
+import os
+import time
+
+from lucy.agent.tool_engine import ToolEngine
+from lucy.schema import Role, ToolCall, ToolCallFunction
+
+sleepy_tools = os.path.join(os.path.dirname(__file__), "tools", "sleepy_tools.py")
+
+
+def call(name: str, **arguments) -> ToolCall:
+    return ToolCall(id=f"call-{name}-{len(arguments)}-{time.perf_counter_ns()}", function=ToolCallFunction(name=name, arguments=arguments))
+
+
+class TestToolEngine:
+
+    def test_discovers_user_tools_over_os_tools(self):
+        engine = ToolEngine(sleepy_tools)
+        assert {"sleep", "async_sleep", "impatient", "broken", "archive_content"} <= {tool.name for tool in engine.tools}
+        assert {tool.name for tool in engine.os_tools} == {"replace_content_in_segment", "replace_segment", "archive_content", "search_tools"}
+
+    def test_search_tools_is_described_by_the_method_that_runs_it(self):
+        engine = ToolEngine(sleepy_tools)
+        search, = [tool for tool in engine.os_tools if tool.name == "search_tools"]
+        assert engine.function("search_tools") == engine.search_tools
+        assert [(parameter.name, parameter.required) for parameter in search.parameters] == [("query", True), ("k", False)]
+
+    def test_runs_calls_concurrently_and_answers_in_order(self):
+        engine = ToolEngine(sleepy_tools)
+        calls = [call("sleep", seconds=0.2, answer="slow"),
+                 call("async_sleep", seconds=0.1, answer="async"),
+                 call("sleep", seconds=0.0, answer="fast")]
+        started = time.perf_counter()
+        responses = engine.execute_many(calls)
+        assert time.perf_counter() - started < 0.35
+        assert [response.content for response in responses] == ["slow", "async", "fast"]
+        assert [response.tool_call_id for response in responses] == [c.id for c in calls]
+        assert all(response.role == Role.tool for response in responses)
+        engine.close()
+
+    def test_timeouts_and_failures_are_answered_with_errors(self):
+        engine = ToolEngine(sleepy_tools, timeout=0.2)
+        timed_out, failed, missing, finished, slow = engine.execute_many([call("impatient", seconds=0.5),
+                                                                           call("broken"),
+                                                                           call("no_such_tool"),
+                                                                           call("impatient", seconds=0),
+                                                                           call("async_sleep", seconds=1)])
+        assert "timed out after 0.05" in timed_out.content
+        assert "broken on purpose" in failed.content
+        assert "no tool named no_such_tool" in missing.content
+        assert finished.content == '{"slept": 0}'
+        assert "timed out after 0.2" in slow.content
+        engine.close()
+
+    def test_tracks_latency_per_tool(self):
+        engine = ToolEngine(sleepy_tools)
+        engine.execute_many([call("sleep", seconds=0.05), call("sleep", seconds=0.01), call("broken")])
+        assert engine.stats["sleep"].calls == 2
+        assert 0.05 <= engine.stats["sleep"].max_latency < 0.2
+        assert engine.stats["broken"].failures == 1
+        engine.close()
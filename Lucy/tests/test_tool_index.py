@@ -0,0 +1,39 @@
+from lucy.agent.tool_engine import ToolEngine, ToolIndex
+from lucy.schema import ToolCall, ToolCallFunction
+
+subjects = ["weather forecast", "stock price", "calendar event", "email inbox", "music playlist", "train timetable",
+            "recipe ingredients", "currency exchange", "flight status", "news headlines", "translation dictionary", "package tracking"]
+
+
+def many_tools(directory) -> str:
+    with open(directory / "many.py", "w") as file:
+        for subject in subjects:
+            name = subject.replace(" ", "_")
+            file.write(f'def get_{name}(query: str):\n    """Look up the {subject} you ask about.\n\n    Args:\n        query (str): which {subject}.\n    """\n\n')
+    return str(directory / "many.py")
+
+
+class TestToolIndex:
+
+    def test_ranks_tools_by_relevance(self, tmp_path):
+        engine = ToolEngine(many_tools(tmp_path), tool_index=ToolIndex())
+        found = engine.tool_index.search("will the weather forecast say rain", engine.tools, 3)
+        assert found[0].name == "get_weather_forecast"
+        assert len(found) == 3
+        assert "get_weather_forecast" not in [tool.name for tool in engine.tool_index.search("weather forecast", engine.tools, 3, exclude={"get_weather_forecast"})]
+
+    def test_selects_os_tools_then_the_most_relevant(self, tmp_path):
+        engine = ToolEngine(many_tools(tmp_path), tool_index=ToolIndex())
+        assert len(engine.select("anything", limit=None)) == len(subjects) + 4
+        selected = [tool.name for tool in engine.select("is my flight status delayed", limit=6)]
+        assert len(selected) == 6
+        assert {"search_tools", "archive_content", "replace_segment", "replace_content_in_segment"} <= set(selected)
+        assert "get_flight_status" in selected
+
+    def test_search_tools_adds_tools_to_the_next_turns(self, tmp_path):
+        engine = ToolEngine(many_tools(tmp_path), tool_index=ToolIndex())
+        answer = engine.execute(ToolCall(id="1", function=ToolCallFunction(name="search_tools", arguments={"query": "currency exchange rates"})))
+        assert answer.content.startswith("get_currency_exchange:")
+        selected = [tool.name for tool in engine.select("hello there", limit=6)]
+        assert "get_currency_exchange" in selected
+        engine.close()
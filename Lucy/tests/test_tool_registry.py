@@ -0,0 +1,86 @@
+import os
+import time
+
+from lucy.agent.tool_engine import ToolRegistry
+from lucy.agent.tool_engine.registry import parse_tools
+
+source = '''
+from typing import Literal, Optional
+import not_installed_until_called
+
+def search(query: str, limit: int = 10, mode: Literal["fast", "deep"] = "fast", tags: Optional[list] = None):
+    """Search the web
+    for pages.
+
+    Args:
+        query (str): what to search for.
+        limit (int): the most results to return,
+            counting from the best.
+        mode: how hard to look.
+        tags: only pages with these tags.
+
+    Returns:
+        str: the results.
+    """
+
+async def ping(host):
+    """Ping a host.
+
+    Args:
+        host (str): the host.
+    """
+
+def _helper():
+    pass
+'''
+
+
+def write(path: str, text: str) -> None:
+    with open(path, "w") as file:
+        file.write(text)
+    # make sure a rewrite within the same clock tick still looks changed
+    os.utime(path, ns=(time.time_ns(), time.time_ns()))
+
+
+class TestToolRegistry:
+
+    def test_parses_signatures_and_docstrings_without_importing(self):
+        search, ping = parse_tools(source)
+        assert search.name == "search" and search.description == "Search the web for pages."
+        query, limit, mode, tags = search.parameters
+        assert (query.type, query.required, query.description) == ("string", True, "what to search for.")
+        assert (limit.type, limit.required, limit.default) == ("integer", False, "10")
+        assert limit.description == "the most results to return, counting from the best."
+        assert (mode.type, mode.enum) == ("string", ["fast", "deep"])
+        assert tags.type == "array"
+        assert ping.parameters[0].type == "string"
+
+    def test_request_schema_is_built_once(self):
+        search, _ = parse_tools(source)
+        schema = search.request_schema
+        assert schema["function"]["parameters"]["required"] == ["query"]
+        assert schema["function"]["parameters"]["properties"]["mode"]["enum"] == ["fast", "deep"]
+        assert search.request_schema is schema
+        assert search.request_json is search.request_json
+
+    def test_imports_sources_only_when_called_and_reloads_changes(self, tmp_path):
+        tools = tmp_path / "tools"
+        tools.mkdir()
+        write(tools / "greetings.py", 'def hello():\n    """Say hello."""\n    return "hello"\n')
+        registry = ToolRegistry([str(tools)], check_interval=0)
+        assert set(registry.tools) == {"hello"}
+        assert registry.source_of("hello")._module is None
+        assert registry.function("hello")() == "hello"
+
+        write(tools / "greetings.py", 'def hello(name: str):\n    """Say hello to someone."""\n    return f"hello {name}"\n')
+        write(tools / "farewells.py", 'def goodbye():\n    """Say goodbye."""\n    return "bye"\n')
+        registry.refresh()
+        assert set(registry.tools) == {"hello", "goodbye"}
+        assert registry.tools["hello"].description == "Say hello to someone."
+        assert registry.function("hello")("you") == "hello you"
+
+    def test_later_sources_take_precedence(self, tmp_path):
+        write(tmp_path / "mine.py", 'def archive_content(content: str):\n    """My own archiving."""\n')
+        registry = ToolRegistry(["lucy.agent.tool_engine.os_tools", str(tmp_path / "mine.py")])
+        assert registry.tools["archive_content"].description == "My own archiving."
+        assert "replace_segment" in registry.tools
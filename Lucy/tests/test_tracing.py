@@ -0,0 +1,124 @@
+import os
+import time
+
+import pytest
+
+from lucy.agent.agent import Agent
+from lucy.schema import Message, Role, ToolCall, ToolCallFunction, Turn
+from lucy.tracing import InMemoryExporter, LucySpanExporterBase, OpenTelemetryExporter, tracer
+from tests.fakes import FakeInferenceBackend, FakeMemoryBackend, FakeStimuliQueue
+
+sleepy_tools = os.path.join(os.path.dirname(__file__), "tools", "sleepy_tools.py")
+
+
+class ToolCallingBackend(FakeInferenceBackend):
+    """asks for one sleep, then answers."""
+
+    def _complete(self, turn: Turn) -> Turn:
+        turn = super()._complete(turn)
+        if self.requests == 1:
+            turn.response_message.tool_calls = [ToolCall(id="call_1", function=ToolCallFunction(name="sleep", arguments={"seconds": 0.02}))]
+        return turn
+
+
+@pytest.fixture
+def exporter():
+    exporter = InMemoryExporter()
+    tracer.add_exporter(exporter)
+    yield exporter
+    tracer.remove_exporter(exporter)
+
+
+def traced_agent(instance_id: str, backend: FakeInferenceBackend) -> Agent:
+    return Agent(instance_id=instance_id,
+                 inference_backend=backend,
+                 stimuli_queue=FakeStimuliQueue(),
+                 core_memory_backend=FakeMemoryBackend,
+                 archival_memory_backend=FakeMemoryBackend,
+                 recall_memory_backend=FakeMemoryBackend,
+                 alternate_tools_path=sleepy_tools,
+                 summarize_recall=False,
+                 autostart=False)
+
+
+class TestTracer:
+
+    def test_disabled_tracing_records_nothing(self):
+        assert not tracer.enabled
+        with tracer.span("anything") as span:
+            span.set("key", "value")
+        assert span is tracer.span("anything else") is tracer.current()
+        assert not span.recording
+
+    def test_spans_nest(self, exporter):
+        with tracer.span("outer") as outer:
+            with tracer.span("inner") as inner:
+                tracer.current().add("count", 2)
+            tracer.record("done", 0.5)
+        assert [span.name for span in exporter.spans] == ["inner", "done", "outer"]
+        assert exporter.children(outer) == [inner, exporter.named("done")[0]]
+        assert inner.attributes == {"count": 2} and inner.trace_id == outer.span_id
+        assert exporter.named("done")[0].duration == 0.5
+        assert tracer.current() is not outer
+
+    def test_errors_are_recorded_and_broken_exporters_ignored(self, exporter):
+        class Broken(LucySpanExporterBase):
+            def export(self, span):
+                raise RuntimeError("broken on purpose")
+
+        broken = Broken()
+        tracer.add_exporter(broken)
+        try:
+            with pytest.raises(ValueError):
+                with tracer.span("failing"):
+                    raise ValueError("nope")
+        finally:
+            tracer.remove_exporter(broken)
+        assert exporter.named("failing")[0].error == "ValueError: nope"
+
+
+def test_agent_turns_are_traced(exporter):
+    agent = traced_agent("traced", ToolCallingBackend())
+    for i in range(agent.inference_backend.core_memory_maximum_number_of_messages_in_history + 2):
+        agent.stimuli_queue.enque(Message(role=Role.user, content=f"message {i}"), priority=False)
+    time.sleep(0.01)
+    assert agent.beat() and agent.beat()
+
+    beat, *_ = exporter.named("agent.beat")
+    dequeued = exporter.named("stimuli.deque")[0]
+    assert dequeued.parent_id == beat.span_id
+    assert dequeued.attributes["lucy.stimuli.count"] == 12 and dequeued.attributes["lucy.stimuli.max_wait"] >= 0.01
+    assert dequeued.attributes["lucy.memory.evicted"] == 2
+    assert exporter.named("memory.write")[0].attributes["lucy.memory.type"] == "recall"
+
+    think = exporter.named("agent.think")[0]
+    children = {span.name: span for span in exporter.children(think)}
+    assert {"inference.generate", "tools.execute", "stimuli.enque"} <= set(children)
+    generate, execute = children["inference.generate"], children["tools.execute"]
+    assert generate.attributes["gen_ai.request.model"] == "fake"
+    assert generate.attributes["gen_ai.usage.input_tokens"] > generate.attributes["gen_ai.usage.output_tokens"] > 0
+    call, = exporter.children(execute)
+    assert call.attributes == {"lucy.tool.name": "sleep", "lucy.tool.outcome": "ok"} and call.duration >= 0.02
+    # the tool response is taken in by the next beat
+    assert exporter.named("stimuli.deque")[1].attributes["lucy.stimuli.count"] == 1
+
+
+def test_opentelemetry_exporter_keeps_parentage():
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    provider, collected = TracerProvider(), InMemorySpanExporter()
+    provider.add_span_processor(SimpleSpanProcessor(collected))
+    exporter = OpenTelemetryExporter(provider)
+    tracer.add_exporter(exporter)
+    try:
+        with tracer.span("outer", {"lucy.instance_id": "otel"}):
+            with tracer.span("inner"):
+                pass
+    finally:
+        tracer.remove_exporter(exporter)
+    inner, outer = collected.get_finished_spans()
+    assert inner.parent.span_id == outer.context.span_id
+    assert outer.attributes["lucy.instance_id"] == "otel"
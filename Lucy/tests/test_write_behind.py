@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from lucy.backends.write_behind import WriteBehindBuffer
+from lucy.schema import MemoryType, Message, Role
+from tests.fakes import FakeMemoryBackend, FlakyWriter
+
+
+class TestWriteBehindBuffer:
+
+    def test_flushes_when_full(self):
+        writer = FlakyWriter()
+        buffer = WriteBehindBuffer(writer, max_items=3, max_delay=60)
+        buffer.add([1, 2])
+        assert writer.batches == []
+        buffer.add([3, 4])
+        assert writer.batches == [[1, 2, 3, 4]]
+        assert len(buffer) == 0
+
+    def test_flushes_after_max_delay(self):
+        writer = FlakyWriter()
+        buffer = WriteBehindBuffer(writer, max_items=100, max_delay=0.05)
+        buffer.add([1])
+        buffer.add([2])
+        deadline = time.monotonic() + 2
+        while not writer.batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert writer.batches == [[1, 2]]
+
+    def test_failed_batches_are_retried_in_order(self):
+        writer = FlakyWriter(failures=1)
+        buffer = WriteBehindBuffer(writer, max_items=100, max_delay=60)
+        buffer.add([1, 2])
+        buffer.flush()
+        buffer.add([3])
+        buffer.flush()
+        assert writer.batches == [[1, 2, 3]]
+        assert buffer.flushed == 3
+
+    def test_failures_can_be_raised_and_are_still_retried(self):
+        writer = FlakyWriter(failures=1)
+        buffer = WriteBehindBuffer(writer, max_items=100, max_delay=60)
+        buffer.add([1, 2])
+        with pytest.raises(ConnectionError):
+            buffer.flush(raise_errors=True)
+        assert len(buffer) == 2
+        buffer.flush(raise_errors=True)
+        assert writer.batches == [[1, 2]]
+
+    def test_memory_backend_writes_are_buffered_until_flushed(self):
+        backend = FakeMemoryBackend("s_write_behind", MemoryType.recall)
+        backend.buffer_writes(max_items=100, max_delay=60)
+        backend.write([Message(role=Role.user, content="hi")])
+        assert "s_write_behind" not in backend.recall
+        backend.flush()
+        assert [m.content for m in backend.recall["s_write_behind"]] == ["hi"]
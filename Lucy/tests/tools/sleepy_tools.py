@@ -0,0 +1,71 @@
+"""tools for the tool engine tests and benchmarks, that sleep to stand in for I/O."""
+import asyncio
+import time
+
+from lucy.agent.tool_engine import cacheable, timeout
+
+
+def sleep(seconds: float, answer: str = "done"):
+    """Sleeps, then answers.
+
+    Args:
+        seconds (float): how long to sleep.
+        answer (str): what to answer with.
+
+    Returns:
+        str: the answer.
+    """
+    time.sleep(seconds)
+    return answer
+
+
+async def async_sleep(seconds: float, answer: str = "done"):
+    """Sleeps without blocking a thread, then answers.
+
+    Args:
+        seconds (float): how long to sleep.
+        answer (str): what to answer with.
+
+    Returns:
+        str: the answer.
+    """
+    await asyncio.sleep(seconds)
+    return answer
+
+
+@timeout(0.05)
+def impatient(seconds: float):
+    """Sleeps, but only has 0.05 seconds to do it in.
+
+    Args:
+        seconds (float): how long to sleep.
+
+    Returns:
+        dict: how long it slept.
+    """
+    time.sleep(seconds)
+    return {"slept": seconds}
+
+
+def broken():
+    """Always fails.
+
+    Returns:
+        str: never.
+    """
+    raise RuntimeError("broken on purpose")
+
+
+@cacheable(ttl=60)
+def lookup(key: str, seconds: float = 0.0):
+    """Looks something up that's slow to find but never changes.
+
+    Args:
+        key (str): what to look up.
+        seconds (float): how long looking takes.
+
+    Returns:
+        str: the key, and when it was looked up.
+    """
+    time.sleep(seconds)
+    return f"{key} at {time.perf_counter_ns()}"
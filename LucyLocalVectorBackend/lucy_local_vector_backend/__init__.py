@@ -0,0 +1,3 @@
+from lucy_local_vector_backend.main import LucyLocalVectorBackend
+
+__all__ = ["LucyLocalVectorBackend"]
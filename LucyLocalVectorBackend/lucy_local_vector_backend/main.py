@@ -0,0 +1,113 @@
+from typing import Callable, List, Optional, TYPE_CHECKING
+from functools import partial
+import math
+import os
+import threading
+
+import numpy as np
+
+from lucy.backends.memory_backend_base import LucyMemoryBackendBase
+from lucy.schema import LucyMemoryCore, MemoryType, Message, Document, ArchivalSearchResult, RecallSearchResult
+
+from lucy_local_vector_backend.store import InstanceStore
+
+if TYPE_CHECKING:
+    from lucy.backends.embedding_backend_base import LucyEmbeddingBackendBase
+
+class LucyLocalVectorBackend(LucyMemoryBackendBase):
+    """keeps lucy's memory in local files, no database required (ie for development, CI and edge deployments).
+
+    Each agent instance gets a directory of append-only, crash-safe files (see `InstanceStore`).
+    Archival embeddings are a memory-mapped float32 matrix searched by exact, vectorized cosine similarity,
+    or through an HNSW index once the archive is large (with `hnswlib` installed).
+    Recall search is a plain scan, newest first, for messages containing every word searched for.
+    Every backend for the same instance in a process shares one store.
+
+    Args:
+        instance_id: the unique identifier for the agent instance
+        memory_type: the type of memory to be used
+        directory: where every instance's files live
+        embedding_backend: embeds archived documents and search queries, required to search archival memory
+        ann_threshold: use an HNSW index once an archive has this many documents; None to always search exactly
+    """
+    page_size: int = 10
+    _stores: dict[str, InstanceStore] = {}
+    _opening = threading.Lock()
+
+    def __init__(self,
+                 instance_id: str,
+                 memory_type: MemoryType,
+                 directory: str,
+                 embedding_backend: Optional["LucyEmbeddingBackendBase"] = None,
+                 ann_threshold: Optional[int] = 100_000):
+        super().__init__(instance_id, memory_type)
+        self.embedding_backend = embedding_backend
+        self.initialize(memory_type, directory)
+        path = os.path.abspath(os.path.join(directory, instance_id))
+        with self._opening:
+            if (store := self._stores.get(path)) is None:
+                store = self._stores[path] = InstanceStore(path, ann_threshold)
+        self.store = store
+
+    @classmethod
+    def initialize(cls, memory_type: MemoryType, directory: Optional[str] = None):
+        """Creates the directory instances are stored in. Idempotent and non-destructive."""
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def factory(cls, directory: str, **kwargs) -> Callable:
+        """returns a callable that creates backends storing instances under directory, with any of the other constructor options."""
+        return partial(cls, directory=directory, **kwargs)
+
+    @property
+    def core(self) -> Optional["LucyMemoryCore"]:
+        if (persisted := self.store.read_core()) is None:
+            return None
+        return LucyMemoryCore.from_stored(persisted)
+
+    @core.setter
+    def core(self, value: "LucyMemoryCore"):
+        self.store.write_core(value.stored)
+
+    def _write_to_archival(self, documents: List[Document]) -> None:
+        """appends the documents and their embeddings in one commit."""
+        if not documents:
+            return
+        if any(document.embeddings is None for document in documents):
+            raise ValueError("archived documents need embeddings, set an embedding_backend to embed them")
+        self.store.append_archival(np.stack([document.embeddings for document in documents]),
+                                   [{"content": document.content} for document in documents])
+
+    def _search_archival(self, value: str, page: int = 1) -> ArchivalSearchResult:
+        """The documents closest to value by cosine similarity, page_size at a time."""
+        if self.embedding_backend is None:
+            raise ValueError("an embedding_backend is required to search archival memory")
+        nearest = self.store.search(self.embedding_backend.embed(value), page * self.page_size)
+        found = self.store.read_archival(nearest[(page - 1) * self.page_size:])
+        return ArchivalSearchResult(results=[Document(content=document["content"], embeddings=embeddings) for document, embeddings in found],
+                                    page=page,
+                                    page_count=math.ceil(self.store.archival_count / self.page_size),
+                                    query=value)
+
+    def _write_to_recall(self, messages: List[Message]) -> None:
+        """appends the messages in one commit."""
+        if messages:
+            self.store.append_recall([message.stored for message in messages])
+
+    def _search_recall(self, value: str, page: int = 1) -> RecallSearchResult:
+        """The messages containing every word of value (case insensitive), newest first, page_size at a time.
+        The scan stops once it has found one match past the page, so page_count counts at most the next page.
+        """
+        words = value.lower().split()
+        matches, wanted, chunk = [], page * self.page_size, 256
+        for end in range(self.store.recall_count, 0, -chunk):
+            for message in reversed(self.store.read_recall(list(range(max(0, end - chunk), end)))):
+                if all(word in message["content"].lower() for word in words):
+                    matches.append(message)
+            if len(matches) > wanted:
+                break
+        return RecallSearchResult(results=Message.from_stored_many(matches[(page - 1) * self.page_size:wanted]),
+                                  page=page,
+                                  page_count=math.ceil(len(matches) / self.page_size),
+                                  query=value)
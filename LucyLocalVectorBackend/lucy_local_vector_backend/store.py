@@ -0,0 +1,236 @@
+from typing import Optional
+import logging
+import os
+import threading
+
+import numpy as np
+
+from lucy import encoding
+
+logger = logging.getLogger("lucy.local_vector_backend")
+
+
+def _fsync_directory(directory: str) -> None:
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def _replace(path: str, data: bytes) -> None:
+    """writes data to path atomically: readers (and a restarted process) see the old file or the new one, never part of either."""
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+    _fsync_directory(os.path.dirname(path))
+
+
+def _append(path: str, committed: int, data: bytes) -> None:
+    """appends data after the first committed bytes of path, dropping anything an interrupted write left past them."""
+    descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        os.ftruncate(descriptor, committed)
+        os.lseek(descriptor, committed, os.SEEK_SET)
+        view = memoryview(data)
+        while view:
+            view = view[os.write(descriptor, view):]
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class RecordLog:
+    """Append-only JSON records: one per line in `<name>.jsonl`, with the offset each starts at in `<name>.offsets` (uint64)."""
+
+    def __init__(self, directory: str, name: str):
+        self.data_path = os.path.join(directory, f"{name}.jsonl")
+        self.offsets_path = os.path.join(directory, f"{name}.offsets")
+
+    def append(self, records: list[dict], count: int, size: int) -> int:
+        """writes records after the first count records (size bytes), returning the new size."""
+        encoded = [encoding.dumps_bytes(record) + b"\n" for record in records]
+        offsets = size + np.cumsum([0] + [len(line) for line in encoded[:-1]], dtype=np.uint64)
+        _append(self.data_path, size, b"".join(encoded))
+        _append(self.offsets_path, count * 8, offsets.astype(np.uint64).tobytes())
+        return size + sum(len(line) for line in encoded)
+
+    def read(self, indices: list[int], count: int, size: int) -> list[dict]:
+        """the records at indices (of the first count)."""
+        if not indices:
+            return []
+        offsets = np.memmap(self.offsets_path, dtype=np.uint64, mode="r", shape=(count,))
+        records = []
+        with open(self.data_path, "rb") as file:
+            for index in indices:
+                start = int(offsets[index])
+                end = int(offsets[index + 1]) if index + 1 < count else size
+                file.seek(start)
+                records.append(encoding.loads(file.read(end - start)))
+        return records
+
+
+class InstanceStore:
+    """Everything one agent instance has persisted, in a directory of append-only files:
+
+        manifest.json              how much of every other file is committed; replaced atomically after each write
+        archival.f32               archival embeddings, a (count, dimensions) float32 matrix
+        archival.norms             the L2 norm of each embedding (float32)
+        archival.jsonl/.offsets    archival documents
+        recall.jsonl/.offsets      recall messages
+        core.json                  the persisted core memory, replaced atomically
+
+    Writes append and fsync the data, then commit it by replacing the manifest. Anything past the manifest's lengths is a write that
+    never committed (ie the process died mid-write): it is never read, and the next write overwrites it.
+    Reads memory-map the files, so opening an archive costs the same whatever its size and the OS pages in only what searches touch.
+
+    Args:
+        directory: where this instance's files live
+        ann_threshold: search with an HNSW index (requires `hnswlib`) once the archive has this many documents; None to always search exactly
+    """
+
+    def __init__(self, directory: str, ann_threshold: Optional[int] = 100_000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.ann_threshold = ann_threshold
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.core_path = os.path.join(directory, "core.json")
+        self.vectors_path = os.path.join(directory, "archival.f32")
+        self.norms_path = os.path.join(directory, "archival.norms")
+        self.archival = RecordLog(directory, "archival")
+        self.recall = RecordLog(directory, "recall")
+        self.manifest = self._read_manifest()
+        self._writing = threading.Lock()
+        self._indexing = threading.Lock()
+        self._matrix: Optional[tuple[int, np.ndarray, np.ndarray]] = None
+        self._ann = None
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, "rb") as file:
+                return encoding.loads(file.read())
+        except FileNotFoundError:
+            return {"dimensions": None, "archival": 0, "archival_bytes": 0, "recall": 0, "recall_bytes": 0}
+
+    def _commit(self, manifest: dict) -> None:
+        _replace(self.manifest_path, encoding.dumps_bytes(manifest))
+        self.manifest = manifest
+
+    @property
+    def archival_count(self) -> int:
+        return self.manifest["archival"]
+
+    @property
+    def recall_count(self) -> int:
+        return self.manifest["recall"]
+
+    ### core ###
+    def read_core(self) -> Optional[dict]:
+        try:
+            with open(self.core_path, "rb") as file:
+                return encoding.loads(file.read())
+        except FileNotFoundError:
+            return None
+
+    def write_core(self, core: dict) -> None:
+        with self._writing:
+            _replace(self.core_path, encoding.dumps_bytes(core))
+
+    ### archival ###
+    def append_archival(self, embeddings: np.ndarray, documents: list[dict]) -> None:
+        """appends a (len(documents), dimensions) matrix of embeddings and the documents they embed."""
+        with self._writing:
+            manifest = dict(self.manifest)
+            count, dimensions = manifest["archival"], manifest["dimensions"] or embeddings.shape[1]
+            if embeddings.shape[1] != dimensions:
+                raise ValueError(f"this archive holds {dimensions} dimensional embeddings, not {embeddings.shape[1]}")
+            embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+            _append(self.vectors_path, count * dimensions * 4, embeddings.tobytes())
+            _append(self.norms_path, count * 4, np.linalg.norm(embeddings, axis=1).astype(np.float32).tobytes())
+            manifest["archival_bytes"] = self.archival.append(documents, count, manifest["archival_bytes"])
+            manifest["archival"] = count + len(documents)
+            manifest["dimensions"] = dimensions
+            self._commit(manifest)
+
+    def read_archival(self, indices: list[int]) -> list[tuple[dict, np.ndarray]]:
+        """the documents at indices, with their embeddings."""
+        manifest = self.manifest
+        if not indices or not manifest["archival"]:
+            return []
+        vectors, _ = self._vectors(manifest)
+        documents = self.archival.read(indices, manifest["archival"], manifest["archival_bytes"])
+        return [(document, np.array(vectors[index])) for document, index in zip(documents, indices)]
+
+    def _vectors(self, manifest: dict) -> tuple[np.ndarray, np.ndarray]:
+        """the embeddings matrix and norms, memory-mapped (and re-mapped as the archive grows). Empty before anything is archived."""
+        count = manifest["archival"]
+        if not count:
+            # there are no files to map yet
+            return np.empty((0, manifest["dimensions"] or 0), dtype=np.float32), np.empty((0,), dtype=np.float32)
+        if self._matrix is None or self._matrix[0] != count:
+            self._matrix = (count,
+                            np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, manifest["dimensions"])),
+                            np.memmap(self.norms_path, dtype=np.float32, mode="r", shape=(count,)))
+        return self._matrix[1], self._matrix[2]
+
+    def search(self, query: np.ndarray, k: int) -> list[int]:
+        """the indices of the k archived embeddings nearest to query by cosine similarity, nearest first."""
+        manifest = self.manifest
+        count = manifest["archival"]
+        if not count or k <= 0:
+            return []
+        k = min(k, count)
+        if self.ann_threshold is not None and count >= self.ann_threshold and (ann := self._ann_index(manifest)) is not None:
+            ann.set_ef(max(k, 64))
+            labels, _ = ann.knn_query(query, k=k)
+            return labels[0].tolist()
+        vectors, norms = self._vectors(manifest)
+        scores = (vectors @ query.astype(np.float32, copy=False)) / np.maximum(norms * np.linalg.norm(query), 1e-12)
+        nearest = np.argpartition(-scores, k - 1)[:k]
+        return nearest[np.argsort(-scores[nearest], kind="stable")].tolist()
+
+    def _ann_index(self, manifest: dict):
+        """An HNSW index over the archive, loaded from (and saved to) archival.hnsw and extended with any documents it's missing.
+        Returns None without hnswlib.
+        """
+        try:
+            import hnswlib
+        except ImportError:
+            logger.warning("archive has %s documents, install `hnswlib` to search it approximately", manifest["archival"])
+            self.ann_threshold = None
+            return None
+        with self._indexing:
+            return self._extend_ann_index(hnswlib, manifest)
+
+    def _extend_ann_index(self, hnswlib, manifest: dict):
+        path = os.path.join(self.directory, "archival.hnsw")
+        count, dimensions = manifest["archival"], manifest["dimensions"]
+        if self._ann is None:
+            self._ann = hnswlib.Index(space="cosine", dim=dimensions)
+            if os.path.exists(path):
+                self._ann.load_index(path, max_elements=count)
+            else:
+                self._ann.init_index(max_elements=count, ef_construction=200, M=16)
+        if (indexed := self._ann.get_current_count()) < count:
+            vectors, _ = self._vectors(manifest)
+            self._ann.resize_index(max(count, self._ann.get_max_elements()))
+            self._ann.add_items(np.asarray(vectors[indexed:count]), np.arange(indexed, count))
+            temporary = f"{path}.tmp"
+            self._ann.save_index(temporary)
+            os.replace(temporary, path)
+        return self._ann
+
+    ### recall ###
+    def append_recall(self, messages: list[dict]) -> None:
+        with self._writing:
+            manifest = dict(self.manifest)
+            manifest["recall_bytes"] = self.recall.append(messages, manifest["recall"], manifest["recall_bytes"])
+            manifest["recall"] += len(messages)
+            self._commit(manifest)
+
+    def read_recall(self, indices: list[int]) -> list[dict]:
+        manifest = self.manifest
+        return self.recall.read(indices, manifest["recall"], manifest["recall_bytes"])
@@ -0,0 +1,53 @@
+"""Benchmarks archival search latency as an archive grows, exact (vectorized brute force over the memory-mapped matrix)
+and through HNSW (if `hnswlib` is installed), plus how long reopening the archive takes.
+
+    python -m tests.benchmarks.bench_search [dimensions] [largest_archive]
+"""
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from lucy_local_vector_backend.store import InstanceStore
+
+
+def latency(store: InstanceStore, queries: np.ndarray, k: int = 10) -> float:
+    """median ms per search."""
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        store.search(query, k)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+if __name__ == "__main__":
+    dimensions = int(sys.argv[1]) if len(sys.argv) > 1 else 384
+    largest = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+    rng = np.random.default_rng(0)
+    queries = rng.random((50, dimensions), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = InstanceStore(directory, ann_threshold=None)
+        size, target = 0, 10_000
+        while target <= largest:
+            for start in range(size, target, 50_000):
+                count = min(50_000, target - start)
+                store.append_archival(rng.random((count, dimensions), dtype=np.float32), [{"content": str(start + i)} for i in range(count)])
+            size = target
+            started = time.perf_counter()
+            reopened = InstanceStore(directory, ann_threshold=None)
+            reopened.search(queries[0], 10)
+            opened = (time.perf_counter() - started) * 1000
+            line = f"{size:>9} documents: exact {latency(reopened, queries):7.2f}ms"
+            try:
+                import hnswlib
+                approximate = InstanceStore(directory, ann_threshold=1)
+                approximate.search(queries[0], 10)
+                line += f", hnsw {latency(approximate, queries):6.2f}ms"
+            except ImportError:
+                pass
+            print(f"{line}, reopen + first search {opened:7.1f}ms")
+            target *= 10
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+
+from lucy.backends.embedders import HashingEmbeddingBackend
+from lucy.schema import Document, LucyMemoryCore, MemoryType, Message, Role
+from lucy_local_vector_backend import LucyLocalVectorBackend
+from lucy_local_vector_backend.store import InstanceStore
+
+
+@pytest.fixture
+def backend(tmp_path):
+    LucyLocalVectorBackend._stores.clear()
+    factory = LucyLocalVectorBackend.factory(str(tmp_path), embedding_backend=HashingEmbeddingBackend(dimensions=64))
+    yield lambda memory_type=MemoryType.archival: factory(instance_id="s_local", memory_type=memory_type)
+    LucyLocalVectorBackend._stores.clear()
+
+
+class TestLucyLocalVectorBackend:
+
+    def test_archival_search_finds_the_nearest_documents(self, backend):
+        archive = backend()
+        archive.write([Document(content=f"note {i} about the weather") for i in range(25)]
+                      + [Document(content="the user loves extra pickles")])
+        result = archive.search("extra pickles")
+        assert result.results[0].content == "the user loves extra pickles"
+        assert result.results[0].embeddings.dtype == np.float32
+        assert result.page_count == 3
+        assert len(archive.search("extra pickles", page=3).results) == 6
+
+    def test_searching_an_empty_archive_finds_nothing(self, backend):
+        result = backend().search("hello")
+        assert result.results == [] and result.page_count == 0
+
+    def test_archive_survives_a_restart_without_loading(self, backend, tmp_path):
+        backend().write([Document(content="the user loves extra pickles")])
+        LucyLocalVectorBackend._stores.clear()
+        reopened = backend()
+        assert isinstance(reopened.store._vectors(reopened.store.manifest)[0], np.memmap)
+        assert reopened.search("pickles").results[0].content == "the user loves extra pickles"
+
+    def test_uncommitted_writes_are_ignored_and_overwritten(self, backend, tmp_path):
+        archive = backend()
+        archive.write([Document(content="committed")])
+        # a write that died before the manifest was replaced
+        for name in ("archival.f32", "archival.norms", "archival.jsonl", "archival.offsets"):
+            with open(os.path.join(archive.store.directory, name), "ab") as file:
+                file.write(b"\x00torn")
+        store = InstanceStore(archive.store.directory)
+        assert store.archival_count == 1
+        store.append_archival(np.ones((1, 64), dtype=np.float32), [{"content": "after the crash"}])
+        assert [document["content"] for document, _ in store.read_archival([0, 1])] == ["committed", "after the crash"]
+
+    def test_core_round_trips(self, backend):
+        core_memory = backend(MemoryType.core)
+        assert core_memory.core is None
+        core = LucyMemoryCore(boot="boot", bios="bios", persona="persona", human="human",
+                              history=[Message(role=Role.user, content="hi")])
+        core_memory.core = core
+        assert core_memory.core == core
+
+    def test_recall_search_is_newest_first(self, backend):
+        recall = backend(MemoryType.recall)
+        recall.write([Message(role=Role.user, content=f"I love Pickles ({i})") for i in range(12)]
+                     + [Message(role=Role.user, content="sweet relish")])
+        result = recall.search("love pickles")
+        assert [m.content for m in result.results][:2] == ["I love Pickles (11)", "I love Pickles (10)"]
+        assert result.page_count == 2
+        assert len(recall.search("love pickles", page=2).results) == 2
+
+    def test_large_archives_search_through_hnsw(self, tmp_path):
+        pytest.importorskip("hnswlib")
+        store = InstanceStore(str(tmp_path / "s_ann"), ann_threshold=100)
+        vectors = np.random.default_rng(0).random((500, 16), dtype=np.float32)
+        store.append_archival(vectors, [{"content": str(i)} for i in range(500)])
+        assert store.search(vectors[42], 1) == [42]
+        assert os.path.exists(tmp_path / "s_ann" / "archival.hnsw")
@@ -1,12 +1,23 @@
+from typing import AsyncIterator, Optional
+from weakref import WeakKeyDictionary
+import asyncio
+
+from lucy import encoding
 from lucy.backends.inference_backend_base import LucyInferenceBackendBase
-from lucy.schema import Turn, Message, Role
+from lucy.backends.tokenizers import LucyTokenizerBase, HuggingFaceTokenizer
+from lucy.schema import Turn, Message, MessageDelta, ToolCall, ToolCallDelta, ToolCallFunction, Role
+from lucy.tracing import tracer
 # together uses a patched version of openai's client now
 from .enums import LLMModel
-from openai import OpenAI as Together
+from openai import OpenAI as Together, AsyncOpenAI as AsyncTogether
 
 
 from lucy_mixtral_together_ai_backend.enums import LLMModel
 
+# async clients (and their connection pools) are bound to the event loop they were created on,
+# so every backend on a loop shares one client per set of credentials.
+_async_clients: "WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple[str, str], AsyncTogether]]" = WeakKeyDictionary()
+
 class LucyTogetherAIBackend(LucyInferenceBackendBase):
     """LLM adapter for Mixtral 8x7b Together AI"""
     package_name = "sid_mixtral_together_ai_backend"
@@ -17,31 +28,116 @@ class LucyTogetherAIBackend(LucyInferenceBackendBase):
     core_memory_maximum_chars_in_persona = 2000
     core_memory_maximum_chars_in_human = 2000
     core_memory_maximum_tool_count = 10
+    context_window_tokens = 16384
 
     def __init__(self,
-                 api_key: str):
+                 api_key: str,
+                 base_url: str = "https://api.together.xyz/v1",
+                 tokenizer_path: Optional[str] = None,
+                 temperature: Optional[float] = None):
         """initiates the adapter with a model.
         Explicitly create with api_key to avoid lucye effects and opaque behavior.
+        base_url can point at any OpenAI compatible server (ie a local stub for tests).
+        tokenizer_path is a local tokenizer.json for the model, for exact (offline) token counts. Tokens are estimated without one.
+        temperature is the sampling temperature, the model's default if None.
         """
+        self.api_key = api_key
+        self._temperature = temperature
+        self.base_url = base_url
+        self._tokenizer = HuggingFaceTokenizer(tokenizer_path) if tokenizer_path else None
         self.client = Together(
-            base_url = "https://api.together.xyz/v1",
+            base_url = base_url,
             api_key = api_key,
             )
 
+    @property
+    def tokenizer(self) -> "LucyTokenizerBase":
+        return self._tokenizer or super().tokenizer
+
+    @property
+    def temperature(self) -> Optional[float]:
+        return self._temperature
+
+    @property
+    def async_client(self) -> "AsyncTogether":
+        """the pooled async client shared by every backend on the running event loop with the same credentials."""
+        clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+        key = (self.base_url, self.api_key)
+        if (client := clients.get(key)) is None:
+            clients[key] = client = AsyncTogether(
+                base_url = self.base_url,
+                api_key = self.api_key,
+                )
+        return client
+
+    def _request(self, turn:Turn) -> dict:
+        """the chat completion arguments for a turn."""
+        request = {
+            "model": self.model,
+            "messages": [m.payload for m in turn.request_messages],
+        }
+        if self._temperature is not None:
+            request["temperature"] = self._temperature
+        if turn.request_tools:
+            request["tools"] = [t.request_schema for t in turn.request_tools]
+            request["tool_choice"] = "auto"
+        return request
+
+    @staticmethod
+    def _trace_usage(generation) -> None:
+        """the token usage the server reported, on the span the turn is generated in (if it's being traced)."""
+        span = tracer.current()
+        if span.recording and (usage := getattr(generation, "usage", None)) is not None:
+            span.set("gen_ai.response.model", generation.model)
+            span.set("gen_ai.usage.input_tokens", usage.prompt_tokens)
+            span.set("gen_ai.usage.output_tokens", usage.completion_tokens)
+
+    @staticmethod
+    def _response_message(message) -> Message:
+        """converts the openai response message into a Lucy Message."""
+        return Message(
+            role=Role.assistant,
+            content=message.content or "",
+            tool_calls=[ToolCall(id=call.id,
+                                 function=ToolCallFunction(name=call.function.name,
+                                                           arguments=encoding.loads(call.function.arguments or "{}")))
+                        for call in message.tool_calls or []] or None,
+        )
+
     def generate(self, turn:Turn) -> Turn:
         """Generates a response to complete the turn.
         """
-        generation = self.client.chat.completions.create(
-            model=self.model,
-            messages=[m.model_dump(exclude_none=True) for m in turn.request_messages],
-            tools=[t.model_dump(exclude_none=True) for t in turn.request_tools],
-            tool_choice="auto",
-        )
-        # TODO: telementry
-        response_message = Message(
-            role=Role.assistant,
-            content=generation.choices[0].message.content,
-            tool_calls=generation.choices[0].message.tool_calls,
-        )
-        turn.response_message = response_message
-        return turn
\ No newline at end of file
+        generation = self.client.chat.completions.create(**self._request(turn))
+        self._trace_usage(generation)
+        turn.response_message = self._response_message(generation.choices[0].message)
+        return turn
+
+    async def agenerate(self, turn:Turn) -> Turn:
+        """Generates a response to complete the turn without holding a thread while the model works.
+        """
+        generation = await self.async_client.chat.completions.create(**self._request(turn))
+        self._trace_usage(generation)
+        turn.response_message = self._response_message(generation.choices[0].message)
+        return turn
+
+    async def astream(self, turn:Turn) -> AsyncIterator[MessageDelta]:
+        """Streams the response content and tool call fragments as they are generated.
+        """
+        stream = await self.async_client.chat.completions.create(**self._request(turn), stream=True)
+        deltas = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            fragment = chunk.choices[0].delta
+            delta = MessageDelta(
+                content=fragment.content or None,
+                tool_calls=[ToolCallDelta(index=call.index,
+                                          id=call.id,
+                                          name=call.function.name if call.function else None,
+                                          arguments=(call.function.arguments if call.function else None) or "")
+                            for call in fragment.tool_calls or []] or None,
+            )
+            if delta.content or delta.tool_calls:
+                deltas.append(delta)
+                yield delta
+        turn.response_message = Message.from_deltas(deltas)
@@ -0,0 +1,90 @@
+import json
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from lucy.schema import Turn, Message, Role
+
+from lucy_mixtral_together_ai_backend.main import LucyTogetherAIBackend
+
+TOOL_CALL = {"id": "call_1", "type": "function", "function": {"name": "company_org_chart", "arguments": '{"format": "xml"}'}}
+
+
+def completion_chunk(delta: dict) -> bytes:
+    chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+             "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+    return f"data: {json.dumps(chunk)}\n\n".encode()
+
+
+class OpenAIStub(BaseHTTPRequestHandler):
+    """just enough of an OpenAI compatible chat completions endpoint to exercise the backend."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if not request.get("stream"):
+            body = json.dumps({"id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": "stub",
+                               "choices": [{"index": 0, "finish_reason": "tool_calls",
+                                            "message": {"role": "assistant", "content": "Hello Dave", "tool_calls": [TOOL_CALL]}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        self.wfile.write(completion_chunk({"role": "assistant", "content": "Hello"}))
+        self.wfile.write(completion_chunk({"content": " Dave"}))
+        self.wfile.write(completion_chunk({"tool_calls": [{"index": 0, "id": "call_1", "type": "function",
+                                                          "function": {"name": "company_org_chart", "arguments": '{"for'}}]}))
+        self.wfile.write(completion_chunk({"tool_calls": [{"index": 0, "function": {"arguments": 'mat": "xml"}'}}]}))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class TestAgenerate:
+
+    @classmethod
+    def setup_class(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), OpenAIStub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.backend = LucyTogetherAIBackend(api_key="stub", base_url=f"http://127.0.0.1:{cls.server.server_port}/v1")
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.shutdown()
+
+    def turn(self) -> Turn:
+        return Turn(request_messages=[Message(role=Role.user, content="I am Dave. Who is my boss?")], request_tools=[])
+
+    def test_agenerate(self):
+        turn = asyncio.run(self.backend.agenerate(self.turn()))
+        assert turn.response_message.content == "Hello Dave"
+        assert turn.response_message.tool_calls[0].function.arguments == {"format": "xml"}
+
+    def test_many_generations_share_one_client(self):
+
+        async def generate_many():
+            turns = await asyncio.gather(*(self.backend.agenerate(self.turn()) for _ in range(20)))
+            other = LucyTogetherAIBackend(api_key="stub", base_url=self.backend.base_url)
+            assert other.async_client is self.backend.async_client
+            return turns
+
+        assert all(t.response_message.content == "Hello Dave" for t in asyncio.run(generate_many()))
+
+    def test_astream(self):
+        turn = self.turn()
+
+        async def stream():
+            return [delta async for delta in self.backend.astream(turn)]
+
+        deltas = asyncio.run(stream())
+        assert [d.content for d in deltas[:2]] == ["Hello", " Dave"]
+        assert deltas[2].tool_calls[0].name == "company_org_chart"
+        assert turn.response_message.content == "Hello Dave"
+        assert turn.response_message.tool_calls[0].id == "call_1"
+        assert turn.response_message.tool_calls[0].function.arguments == {"format": "xml"}
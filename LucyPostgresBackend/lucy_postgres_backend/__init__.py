@@ -1,3 +1,3 @@
-from lucy_postgres_backend import LucyPostgresBackend, ScopedMemory
+from lucy_postgres_backend.main import LucyPostgresBackend
 
-__all__ = ["LucyPostgresBackend"]
\ No newline at end of file
+__all__ = ["LucyPostgresBackend"]
@@ -0,0 +1,66 @@
+from typing import Iterator, Union
+from contextlib import contextmanager
+import logging
+import threading
+
+from sqlalchemy import create_engine, make_url, URL, Engine
+from sqlalchemy.orm import sessionmaker, Session
+
+logger = logging.getLogger("lucy.postgres_backend")
+
+"""Every backend in the process that points at the same database shares one engine, and so one connection pool."""
+
+_engines: dict[str, Engine] = {}
+_sessionmakers: dict["Engine", sessionmaker] = {}
+_lock = threading.Lock()
+
+
+def _key(connection: Union[str, "URL"]) -> str:
+    return make_url(connection).render_as_string(hide_password=False)
+
+
+def get_engine(connection: Union[str, "URL"],
+               pool_size: int = 5,
+               max_overflow: int = 10,
+               **engine_kwargs) -> "Engine":
+    """Returns the process-wide engine for a connection URL, creating it on first use.
+    The pool settings of the first caller win; later callers get the existing engine as-is.
+    """
+    key = _key(connection)
+    if (engine := _engines.get(key)) is not None:
+        return engine
+    with _lock:
+        if (engine := _engines.get(key)) is None:
+            logger.info("creating engine for %s with a pool of %s (+%s overflow)", make_url(connection), pool_size, max_overflow)
+            engine = create_engine(connection,
+                                   pool_size=pool_size,
+                                   max_overflow=max_overflow,
+                                   pool_pre_ping=True,
+                                   **engine_kwargs)
+            _sessionmakers[engine] = sessionmaker(bind=engine, expire_on_commit=False)
+            _engines[key] = engine
+    return engine
+
+
+@contextmanager
+def session_scope(engine: "Engine") -> Iterator["Session"]:
+    """A session that commits when the block succeeds, rolls back when it raises, and always returns its connection to the pool.
+    """
+    session = _sessionmakers[engine]()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def dispose_engines() -> None:
+    """close every pooled connection, ie before forking worker processes."""
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _sessionmakers.clear()
@@ -1,52 +1,330 @@
-from typing import Any, Union, TYPE_CHECKING, Optional
+from typing import Callable, Iterator, List, Union, TYPE_CHECKING, Optional
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import partial
+from uuid import UUID, uuid4
 import logging
-from sqlalchemy import create_engine
+import threading
 
+from sqlalchemy import cast, event, func, insert, literal, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import JSONB, JSONPATH, insert as upsert
+
+from lucy import encoding
+from lucy.backends.memory_backend_base import LucyMemoryBackendBase
+from lucy.schema import LucyMemoryCore, CoreMemoryChanges, MemoryType, Message, MessageHistory, Document, ArchivalSearchResult, RecallSearchResult, ToolCall
+
+from lucy_postgres_backend.engine import get_engine, session_scope
 from lucy_postgres_backend.models.base import SqlalchemyBase
 from lucy_postgres_backend.exceptions import InstanceNotFound
-from lucy_postgres_backend.models.database import LucyAgentInstance
+from lucy_postgres_backend.models.database import AgentInstance, RecallMemory, ArchivalMemory, EMBEDDING_DIMENSIONS
+from lucy_postgres_backend.pagination import KeysetCursors, capped_page_count, keyset_page
+from lucy_postgres_backend.vectors import register_vector_dumpers
 
 if TYPE_CHECKING:
-    from sqlalchemy import URL
+    from lucy.backends.embedding_backend_base import LucyEmbeddingBackendBase
+    from sqlalchemy import URL, Engine
+    from sqlalchemy.orm import Session
 
 
 logger = logging.getLogger("lucy.postgres_backend")
 
-class LucyPostgresBackend:
+class LucyPostgresBackend(LucyMemoryBackendBase):
     """adapts lucy to use a postgres db
-    Init requires an existing agent instance; if one does not exist
-    must use the instance bootstrap to create one.
+
+    Every backend pointing at the same database shares one pooled engine (see `engine.get_engine`),
+    so a process holds at most pool_size + max_overflow connections no matter how many agents it runs.
+    instance_ids are AgentInstance ids (ie "s_<uuid>").
+
+    Recall and archival writes go out as one multi-row insert per batch (or COPY, for big batches on psycopg 3),
+    and with write_behind they are buffered and flushed by size or time.
+    Recall memory is searched by full text (GIN indexed), archival memory by embedding similarity (HNSW indexed),
+    both a page at a time with keyset pagination.
+
+    Args:
+        instance_id: the unique identifier for the agent instance
+        memory_type: the type of memory to be used
+        connection: the database URL
+        pool_size: connections kept open in the process-wide pool
+        max_overflow: connections the pool may open beyond pool_size under load
+        copy_threshold: batches at least this big are written with COPY, when the driver is psycopg 3. None to never COPY
+        write_behind: buffer recall and archival writes, see `LucyMemoryBackendBase.buffer_writes`
+        flush_size: flush buffered writes once this many are pending
+        flush_interval: the longest (in seconds) a buffered write waits to be flushed
+        embedding_backend: embeds archived documents and search queries, required to search archival memory
     """
-    instance_id: str
+    engine: "Engine"
+    page_size: int = 10
+    # the pgvector version of each initialized database
+    _initialized: dict[str, tuple[int, ...]] = {}
+    _initializing = threading.Lock()
 
     def __init__(self,
                  instance_id: str,
-                 connection: Union[str, URL],
-                 connect_args: Optional[dict] = None):
+                 memory_type: MemoryType,
+                 connection: Union[str, "URL"],
+                 pool_size: int = 5,
+                 max_overflow: int = 10,
+                 connect_args: Optional[dict] = None,
+                 copy_threshold: Optional[int] = 1000,
+                 write_behind: bool = False,
+                 flush_size: int = 256,
+                 flush_interval: float = 1.0,
+                 embedding_backend: Optional["LucyEmbeddingBackendBase"] = None):
+        super().__init__(instance_id, memory_type)
+        self.engine = get_engine(connection,
+                                 pool_size=pool_size,
+                                 max_overflow=max_overflow,
+                                 connect_args=connect_args or {})
+        self.copy_threshold = copy_threshold
+        self.embedding_backend = embedding_backend
+        if embedding_backend is not None and embedding_backend.dimensions != EMBEDDING_DIMENSIONS:
+            logger.warning("%s embeds %s dimensions but archival memory stores %s, set LUCY_EMBEDDING_DIMENSIONS to match",
+                           embedding_backend.name, embedding_backend.dimensions, EMBEDDING_DIMENSIONS)
+        self._instance_exists = False
+        self._cursors = KeysetCursors()
+        self.initialize(memory_type, self.engine)
+        if write_behind:
+            self.buffer_writes(max_items=flush_size, max_delay=flush_interval)
+
+    @classmethod
+    def initialize(cls, memory_type: MemoryType, engine: Optional["Engine"] = None, connection: Optional[Union[str, "URL"]] = None):
+        """Creates the lucy tables if they don't exist, in the database of engine (or the shared engine for connection).
+        Idempotent and non-destructive; the DDL only runs once per database per process, not once per agent.
+        """
+        if engine is None:
+            if connection is None:
+                raise ValueError("initialize needs the engine or connection of the database to create the lucy tables in")
+            engine = get_engine(connection)
+        key = engine.url.render_as_string(hide_password=False)
+        if key in cls._initialized:
+            return
+        with cls._initializing:
+            if key in cls._initialized:
+                return
+            if engine.dialect.driver == "psycopg":
+                # send embeddings to the database in pgvector's binary format
+                event.listen(engine, "connect", lambda connection, _: register_vector_dumpers(connection))
+            with engine.begin() as connection:
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gin"))
+                version = connection.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar_one()
+            if engine.dialect.driver == "psycopg":
+                # the pooled connection that created the extension connected before the vector type existed
+                with engine.connect() as connection:
+                    register_vector_dumpers(connection.connection.driver_connection)
+            # TODO: integrate with migrations
+            SqlalchemyBase.metadata.create_all(engine)
+            cls._initialized[key] = tuple(int(part) for part in version.split(".") if part.isdigit())
+
+    @classmethod
+    def factory(cls, connection: Union[str, "URL"], **kwargs) -> Callable:
+        """returns a callable that creates backends for the database at connection, with any of the other constructor options.
+        Nothing connects until the first backend is created.
+        """
+        return partial(cls, connection=connection, **kwargs)
 
-        self.instance_id = instance_id
-        self.engine = create_engine(connection, connect_args=connect_args)
+    @contextmanager
+    def session(self) -> Iterator["Session"]:
+        """a session that commits on success, rolls back on error, and is always closed."""
+        with session_scope(self.engine) as session:
+            yield session
 
-        # TODO: integrate with migrations
-        SqlalchemyBase.metadata.create_all(self.engine)
+    @property
+    def core(self) -> Optional["LucyMemoryCore"]:
+        with self.session() as session:
+            try:
+                instance = AgentInstance.read(self.instance_id, session)
+            except InstanceNotFound:
+                instance = None
+            if instance is None or instance.boot is None:
+                logger.info("no core memory persisted for agent instance %s yet", self.instance_id)
+                return None
+            return LucyMemoryCore(boot=instance.boot,
+                                  bios=instance.bios,
+                                  persona=instance.persona,
+                                  human=instance.human,
+                                  summary=instance.summary or "",
+                                  history=MessageHistory(Message.from_stored_many(instance.history or [])))
 
+    @core.setter
+    def core(self, value: "LucyMemoryCore"):
+        dumped = value.stored
         with self.session() as session:
-            # TODO need base settings for prompts
             try:
-                self.db_instance = LucyAgentInstance.read(session, self.instance_id)
-            except InstanceNotFound as e:
-                logger.error("Unable to find an existing agent instance with id %s", self.instance_id)
-                raise e
+                instance = AgentInstance.read(self.instance_id, session)
+            except InstanceNotFound:
+                instance = AgentInstance()
+                instance.id = self.instance_id
+                session.add(instance)
+            for segment in (*value.segments, "history",):
+                setattr(instance, segment, dumped[segment])
+
+    def persist_core_changes(self, core: "LucyMemoryCore", changes: "CoreMemoryChanges") -> None:
+        """one UPDATE of just the changed segments, with the history trimmed and appended to in place
+        rather than the whole history sent (and rewritten) every turn.
+        """
+        values = dict(changes.segments)
+        if changes.history is not None:
+            values["history"] = [message.stored for message in changes.history]
+        elif changes.dropped or changes.appended:
+            history = AgentInstance.history
+            if changes.dropped:
+                history = func.jsonb_path_query_array(history, cast(f"$[{changes.dropped} to last]", JSONPATH))
+            if changes.appended:
+                history = history.op("||")(literal([message.stored for message in changes.appended], JSONB))
+            values["history"] = history
+        if not values:
+            return
+        with self.session() as session:
+            updated = session.execute(update(AgentInstance)
+                                      .where(AgentInstance._id == self._agent_instance_uuid)
+                                      .values(**values)
+                                      .execution_options(synchronize_session=False)).rowcount
+        if not updated:
+            # recall or archival may have created the instance row, but only a full write fills in a core
+            self.core = core
+            return
+        self._instance_exists = True
+
+    def _write_to_recall(self, messages: List[Message]) -> None:
+        """inserts the whole batch in one statement."""
+        agent_instance_id = self._agent_instance_uuid
+        self._insert(RecallMemory, [{
+            "_id": uuid4(),
+            "_agent_instance_id": agent_instance_id,
+            "role": message.role.value,
+            "content": message.content,
+            "timestamp": datetime.fromtimestamp(message.timestamp, timezone.utc) if message.timestamp else None,
+            "tool_calls": message.stored["tool_calls"],
+            "tool_call_id": message.tool_call_id,
+        } for message in messages])
+
+    def _write_to_archival(self, documents: List[Document]) -> None:
+        """inserts the whole batch in one statement."""
+        agent_instance_id = self._agent_instance_uuid
+        self._insert(ArchivalMemory, [{
+            "_id": uuid4(),
+            "_agent_instance_id": agent_instance_id,
+            "thought": document.content,
+            "embeddings": document.embeddings,
+        } for document in documents])
 
-    def session(self):
-        yield self.engine.connect()
+    def _search_recall(self, value: str, page: int = 1) -> RecallSearchResult:
+        """The messages matching value (web search syntax, ie `pickles -sweet`), most relevant then most recent first, page_size at a time.
+        Pages are keyset paginated on (rank, timestamp, id), so paging through results never re-reads earlier pages.
+        """
+        query = func.websearch_to_tsquery("english", value)
+        rank = func.ts_rank_cd(RecallMemory.search_vector, query).label("rank")
+        # when the message was sent, not created_at, which is the same for every message written in one batch.
+        # Messages without a time fall back to when they were stored, so the keyset never compares a NULL
+        sent = func.coalesce(RecallMemory.timestamp, RecallMemory.created_at).label("sent")
+        filters = (RecallMemory._agent_instance_id == self._agent_instance_uuid,
+                   RecallMemory.is_deleted == False,
+                   RecallMemory.search_vector.op("@@")(query))
+        matches = select(RecallMemory, rank, sent).where(*filters)
+
+        def fetch(after: Optional[tuple]) -> list:
+            query = matches
+            if after is not None:
+                query = query.where(tuple_(rank, sent, RecallMemory._id) < tuple_(*after))
+            with self.session() as session:
+                return session.execute(query.order_by(rank.desc(),
+                                                      sent.desc(),
+                                                      RecallMemory._id.desc()).limit(self.page_size)).all()
+
+        rows = keyset_page(self._cursors, ("recall", value), page, fetch,
+                           lambda row: (row.rank, row.sent, row.RecallMemory._id))
+        with self.session() as session:
+            page_count = session.execute(capped_page_count(select(RecallMemory._id).where(*filters), self.page_size)).scalar_one()
+        return RecallSearchResult(results=[self._message(row.RecallMemory) for row in rows],
+                                  page=page,
+                                  page_count=page_count,
+                                  query=value)
+
+    @staticmethod
+    def _message(recalled: RecallMemory) -> Message:
+        return Message(role=recalled.role,
+                       content=recalled.content,
+                       timestamp=recalled.timestamp.timestamp() if recalled.timestamp else None,
+                       tool_calls=[ToolCall.model_validate(call) for call in recalled.tool_calls] if recalled.tool_calls else None,
+                       tool_call_id=recalled.tool_call_id)
+
+    def _search_archival(self, value: str, page: int = 1) -> ArchivalSearchResult:
+        """The documents closest to value by cosine distance, page_size at a time.
+        Pages are keyset paginated on (distance, id), so paging through results never re-reads earlier pages.
+        """
+        if self.embedding_backend is None:
+            raise ValueError("an embedding_backend is required to search archival memory")
+        distance = ArchivalMemory.embeddings.cosine_distance(self.embedding_backend.embed(value)).label("distance")
+        matches = (select(ArchivalMemory.thought, ArchivalMemory.embeddings, ArchivalMemory._id, distance)
+                   .where(ArchivalMemory._agent_instance_id == self._agent_instance_uuid,
+                          ArchivalMemory.is_deleted == False,
+                          ArchivalMemory.embeddings.is_not(None)))
+
+        def fetch(after: Optional[tuple]) -> list:
+            query = matches
+            if after is not None:
+                query = query.where(tuple_(distance, ArchivalMemory._id) > tuple_(*after))
+            with self.session() as session:
+                self._tune_ann_scan(session, page)
+                return session.execute(query.order_by(distance, ArchivalMemory._id).limit(self.page_size)).all()
+
+        rows = keyset_page(self._cursors, ("archival", value), page, fetch, lambda row: (row.distance, row._id))
+        with self.session() as session:
+            page_count = session.execute(capped_page_count(
+                select(ArchivalMemory._id).where(ArchivalMemory._agent_instance_id == self._agent_instance_uuid,
+                                                 ArchivalMemory.is_deleted == False,
+                                                 ArchivalMemory.embeddings.is_not(None)),
+                self.page_size)).scalar_one()
+        return ArchivalSearchResult(results=[Document(content=row.thought, embeddings=row.embeddings) for row in rows],
+                                    page=page,
+                                    page_count=page_count,
+                                    query=value)
+
+    def _tune_ann_scan(self, session: "Session", page: int) -> None:
+        """The HNSW index is shared by every agent, so most of the nearest neighbors it finds belong to other agents.
+        pgvector 0.8+ keeps scanning until it has enough of this agent's; before that, widen the candidate list instead.
+        """
+        version = self._initialized[self.engine.url.render_as_string(hide_password=False)]
+        if version >= (0, 8):
+            session.execute(text("SET LOCAL hnsw.iterative_scan = strict_order"))
+        else:
+            session.execute(text(f"SET LOCAL hnsw.ef_search = {min(1000, max(40, (page + 1) * self.page_size * 4))}"))
 
     @property
-    def core_memory(self) -> "LucyAgentInstance":
-        # should assemble current state from instance
-        # plus any archival and recall memory requested
-        with self.backend.session() as session:
-           agent = LucyAgentInstance.read_or_create(session, self.instance_id)
-
-        #TODO: this should be prompt assembly based on an agent prompt template
-        return "\n".join([agent.system_message, agent.human, agent.persona])
+    def _agent_instance_uuid(self) -> UUID:
+        return UUID(self.instance_id.split("_")[1])
+
+    def _insert(self, model: type, rows: list[dict]) -> None:
+        """Writes rows without the per-object add/flush/commit/refresh round trips of `SqlalchemyBase.create`:
+        one executemany (sent as multi-row INSERTs by the driver) or COPY, in a single transaction.
+        """
+        if not rows:
+            return
+        with self.session() as session:
+            if not self._instance_exists:
+                # recall and archival rows may be written before the core is first persisted
+                session.execute(upsert(AgentInstance).values(_id=self._agent_instance_uuid).on_conflict_do_nothing())
+            if self.copy_threshold is not None and len(rows) >= self.copy_threshold and self.engine.dialect.driver == "psycopg":
+                self._copy(session, model, rows)
+            else:
+                session.execute(insert(model), rows)
+        self._instance_exists = True
+
+    @staticmethod
+    def _copy(session: "Session", model: type, rows: list[dict]) -> None:
+        """streams rows into the model's table with a binary COPY (psycopg 3 only), so embeddings go in pgvector's binary format."""
+        from psycopg.types.json import Jsonb
+
+        columns = list(rows[0])
+        cursor = session.connection().connection.cursor()
+        # a binary COPY has to be told every column's type up front
+        cursor.execute("SELECT attname, atttypid FROM pg_attribute WHERE attrelid = %s::regclass AND attname = ANY(%s)",
+                       (model.__tablename__, columns))
+        types = dict(cursor.fetchall())
+        quoted = ", ".join(f'"{column}"' for column in columns)
+        with cursor.copy(f"COPY {model.__tablename__} ({quoted}) FROM STDIN (FORMAT BINARY)") as copy:
+            copy.set_types([types[column] for column in columns])
+            for row in rows:
+                copy.write_row([Jsonb(value, dumps=encoding.dumps) if isinstance(value, (list, dict)) else value
+                                for value in row.values()])
@@ -1,32 +1,67 @@
 from typing import Optional
-from uuid import UUID
-from sqlalchemy import Text, String, UUID as SQLUUID
+from datetime import datetime
+import os
+import numpy as np
+from sqlalchemy import Text, String, DateTime, Index, Computed
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column
 
 
 from lucy_postgres_backend.enums import Role
 from lucy_postgres_backend.models.base import SqlalchemyBase
-from lucy_postgres_backend.models.mixins import LucyAgentInstanceMixin
+from lucy_postgres_backend.models.mixins import AgentInstanceMixin
+from lucy_postgres_backend.vectors import EmbeddingVector
+
+# the width of archival embeddings; the index needs every vector to be the same size
+EMBEDDING_DIMENSIONS = int(os.environ.get("LUCY_EMBEDDING_DIMENSIONS", 1536))
 
 class AgentInstance(SqlalchemyBase):
     """The agent instance that contains both configuration and CORE memory state."""
     __tablename__ = 'lucy_agent_instance'
     prefix = "s"
-    human: Mapped[str] = mapped_column(Text, max_length=1000)
-    persona: Mapped[str] = mapped_column(Text, max_length=1000)
-    system_message: Mapped[str] = mapped_column(Text, max_length=1000)
+    # segments are null until the core is first persisted; recall and archival writes may create the instance before then
+    boot: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    bios: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    human: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    persona: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    history: Mapped[list] = mapped_column(JSONB, server_default="[]")
 
-class RecallMemory(SqlalchemyBase, LucyAgentInstanceMixin):
+class RecallMemory(SqlalchemyBase, AgentInstanceMixin):
     """contains the conversation history including the agent's internal monologue."""
     __tablename__ = 'lucy_recall_memory'
     prefix = "r"
     role: Mapped[Role] = mapped_column(String)
-    content: Mapped[str] = mapped_column(Text, max_length=1000)
-    tool_call_id: Mapped[Optional[UUID]] = mapped_column(SQLUUID, nullable=True)
+    content: Mapped[str] = mapped_column(Text)
+    timestamp: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    tool_calls: Mapped[Optional[list]] = mapped_column(JSONB, nullable=True)
+    tool_call_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    search_vector: Mapped[str] = mapped_column(TSVECTOR, Computed("to_tsvector('english', content)", persisted=True), deferred=True)
+
+    __table_args__ = (
+        # full text search within one agent's recall; btree_gin lets the agent id share the GIN index
+        Index("ix_lucy_recall_memory_search",
+              "_agent_instance_id",
+              "search_vector",
+              postgresql_using="gin"),
+        # an agent's recall in the order it was sent, newest first
+        Index("ix_lucy_recall_memory_agent_instance_timestamp", "_agent_instance_id", "timestamp"),
+    )
 
-class ArchivalMemory(SqlalchemyBase, LucyAgentInstanceMixin):
+class ArchivalMemory(SqlalchemyBase, AgentInstanceMixin):
     """a memory bank for an agent instance, contains items Lucy has chosen to save."""
     __tablename__ = 'lucy_archival_memory'
     prefix = "a"
-    thought: Mapped[str] = mapped_column(Text, max_length=1000)
-    # TODO: add embeddings
\ No newline at end of file
+    thought: Mapped[str] = mapped_column(Text)
+    embeddings: Mapped[Optional[np.ndarray]] = mapped_column(EmbeddingVector(EMBEDDING_DIMENSIONS), nullable=True)
+
+    __table_args__ = (
+        # approximate nearest neighbors by cosine distance, so search cost grows ~log(n) with the archive
+        Index("ix_lucy_archival_memory_embeddings",
+              "embeddings",
+              postgresql_using="hnsw",
+              postgresql_with={"m": 16, "ef_construction": 64},
+              postgresql_ops={"embeddings": "vector_cosine_ops"}),
+        # lets the planner search small archives exactly, and keeps page counts cheap
+        Index("ix_lucy_archival_memory_agent_instance", "_agent_instance_id"),
+    )
@@ -9,10 +9,9 @@ class MalformedIdError(Exception):
     pass
 
 def _relation_getter(instance: "SqlalchemyBase", prop: str, prefix: str) -> Optional[str]:
-    if not getattr(instance, prop):
-        return None
     formatted_prop = f"_{prop}_id"
-    uuid_ = getattr(instance, formatted_prop)
+    if not (uuid_ := getattr(instance, formatted_prop)):
+        return None
     return f"{prefix}_{uuid_}"
 
 
@@ -46,8 +45,8 @@ class AgentInstanceMixin(DBBase):
 
     @property
     def agent_instance_id(self) -> str:
-        return _relation_getter(self, "lucy_agent_instance", "s")
+        return _relation_getter(self, "agent_instance", "s")
 
     @agent_instance_id.setter
     def agent_instance_id(self, value: str) -> None:
-        return _relation_setter(self, "lucy_agent_instance", "s", value)
\ No newline at end of file
+        return _relation_setter(self, "agent_instance", "s", value)
\ No newline at end of file
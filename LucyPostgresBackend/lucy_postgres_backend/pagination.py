@@ -0,0 +1,72 @@
+from typing import Any, Callable, Hashable, Optional, Sequence
+from collections import OrderedDict
+import threading
+
+from sqlalchemy import Select, func, select
+
+"""Keyset pagination for `search(value, page)`.
+Searches are asked for page numbers, but OFFSET makes page n cost n pages of work. Instead every search remembers
+the sort key of the last row on each page it served, and the next page starts strictly after it.
+"""
+
+Keyset = tuple[Any, ...]
+
+
+class KeysetCursors:
+    """A bounded LRU of where each page of each search ended."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._cursors: "OrderedDict[tuple[Hashable, int], Keyset]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def nearest(self, search: Hashable, page: int) -> tuple[int, Optional[Keyset]]:
+        """the latest page at or before page that can be started without scanning, and the keyset it starts after."""
+        with self._lock:
+            for start in range(page, 1, -1):
+                if (cursor := self._cursors.get((search, start - 1))) is not None:
+                    self._cursors.move_to_end((search, start - 1))
+                    return start, cursor
+        return 1, None
+
+    def remember(self, search: Hashable, page: int, cursor: Keyset) -> None:
+        """record the keyset of the last row on page."""
+        with self._lock:
+            self._cursors[(search, page)] = cursor
+            self._cursors.move_to_end((search, page))
+            while len(self._cursors) > self.maxsize:
+                self._cursors.popitem(last=False)
+
+
+def keyset_page(cursors: KeysetCursors,
+                search: Hashable,
+                page: int,
+                fetch: Callable[[Optional[Keyset]], Sequence],
+                keyset: Callable[[Any], Keyset]) -> Sequence:
+    """Returns the rows on page (1 indexed) of a search.
+
+    Args:
+        cursors: where previous pages of this search ended
+        search: identifies the search (ie the agent and the query)
+        page: the page to return
+        fetch: returns the page of rows after a keyset (or the first page for None), in keyset order
+        keyset: the sort key of a row
+    """
+    start, cursor = cursors.nearest(search, page)
+    rows: Sequence = ()
+    # walk forward from the nearest page we know the start of; sequential paging never walks
+    for current in range(start, page + 1):
+        rows = fetch(cursor)
+        if not rows:
+            return ()
+        cursor = keyset(rows[-1])
+        cursors.remember(search, current, cursor)
+    return rows
+
+
+def capped_page_count(query: Select, page_size: int, max_pages: int = 100) -> Select:
+    """The page count for the rows matched by query, counting at most max_pages worth of rows,
+    so the count stays cheap no matter how many rows match.
+    """
+    capped = query.limit(page_size * max_pages).subquery()
+    return select((func.count() + page_size - 1) // page_size).select_from(capped)
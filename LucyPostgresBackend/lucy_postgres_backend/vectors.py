@@ -0,0 +1,93 @@
+from typing import Any, Optional, Union
+import logging
+import struct
+
+import numpy as np
+from pgvector import Vector
+from pgvector.sqlalchemy import VECTOR
+from sqlalchemy import Dialect
+
+from lucy.schema import as_embedding
+
+logger = logging.getLogger("lucy.postgres_backend")
+
+"""Embeddings are float32 arrays in Lucy (see `lucy.schema.Embedding`) and pgvector stores float32s, so they cross the wire in pgvector's
+binary format (a big-endian uint16 dimension count, a reserved uint16, then big-endian float32s) where the driver allows it.
+"""
+
+_header = struct.Struct(">HH")
+
+
+def to_pgvector_binary(embedding: np.ndarray) -> bytes:
+    """an embedding in pgvector's binary format."""
+    return _header.pack(len(embedding), 0) + embedding.astype(">f4", copy=False).tobytes()
+
+
+def from_pgvector_binary(data: Union[bytes, memoryview]) -> np.ndarray:
+    """an embedding from pgvector's binary format, as a native float32 array."""
+    dimensions, _ = _header.unpack_from(data)
+    return np.frombuffer(data, dtype=">f4", count=dimensions, offset=_header.size).astype(np.float32)
+
+
+class EmbeddingVector(VECTOR):
+    """a pgvector column holding float32 arrays. Binds arrays as-is for psycopg 3 (which sends them in binary, see `register_vector_dumpers`)
+    and as pgvector text otherwise; loads them back as float32 arrays.
+    """
+    cache_ok = True
+
+    def bind_processor(self, dialect: Dialect) -> Any:
+        binary = dialect.driver == "psycopg"
+
+        def process(value: Any) -> Any:
+            if value is None:
+                return None
+            embedding = as_embedding(value)
+            if binary:
+                return embedding
+            return f"[{','.join(map(str, embedding.tolist()))}]"
+        return process
+
+    def result_processor(self, dialect: Dialect, coltype: Any) -> Any:
+        def process(value: Any) -> Optional[np.ndarray]:
+            if value is None:
+                return None
+            if isinstance(value, str):
+                return np.fromstring(value[1:-1], sep=",", dtype=np.float32)
+            if isinstance(value, Vector):
+                return value.to_numpy()
+            if isinstance(value, (bytes, memoryview)):
+                return from_pgvector_binary(value)
+            return as_embedding(value)
+        return process
+
+
+def register_vector_dumpers(connection: Any) -> bool:
+    """Teaches a psycopg 3 connection to send numpy arrays as pgvector values: in binary (see `to_pgvector_binary`) for parameters and binary COPYs,
+    or as text where the format asked for is text.
+    Only dumpers are registered, results stay text so `EmbeddingVector` parses them straight into arrays.
+    Returns False if the vector extension isn't installed yet.
+    """
+    from psycopg.adapt import Dumper
+    from psycopg.pq import Format
+    from psycopg.types import TypeInfo
+
+    info = TypeInfo.fetch(connection, "vector")
+    connection.rollback()
+    if info is None:
+        return False
+
+    class EmbeddingDumper(Dumper):
+        oid = info.oid
+
+        def dump(self, obj: np.ndarray) -> bytes:
+            return f"[{','.join(map(str, obj.tolist()))}]".encode()
+
+    class EmbeddingBinaryDumper(EmbeddingDumper):
+        format = Format.BINARY
+
+        def dump(self, obj: np.ndarray) -> bytes:
+            return to_pgvector_binary(obj)
+
+    connection.adapters.register_dumper("numpy.ndarray", EmbeddingDumper)
+    connection.adapters.register_dumper("numpy.ndarray", EmbeddingBinaryDumper)
+    return True
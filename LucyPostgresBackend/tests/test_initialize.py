@@ -0,0 +1,9 @@
+import pytest
+
+from lucy.schema import MemoryType
+from lucy_postgres_backend import LucyPostgresBackend
+
+
+def test_initialize_needs_a_database():
+    with pytest.raises(ValueError):
+        LucyPostgresBackend.initialize(MemoryType.archival)
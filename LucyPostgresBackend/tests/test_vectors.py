@@ -0,0 +1,20 @@
+import numpy as np
+from pgvector import Vector
+from sqlalchemy.dialects import postgresql
+
+from lucy_postgres_backend.vectors import EmbeddingVector, from_pgvector_binary, to_pgvector_binary
+
+
+class TestVectors:
+
+    def test_binary_format_matches_pgvector(self):
+        embedding = np.array([0.5, -1.25, 3.0], dtype=np.float32)
+        assert to_pgvector_binary(embedding) == Vector(embedding).to_binary()
+        assert np.array_equal(from_pgvector_binary(Vector(embedding).to_binary()), embedding)
+
+    def test_results_load_as_float32_arrays(self):
+        load = EmbeddingVector(3).result_processor(postgresql.dialect(), None)
+        for stored in ("[0.5,-1.25,3]", Vector([0.5, -1.25, 3.0]), Vector([0.5, -1.25, 3.0]).to_binary()):
+            loaded = load(stored)
+            assert loaded.dtype == np.float32
+            assert np.array_equal(loaded, [0.5, -1.25, 3.0])